@@ -1,16 +1,87 @@
+import copy
+import json
+import sqlite3
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-import plotly.express as px
+
+from asistencia import derivar_participacion
+from borrador import EXTENSION_BORRADOR, guardar_borrador, leer_borrador
+from calculo import (
+    CARGOS_VALIDOS,
+    DESCUENTO_FALTAS,
+    recalcular_bono,
+    resumen_por_lote,
+    reglas_por_tipo,
+)
+from diario import COMPACTAR_CADA, Diario, cambios_tabla
+from correo import (
+    cuerpo_correo_html,
+    lotes_por_destinatario,
+    mensaje_correo,
+    particion_df_final,
+)
+from envio import ESTADOS_FINALES, ColaCorreo, como_bool
+from carga import (
+    aplicar_participacion,
+    alta_masiva,
+    baja_masiva,
+    cruzar_trabajadores,
+    dnis_de_excel,
+    dnis_de_texto,
+    indice_dni,
+    leer_excel_generado,
+    leer_participacion,
+    plantilla_participacion,
+)
+from exportar import excel_memorizado, generar_excel, huella_estado
+from historial import registrar_corrida, pagos_por_dni, listar_corridas, total_por_dni
+from maestro import RUTA_BASE_PUBLICADA, cargar_maestro, cruzar_con_maestro, publicar_base, version_publicada
+from memoria import compactar_tabla, reporte_memoria
+from participacion import COLUMNAS_BASE, a_ancho, a_largo, filtrar, largo_vacio, reubicar_filas
+from graficos import (
+    MODOS_GRAFICO,
+    figura_resumen_lote,
+    figura_trabajadores,
+    huella_resultado,
+    modo_por_defecto,
+)
+from traza import cerrar_traza, etapa, iniciar_traza, tabla_etapas, trazado
+from productivos import (
+    CAMPOS_PROD,
+    CAMPOS_H,
+    CAMPOS_M,
+    tabla_hembras,
+    tabla_machos,
+)
 
 # =========================
 # CONFIGURACIÓN GLOBAL
 # =========================
+# Copy-on-write: la tabla se comparte sin .copy() entre editor y cálculo
+# (memoria.py). Siempre activo desde pandas 3
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
 st.set_page_config(
     page_title="Bono Reproductoras GDP",
     layout="wide"
 )
 
+# =========================
+# ⏱️ TRAZA DEL RERUN
+# Un rerun cortado por st.stop() se guarda al empezar el siguiente
+# =========================
+trazas_recientes = st.session_state.setdefault("trazas_recientes", [])
+traza_pendiente = st.session_state.get("traza_rerun")
+if traza_pendiente is not None and not traza_pendiente.get("guardada"):
+    trazas_recientes.append(cerrar_traza(traza_pendiente))
+del trazas_recientes[:-20]
+
+st.session_state.traza_rerun = iniciar_traza(
+    "rerun",
+    rol=st.session_state.get("rol")
+)
+
 # =========================
 # PORTADA
 # =========================
@@ -113,6 +184,7 @@ if st.session_state.ingresar and not st.session_state.autenticado:
                 if rol_usuario:
                     st.session_state.autenticado = True
                     st.session_state.rol = rol_usuario
+                    st.session_state.usuario = user
                     st.session_state.ver_manual = True
                     st.success("✅ Acceso autorizado")
                     st.rerun()
@@ -271,6 +343,30 @@ with st.sidebar:
             "montos y coherencia con reportes oficiales**."
         )
 
+        # =========================
+        # 🗂️ HISTORIAL LOCAL (SQLITE)
+        # =========================
+        st.markdown("---")
+        with st.expander("🗂️ Historial local de bonos"):
+            dni_hist = st.text_input("DNI", key="dni_historial").strip()
+            granja_hist = st.text_input("Granja", key="granja_historial").strip()
+
+            # Un histórico bloqueado o dañado no debe romper la página
+            try:
+                if dni_hist:
+                    dni_hist = dni_hist.zfill(8)
+                    anio_actual = pd.Timestamp.now().year
+                    st.metric(
+                        f"💰 Total pagado {anio_actual} (S/)",
+                        f"{total_por_dni(dni_hist, anio_actual):,.2f}"
+                    )
+                    st.dataframe(pagos_por_dni(dni_hist), use_container_width=True)
+
+                if granja_hist:
+                    st.dataframe(listar_corridas(granja=granja_hist), use_container_width=True)
+            except sqlite3.Error as e:
+                st.warning(f"⚠️ No se pudo leer el historial local: {e}")
+
     # 👤 USUARIOS NORMALES
     else:
         st.info(
@@ -279,13 +375,144 @@ with st.sidebar:
         )
 
 
+# =========================
+# 💾 AUTOGUARDADO (DIARIO POR SESIÓN)
+# Foto del estado + un cambio por línea; se recupera al volver a entrar.
+# Las cuentas son compartidas: cada sesión escribe solo sus archivos
+# =========================
+if "diario" not in st.session_state:
+    st.session_state.diario = Diario(st.session_state.get("usuario") or st.session_state.rol)
+    try:
+        st.session_state.diario.limpiar()
+    except OSError:
+        pass
+diario = st.session_state.diario
+
+
+def anotar(op, **datos):
+    # Solo después de la primera foto; el autoguardado nunca rompe la página
+    if not st.session_state.get("diario_iniciado"):
+        return
+    try:
+        diario.anotar(op, **datos)
+    except OSError:
+        # Sin foto propia (p. ej. otra ventana recuperó esta sesión): foto nueva al final
+        st.session_state.diario_iniciado = False
+
+
+def huellas_contexto(campos):
+    return {k: json.dumps(v, sort_keys=True, default=str) for k, v in campos.items()}
+
+
+def anotar_contexto(**campos):
+    # Solo los campos que cambiaron desde la última anotación
+    previo = st.session_state.setdefault("diario_contexto", {})
+    huellas = huellas_contexto(campos)
+    cambiados = {k: campos[k] for k in campos if previo.get(k) != huellas[k]}
+    if cambiados:
+        anotar("contexto", **cambiados)
+        previo.update({k: huellas[k] for k in cambiados})
+
+
+# =========================
+# TABLA DE LA SESIÓN: TRABAJADORES + PARTICIPACIÓN EN FORMATO LARGO
+# =========================
+def guardar_largo(trabajadores, participacion):
+    st.session_state.trabajadores = trabajadores
+    st.session_state.participacion = participacion
+    # La vista ancha se vuelve a armar la próxima vez que se muestre
+    st.session_state.pop("tabla", None)
+
+
+def guardar_ancha(tabla, lotes):
+    guardar_largo(*a_largo(compactar_tabla(tabla, lotes), lotes))
+
+
+def vista_tabla(lotes):
+    """
+    Columnas P_/F_ para el editor y la exportación. Se arma solo después
+    de un cambio (o si cambian los lotes).
+    """
+    if "tabla" not in st.session_state or st.session_state.get("vista_lotes") != list(lotes):
+        st.session_state.tabla = compactar_tabla(
+            a_ancho(st.session_state.trabajadores, st.session_state.participacion, lotes), lotes
+        )
+        st.session_state.vista_lotes = list(lotes)
+    return st.session_state.tabla
+
+
+sin_terminar = []
+if "trabajadores" not in st.session_state and not st.session_state.get("diario_revisado"):
+    sin_terminar = diario.sin_terminar()
+
+if sin_terminar:
+    ultimas = {
+        sesion: f"Último cambio: {guardado:%d/%m/%Y %H:%M}"
+        for sesion, guardado in sin_terminar
+    }
+    st.info(
+        "♻️ Hay sesiones sin terminar en esta cuenta. Recupere la suya o empiece "
+        "una nueva: las demás quedan guardadas para quien las dejó."
+    )
+    sesion_elegida = st.selectbox(
+        "Sesión sin terminar",
+        list(ultimas),
+        format_func=ultimas.get,
+        key="diario_sesion_elegida"
+    )
+    if pd.Timestamp.now() - dict(sin_terminar)[sesion_elegida] < pd.Timedelta(minutes=10):
+        st.warning(
+            "⚠️ Esta sesión tuvo cambios hace menos de 10 minutos: puede seguir abierta "
+            "en otra ventana. Si la recupera, esa ventana empezará un autoguardado propio."
+        )
+
+    col_recuperar, col_nueva = st.columns(2)
+    with col_recuperar:
+        if st.button("♻️ Recuperar sesión anterior", use_container_width=True):
+            try:
+                diario.adoptar(sesion_elegida)
+            except FileNotFoundError:
+                st.warning("⚠️ Esa sesión ya fue recuperada desde otra ventana.")
+                st.stop()
+
+            try:
+                with etapa("recuperar_diario") as e:
+                    recuperado = diario.recuperar()
+                    e["cambios"] = diario.pendientes
+            except ValueError as e:
+                # Foto de una versión anterior: no se puede retomar
+                diario.descartar()
+                st.warning(f"⚠️ {e}")
+                st.stop()
+
+            for l in recuperado["lotes"]:
+                st.session_state.pop(f"gen_{l}", None)
+                st.session_state.pop(f"monto_{l}", None)
+
+            st.session_state.granja_seleccionada = recuperado["granja"]
+            st.session_state.tipo = recuperado["tipo"]
+            st.session_state.lotes = recuperado["lotes"]
+            st.session_state.config_lotes = recuperado["config_lotes"]
+            st.session_state.datos_productivos = recuperado["datos_productivos"]
+            guardar_ancha(recuperado["tabla"], recuperado["lotes"])
+            st.session_state.dnis_tabla = set(st.session_state.trabajadores["DNI"])
+            st.session_state.cargado_desde_excel = True
+            st.session_state.sesion_recuperada = True
+            st.session_state.diario_revisado = True
+            st.rerun()
+    with col_nueva:
+        if st.button("🆕 Empezar de nuevo", use_container_width=True):
+            st.session_state.diario_revisado = True
+            st.rerun()
+
+
 # =========================
 # ELECCIÓN DE OPCIÓN DE INICIO
 # =========================
 st.subheader("Seleccione cómo desea iniciar")
 opcion_inicio = st.selectbox(
     "Opciones",
-    ["➕ Iniciar desde cero", "📂 Cargar Excel previamente generado"]
+    ["➕ Iniciar desde cero", "📂 Cargar Excel previamente generado", "📝 Continuar borrador guardado"]
 )
 
 
@@ -309,74 +536,53 @@ if st.session_state.ver_powerbi:
     st.stop()
 
 # =========================
-# TABLAS DE % POR CARGO
+# CACHE DE LECTURA (POR CONTENIDO DEL ARCHIVO)
 # =========================
-REGLAS_PRODUCCION = {
-    "GALPONERO": 1.00,
-    "AYUDANTE GALPONERO": 0.125,
-    "VOLANTE DESCANSERO": 0.125,
-    "VOLANTE ALIMENTO": 0.125,
-    "BIOSEGURIDAD": 0.0625,
-    "GUARDIANES": 0.0625,
-    "CAPORAL": 0.125,
-    "SUPERVISOR": 1.00,
-    "MANTENIMIENTO": 0.0,
-    "GRADING": 0.08,
-    "VACUNADORES": 0.07
-}
-REGLAS_LEVANTE = REGLAS_PRODUCCION.copy()
+@st.cache_data(max_entries=8, show_spinner=False)
+def cruzar_trabajadores_cache(contenido_dni, contenido_base):
+    return cruzar_trabajadores(contenido_dni, contenido_base)
 
-# =========================
-# LISTA OFICIAL DE CARGOS
-# =========================
-CARGOS_VALIDOS = sorted(REGLAS_PRODUCCION.keys())
 
-DESCUENTO_FALTAS = {0:1.0, 1:0.90, 2:0.80, 3:0.70, 4:0.60}
-def factor_faltas(f):
-    try:
-        f = int(f)
-    except:
-        return 0.50
-    return DESCUENTO_FALTAS.get(f, 0.50)
+@st.cache_data(max_entries=8, show_spinner=False)
+def leer_excel_generado_cache(contenido):
+    return leer_excel_generado(contenido)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def leer_borrador_cache(contenido):
+    return leer_borrador(contenido)
+
 
 # =========================
-# HELPER – LECTURA DE TABLAS INVERTIDAS (LEVANTE)
+# BASE DE TRABAJADORES PUBLICADA (UNA POR SERVIDOR)
+# cache_resource: todas las sesiones comparten el mismo objeto; una
+# versión nueva del archivo publicado es otra entrada
 # =========================
-def leer_bloque_invertido(raw, fila_inicio, n_filas):
-    """
-    raw        : dataframe completo sin header
-    fila_inicio: fila donde está 'Edad'
-    n_filas    : número de filas del bloque
-    """
+RUTA_BASE = st.secrets.get("BASE_TRABAJADORES", RUTA_BASE_PUBLICADA)
 
-    # encabezados (lotes) están UNA FILA ARRIBA
-    lotes = (
-        raw.iloc[fila_inicio - 1, 1:]
-        .astype(str)
-        .str.replace(".0", "", regex=False)
-        .str.strip()
-    )
 
-    bloque = raw.iloc[fila_inicio:fila_inicio + n_filas].copy()
+@st.cache_resource(max_entries=2, show_spinner="Preparando la base de trabajadores publicada…")
+def maestro_cache(ruta, version):
+    return cargar_maestro(ruta)
 
-    data = bloque.iloc[:, 1:]
-    data.columns = lotes
 
-    data.index = (
-        bloque.iloc[:, 0]
-        .astype(str)
-        .str.strip()
-    )
+@st.cache_data(max_entries=8, show_spinner=False)
+def cruzar_con_maestro_cache(contenido_dni, version, _maestro):
+    return cruzar_con_maestro(contenido_dni, _maestro)
+
 
-    return data
+# =========================
+# CACHE DE FIGURAS (POR HUELLA DEL RESULTADO)
+# Los argumentos con "_" no se hashean: la huella ya los representa
+# =========================
+@st.cache_resource(max_entries=32, show_spinner=False)
+def figura_trabajadores_cache(huella, modo, top_n, _df_final):
+    return figura_trabajadores(_df_final, modo, top_n)
 
 
-def get_valor(df, fila_idx, col, default=0.0):
-    try:
-        v = df.iloc[fila_idx][col]
-        return float(v) if pd.notna(v) else default
-    except:
-        return default
+@st.cache_resource(max_entries=32, show_spinner=False)
+def figura_resumen_lote_cache(huella, _resumen_lote):
+    return figura_resumen_lote(_resumen_lote)
 
 
 # =========================
@@ -386,197 +592,111 @@ df = None
 df_base = None
 
 if opcion_inicio == "➕ Iniciar desde cero":
+    version_base = version_publicada(RUTA_BASE)
+    maestro = maestro_cache(RUTA_BASE, version_base) if version_base else None
+
     archivo_dni = st.file_uploader("📄 Excel con DNIs", type=["xlsx"])
-    archivo_base = st.file_uploader("📊 Base de trabajadores", type=["xlsx"])
+    archivo_base = st.file_uploader(
+        "📊 Base de trabajadores" + (" (opcional: sin archivo se usa la base publicada)" if maestro else ""),
+        type=["xlsx"]
+    )
+    if maestro is not None and not archivo_base:
+        publicada = pd.Timestamp.fromtimestamp(int(maestro.version.split("-")[0]) / 1e9)
+        st.caption(f"👥 Base publicada: {len(maestro):,} trabajadores, actualizada el {publicada:%d/%m/%Y %H:%M}")
 
     if archivo_dni and archivo_base:
-        df_dni = pd.read_excel(archivo_dni, dtype=str)
-        df_base = pd.read_excel(archivo_base, dtype=str)
-
-        df_dni.columns = df_dni.columns.str.strip().str.upper()
-        df_base.columns = df_base.columns.str.strip().str.upper()
-
-        def limpiar_dni(s):
-            return (
-                s.astype(str)
-                .str.replace("'", "", regex=False)
-                .str.replace(".0", "", regex=False)
-                .str.strip()
-                .str.zfill(8)
-            )
-
-        df_dni["DNI"] = limpiar_dni(df_dni["DNI"])
-        df_base["DNI"] = limpiar_dni(df_base["DNI"])
-        df_base = df_base.drop_duplicates("DNI")
-
-        df = df_dni.merge(
-            df_base[["DNI", "NOMBRE COMPLETO", "CARGO"]],
-            on="DNI",
-            how="left"
-        )
+        # 🔑 Solo un archivo nuevo paga el costo de lectura
+        contenido_dni = archivo_dni.getvalue()
+        contenido_base = archivo_base.getvalue()
+        with etapa("carga_cruce", bytes=len(contenido_dni) + len(contenido_base)) as e:
+            df, df_base = cruzar_trabajadores_cache(contenido_dni, contenido_base)
+            e["filas"] = len(df)
+
+        # 🔑 Índice por DNI: se construye una sola vez por archivo
+        if st.session_state.get("indice_base_id") != archivo_base.file_id:
+            st.session_state.indice_base = indice_dni(df_base)
+            st.session_state.indice_base_id = archivo_base.file_id
 
         st.success("✅ Cruce de trabajadores realizado")
-elif opcion_inicio == "📂 Cargar Excel previamente generado":
+
+        # Control de Gestión puede dejar esta base como la publicada
+        if RUTA_BASE and st.session_state.get("rol") == "control":
+            if st.button("📌 Publicar como base de trabajadores del servidor"):
+                publicar_base(contenido_base, RUTA_BASE)
+                st.success("✅ Base publicada: las próximas sesiones la usarán sin subirla")
+    elif archivo_dni and maestro is not None:
+        # La sesión no guarda la base: consulta la foto compartida
+        contenido_dni = archivo_dni.getvalue()
+        with etapa("carga_cruce", bytes=len(contenido_dni), maestro=maestro.version) as e:
+            df = cruzar_con_maestro_cache(contenido_dni, maestro.version, maestro)
+            e["filas"] = len(df)
+
+        st.session_state.indice_base = maestro
+        st.session_state.indice_base_id = f"maestro:{maestro.version}"
+
+        st.success("✅ Cruce de trabajadores realizado con la base publicada")
+elif opcion_inicio in ("📂 Cargar Excel previamente generado", "📝 Continuar borrador guardado"):
+    # El borrador trae el mismo estado que el Excel, con los tipos exactos
+    es_borrador = opcion_inicio == "📝 Continuar borrador guardado"
     archivo_prev = st.file_uploader(
-        "📂 Subir Excel previamente generado",
-        type=["xlsx"]
+        "📝 Subir borrador (.bono)" if es_borrador else "📂 Subir Excel previamente generado",
+        type=[EXTENSION_BORRADOR] if es_borrador else ["xlsx"]
     )
 
     if archivo_prev:
 
         # =========================
-        # LECTURA RAW
+        # LECTURA ÚNICA (CACHE POR CONTENIDO)
         # =========================
-        raw = pd.read_excel(
-            archivo_prev,
-            sheet_name="BONO_REPRODUCTORAS",
-            header=None
-        )
+        try:
+            contenido_prev = archivo_prev.getvalue()
+            if es_borrador:
+                with etapa("carga_borrador", bytes=len(contenido_prev)):
+                    previo = leer_borrador_cache(contenido_prev)
+            else:
+                with etapa("carga_excel_previo", bytes=len(contenido_prev)):
+                    previo = leer_excel_generado_cache(contenido_prev)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+
+        df = previo["tabla"]
 
         # =========================
-        # 1️⃣ ENCABEZADO
+        # 5️⃣ SESSION STATE FINAL (SOLO CON UN ARCHIVO NUEVO)
+        # Si se aplicara en cada rerun, se perderían las ediciones
         # =========================
-        encabezado = raw.iloc[0:5, 0:2].copy()
-        encabezado.columns = ["CAMPO", "VALOR"]
-        encabezado["CAMPO"] = encabezado["CAMPO"].astype(str).str.upper().str.strip()
-
-        st.session_state.granja_seleccionada = encabezado.loc[
-            encabezado["CAMPO"] == "GRANJA", "VALOR"
-        ].values[0]
-
-        tipo = encabezado.loc[
-            encabezado["CAMPO"] == "TIPO DE PROCESO", "VALOR"
-        ].values[0]
+        if st.session_state.get("excel_previo_id") != archivo_prev.file_id:
+            st.session_state.excel_previo_id = archivo_prev.file_id
 
-        lotes_txt = encabezado.loc[
-            encabezado["CAMPO"] == "LOTES", "VALOR"
-        ].values[0]
+            st.session_state.granja_seleccionada = previo["granja"]
 
-        lotes = [l.strip() for l in lotes_txt.split(",")]
+            # Los widgets de lote deben tomar los valores del archivo
+            for l in previo["lotes"]:
+                st.session_state.pop(f"gen_{l}", None)
+                st.session_state.pop(f"monto_{l}", None)
 
-        # =========================
-        # 2️⃣ CONFIGURACIÓN POR LOTE (ROBUSTA, SOLO A–C)
-        # =========================
-        fila_lotes = raw[
-            raw.iloc[:, 0].astype(str).str.strip().str.upper() == "LOTE"
-        ].index[0]
-
-        # Leer SOLO columnas A, B y C
-        df_lotes_raw = raw.iloc[fila_lotes + 1:, 0:3].copy()
-        df_lotes_raw.columns = ["LOTE", "GENETICA", "MONTO"]
-
-        # Limpieza fuerte
-        df_lotes_raw["LOTE"] = df_lotes_raw["LOTE"].astype(str).str.strip()
-        df_lotes_raw["GENETICA"] = (
-            df_lotes_raw["GENETICA"]
-            .astype(str)
-            .str.strip()
-            .str.upper()
-        )
-
-        df_lotes_raw["MONTO"] = (
-            df_lotes_raw["MONTO"]
-            .astype(str)
-            .str.replace(",", "", regex=False)
-        )
-        df_lotes_raw["MONTO"] = pd.to_numeric(
-            df_lotes_raw["MONTO"], errors="coerce"
-        )
+            if previo["datos_productivos"] is not None:
+                st.session_state.datos_productivos = previo["datos_productivos"]
 
-        # Cortar al primer vacío (evita Hembras/Machos)
-        df_lotes_raw = df_lotes_raw[
-            df_lotes_raw["LOTE"].notna() & (df_lotes_raw["LOTE"] != "")
-        ]
+            guardar_ancha(df, previo["lotes"])
+            st.session_state.diario_iniciado = False
+            st.session_state.dnis_tabla = set(df["DNI"])
+            st.session_state.config_lotes = previo["config_lotes"]
+            st.session_state.lotes = previo["lotes"]
+            st.session_state.tipo = previo["tipo"]
 
-        # Construir config_lotes LIMPIO
-        config_lotes = {}
-        for _, r in df_lotes_raw.iterrows():
-            lote = str(r["LOTE"]).strip()
-            config_lotes[lote] = {
-                "GENETICA": r["GENETICA"] if r["GENETICA"] else "ROSS",
-                "MONTO": float(r["MONTO"]) if pd.notna(r["MONTO"]) else 0.0
-            }
-
-        # =========================
-        # 3️⃣ TABLA DE TRABAJADORES
-        # =========================
-        fila_tabla = raw[
-            raw.iloc[:, 0].astype(str).str.strip().str.upper() == "DNI"
-        ].index[0]
-
-        df = pd.read_excel(
-            archivo_prev,
-            sheet_name="BONO_REPRODUCTORAS",
-            header=fila_tabla,
-            dtype=str
-        )
+            # 🔑 FLAG CRÍTICO PARA LA UI
+            st.session_state.cargado_desde_excel = True
 
-        df.columns = df.columns.str.strip().str.upper()
-        df["DNI"] = (
-            df["DNI"]
-            .str.replace("'", "")
-            .str.replace(".0", "", regex=False)
-            .str.zfill(8)
+        st.success(
+            "✅ Borrador cargado correctamente" if es_borrador
+            else "✅ Excel cargado y reconstruido correctamente"
         )
 
-        # =========================
-        # 4️⃣ DATOS PRODUCTIVOS – LEVANTE
-        # =========================
-        if tipo == "LEVANTE":
-
-            st.session_state.datos_productivos = {}
-
-            idx_edades = raw[
-                raw.iloc[:, 0].astype(str).str.strip().str.upper() == "EDAD"
-            ].index.tolist()
-
-            if len(idx_edades) < 2:
-                st.error("❌ No se detectaron bloques de Hembras y Machos")
-                st.stop()
-
-            inicio_h = idx_edades[0]   # Hembras
-            inicio_m = idx_edades[1]   # Machos
-
-            df_h = leer_bloque_invertido(raw, inicio_h, 8)
-            df_m = leer_bloque_invertido(raw, inicio_m, 7)
-
-            for lote in df_h.columns:
-                st.session_state.datos_productivos.setdefault(lote, {})
-
-                st.session_state.datos_productivos[lote]["HEMBRAS"] = {
-                    "EDAD": get_valor(df_h, 0, lote),
-                    "UNIFORMIDAD": get_valor(df_h, 1, lote),
-                    "AVES_ENTREGADAS": get_valor(df_h, 2, lote),
-                    "POBLACION_INICIAL": get_valor(df_h, 3, lote),
-                    "PCT_CUMP_AVES": get_valor(df_h, 4, lote),
-                    "PESO": get_valor(df_h, 5, lote),
-                    "PESO_STD": get_valor(df_h, 6, lote),
-                    "PCT_CUMP_PESO": get_valor(df_h, 7, lote),
-                }
-
-                st.session_state.datos_productivos[lote]["MACHOS"] = {
-                    "EDAD": get_valor(df_m, 0, lote),
-                    "UNIFORMIDAD": get_valor(df_m, 1, lote),
-                    "AVES_ENTREGADAS": get_valor(df_m, 2, lote),
-                    "POBLACION_INICIAL": get_valor(df_m, 3, lote),
-                    "PESO": get_valor(df_m, 4, lote),
-                    "PESO_STD": get_valor(df_m, 5, lote),
-                    "PCT_CUMP_PESO": get_valor(df_m, 6, lote),
-                }
-
-        # =========================
-        # 5️⃣ SESSION STATE FINAL
-        # =========================
-        st.session_state.tabla = df.copy()
-        st.session_state.df_edit = df.copy()
-        st.session_state.config_lotes = config_lotes
-        st.session_state.lotes = lotes
-        st.session_state.tipo = tipo
-
-        # 🔑 FLAG CRÍTICO PARA LA UI
-        st.session_state.cargado_desde_excel = True
-
-        st.success("✅ Excel cargado y reconstruido correctamente")
+# Sesión recuperada del autoguardado: la tabla ya está en session_state
+if df is None and st.session_state.get("sesion_recuperada"):
+    df = st.session_state.trabajadores
 
 # =========================
 # SI NO HAY DATOS, DETENER
@@ -672,7 +792,7 @@ tipo = st.radio(
     horizontal=True
 )
 
-reglas = REGLAS_PRODUCCION if tipo == "PRODUCCIÓN" else REGLAS_LEVANTE
+reglas = reglas_por_tipo(tipo)
 
 if tipo == "PRODUCCIÓN":
     st.success(
@@ -696,6 +816,17 @@ if not st.session_state.tipo_confirmado:
     st.info("🔒 Confirme el tipo de proceso para continuar.")
     st.stop()
 
+# 🗓️ PERIODO DEL BONO: una corrida nueva del mismo periodo reemplaza
+# a la anterior en el historial (no se suman las dos)
+hoy = pd.Timestamp.now()
+periodos_opciones = [(hoy - pd.DateOffset(months=k)).strftime("%Y-%m") for k in range(-1, 12)]
+periodo_bono = st.selectbox(
+    "🗓️ Periodo del bono",
+    periodos_opciones,
+    index=1,
+    key="periodo_bono"
+)
+
 # Lotes
 if "lotes" in st.session_state:
     lotes = st.session_state.lotes
@@ -713,373 +844,524 @@ if "datos_productivos" not in st.session_state:
     st.session_state.datos_productivos = {}
 
 # =========================
-# ETAPA Y DATOS PRODUCTIVOS (PRODUCCIÓN – TABLA INVERTIDA)
+# 🔄 FRAGMENTO: DATOS PRODUCTIVOS
+# Depende de: tipo, lotes
+# Escribe: st.session_state.datos_productivos (solo afecta Excel y correo,
+# que lo leen al momento; no hace falta recalcular pagos ni gráficas)
 # =========================
-if tipo == "PRODUCCIÓN":
-
-    st.subheader("🏭 Información productiva – Producción")
-
-    campos_prod = {
-        "Edad (sem)": "EDAD_AVE",
-        "Huevos sem 41": "HUEVOS_SEM_41",
-        "Población inicial": "POBLACION_INICIAL",
-        "Huevos / AA": "HUEVOS_POR_AA",
-        "Huevos STD 41": "HUEVOS_STD_41",
-        "% Cumplimiento": "PCT_CUMPLIMIENTO",
-        "% Huevos bomba": "PCT_HUEVOS_BOMBA",
-    }
+@st.fragment
+def seccion_datos_productivos(tipo, lotes):
 
     # =========================
-    # ETAPA (SELECTBOX APARTE)
+    # ETAPA Y DATOS PRODUCTIVOS (PRODUCCIÓN – TABLA INVERTIDA)
     # =========================
-    st.markdown("### 🔄 Etapa por lote")
+    if tipo == "PRODUCCIÓN":
 
-    cols = st.columns(len(lotes))
-    for i, lote in enumerate(lotes):
-        with cols[i]:
-            etapa_actual = (
-                st.session_state.datos_productivos
-                .get(lote, {})
-                .get("ETAPA", "Primera Etapa")
-            )
+        st.subheader("🏭 Información productiva – Producción")
 
-            etapa = st.selectbox(
-                f"Lote {lote}",
-                ["Primera Etapa", "Segunda Etapa"],
-                index=["Primera Etapa", "Segunda Etapa"].index(etapa_actual),
-                key=f"etapa_prod_{lote}"
-            )
+        campos_prod = CAMPOS_PROD
 
-            st.session_state.datos_productivos.setdefault(lote, {})
-            st.session_state.datos_productivos[lote]["ETAPA"] = etapa
+        # =========================
+        # ETAPA (SELECTBOX APARTE)
+        # =========================
+        st.markdown("### 🔄 Etapa por lote")
+
+        cols = st.columns(len(lotes))
+        for i, lote in enumerate(lotes):
+            with cols[i]:
+                etapa_actual = (
+                    st.session_state.datos_productivos
+                    .get(lote, {})
+                    .get("ETAPA", "Primera Etapa")
+                )
 
-    # =========================
-    # DATAFRAME NUMÉRICO (PERSISTENTE)
-    # =========================
-    if "df_prod_edit" not in st.session_state:
+                etapa = st.selectbox(
+                    f"Lote {lote}",
+                    ["Primera Etapa", "Segunda Etapa"],
+                    index=["Primera Etapa", "Segunda Etapa"].index(etapa_actual),
+                    key=f"etapa_prod_{lote}"
+                )
 
-        data_prod = {
-            campo: [
-                st.session_state.datos_productivos
-                .get(lote, {})
-                .get(key, 0)
-                for lote in lotes
-            ]
-            for campo, key in campos_prod.items()
-        }
+                st.session_state.datos_productivos.setdefault(lote, {})
+                st.session_state.datos_productivos[lote]["ETAPA"] = etapa
 
-        st.session_state.df_prod_edit = pd.DataFrame(
-            data_prod,
-            index=lotes
-        ).T
+        # =========================
+        # DATAFRAME NUMÉRICO (PERSISTENTE)
+        # =========================
+        if "df_prod_edit" not in st.session_state:
+
+            data_prod = {
+                campo: [
+                    st.session_state.datos_productivos
+                    .get(lote, {})
+                    .get(key, 0)
+                    for lote in lotes
+                ]
+                for campo, key in campos_prod.items()
+            }
 
-    # =========================
-    # FORMULARIO (IGUAL A LEVANTE)
-    # =========================
-    with st.form("form_produccion"):
+            st.session_state.df_prod_edit = pd.DataFrame(
+                data_prod,
+                index=lotes
+            ).T
 
-        df_edit = st.data_editor(
-            st.session_state.df_prod_edit,
-            use_container_width=True,
-            num_rows="fixed",
-            key="editor_produccion",  # 🔑 CLAVE CRÍTICA
-            column_config={
-                lote: st.column_config.NumberColumn()
-                for lote in lotes
-            }
-        )
+        # =========================
+        # FORMULARIO (IGUAL A LEVANTE)
+        # =========================
+        with st.form("form_produccion"):
+
+            df_edit = st.data_editor(
+                st.session_state.df_prod_edit,
+                use_container_width=True,
+                num_rows="fixed",
+                key="editor_produccion",  # 🔑 CLAVE CRÍTICA
+                column_config={
+                    lote: st.column_config.NumberColumn()
+                    for lote in lotes
+                }
+            )
+
+            guardar = st.form_submit_button("💾 Guardar Producción")
+
+        # =========================
+        # GUARDADO
+        # =========================
+        if guardar:
+            st.session_state.df_prod_edit = df_edit.copy()
+
+            for lote in lotes:
+                st.session_state.datos_productivos.setdefault(lote, {})
+                for campo, key in campos_prod.items():
+                    st.session_state.datos_productivos[lote][key] = float(
+                        df_edit.loc[campo, lote]
+                    )
 
-        guardar = st.form_submit_button("💾 Guardar Producción")
+                st.session_state.datos_productivos[lote]["VALIDACION"] = "CERRADO"
+
+            anotar_contexto(datos_productivos=st.session_state.datos_productivos)
+            st.success("✅ Datos de PRODUCCIÓN guardados correctamente")
 
     # =========================
-    # GUARDADO
+    # DATOS PRODUCTIVOS – LEVANTE (TABLAS INVERTIDAS)
     # =========================
-    if guardar:
-        st.session_state.df_prod_edit = df_edit.copy()
-
-        for lote in lotes:
-            st.session_state.datos_productivos.setdefault(lote, {})
-            for campo, key in campos_prod.items():
-                st.session_state.datos_productivos[lote][key] = float(
-                    df_edit.loc[campo, lote]
-                )
+    if tipo == "LEVANTE":
 
-            st.session_state.datos_productivos[lote]["VALIDACION"] = "CERRADO"
+        st.subheader("🐔 Información productiva – Levante")
 
-        st.success("✅ Datos de PRODUCCIÓN guardados correctamente")
+        # =====================================================
+        # ♀️ HEMBRAS
+        # =====================================================
+        st.markdown("### ♀️ Hembras")
 
-# =========================
-# DATOS PRODUCTIVOS – LEVANTE (TABLAS INVERTIDAS)
-# =========================
-if tipo == "LEVANTE":
-
-    st.subheader("🐔 Información productiva – Levante")
-
-    # =====================================================
-    # ♀️ HEMBRAS
-    # =====================================================
-    st.markdown("### ♀️ Hembras")
-
-    campos_h = {
-        "Edad": "EDAD",
-        "Uniformidad (%)": "UNIFORMIDAD",
-        "Aves entregadas": "AVES_ENTREGADAS",
-        "Población inicial": "POBLACION_INICIAL",
-        "% Cumpl. aves": "PCT_CUMP_AVES",
-        "Peso": "PESO",
-        "Peso STD": "PESO_STD",
-        "% Cumpl. peso": "PCT_CUMP_PESO",
-    }
+        campos_h = CAMPOS_H
 
-    data_h = {
-        campo: [
-            st.session_state.datos_productivos
-            .get(lote, {})
-            .get("HEMBRAS", {})
-            .get(key, 2.53 if key == "PESO_STD" else 0)
-            for lote in lotes
-        ]
-        for campo, key in campos_h.items()
-    }
+        df_h = tabla_hembras(st.session_state.datos_productivos, lotes)
 
-    df_h = pd.DataFrame(data_h, index=lotes).T
+        with st.form("form_levante_hembras"):
+            df_h_edit = st.data_editor(
+                df_h,
+                use_container_width=True,
+                num_rows="fixed",
+                column_config={
+                    lote: st.column_config.NumberColumn()
+                    for lote in lotes
+                }
+            )
 
-    # (opcional) redondeo lógico
-    df_h.loc["Peso STD"] = df_h.loc["Peso STD"].astype(float).round(2)
+            guardar_h = st.form_submit_button("💾 Guardar Hembras")
 
-    with st.form("form_levante_hembras"):
-        df_h_edit = st.data_editor(
-            df_h,
-            use_container_width=True,
-            num_rows="fixed",
-            column_config={
-                lote: st.column_config.NumberColumn()
-                for lote in lotes
-            }
-        )
+        if guardar_h:
+            for lote in lotes:
+                st.session_state.datos_productivos.setdefault(lote, {})
+                st.session_state.datos_productivos[lote]["HEMBRAS"] = {
+                    key: float(df_h_edit.loc[campo, lote])
+                    for campo, key in campos_h.items()
+                }
 
-        guardar_h = st.form_submit_button("💾 Guardar Hembras")
+            anotar_contexto(datos_productivos=st.session_state.datos_productivos)
+            st.success("✅ Datos de HEMBRAS guardados correctamente")
 
-    if guardar_h:
-        for lote in lotes:
-            st.session_state.datos_productivos.setdefault(lote, {})
-            st.session_state.datos_productivos[lote]["HEMBRAS"] = {
-                key: float(df_h_edit.loc[campo, lote])
-                for campo, key in campos_h.items()
-            }
+        # =====================================================
+        # ♂️ MACHOS
+        # =====================================================
+        st.markdown("### ♂️ Machos")
 
-        st.success("✅ Datos de HEMBRAS guardados correctamente")
-
-    # =====================================================
-    # ♂️ MACHOS
-    # =====================================================
-    st.markdown("### ♂️ Machos")
-
-    campos_m = {
-        "Edad": "EDAD",
-        "Uniformidad (%)": "UNIFORMIDAD",
-        "Aves entregadas": "AVES_ENTREGADAS",
-        "Población inicial": "POBLACION_INICIAL",
-        "Peso": "PESO",
-        "Peso STD": "PESO_STD",
-        "% Cumpl. peso": "PCT_CUMP_PESO",
-    }
+        campos_m = CAMPOS_M
 
-    data_m = {
-        campo: [
-            st.session_state.datos_productivos
-            .get(lote, {})
-            .get("MACHOS", {})
-            .get(key, 2.955 if key == "PESO_STD" else 0)
-            for lote in lotes
-        ]
-        for campo, key in campos_m.items()
-    }
+        df_m = tabla_machos(st.session_state.datos_productivos, lotes)
 
-    df_m = pd.DataFrame(data_m, index=lotes).T
+        with st.form("form_levante_machos"):
+            df_m_edit = st.data_editor(
+                df_m,
+                use_container_width=True,
+                num_rows="fixed",
+                column_config={
+                    lote: st.column_config.NumberColumn()
+                    for lote in lotes
+                }
+            )
 
-    # 🔒 PESO STD MACHOS → SIEMPRE 3 DECIMALES
-    df_m.loc["Peso STD"] = df_m.loc["Peso STD"].astype(float).round(3)
+            guardar_m = st.form_submit_button("💾 Guardar Machos")
 
-    with st.form("form_levante_machos"):
-        df_m_edit = st.data_editor(
-            df_m,
-            use_container_width=True,
-            num_rows="fixed",
-            column_config={
-                lote: st.column_config.NumberColumn()
-                for lote in lotes
-            }
-        )
+        if guardar_m:
+            for lote in lotes:
+                st.session_state.datos_productivos.setdefault(lote, {})
+                st.session_state.datos_productivos[lote]["MACHOS"] = {
+                    key: float(df_m_edit.loc[campo, lote])
+                    for campo, key in campos_m.items()
+                }
 
-        guardar_m = st.form_submit_button("💾 Guardar Machos")
+            anotar_contexto(datos_productivos=st.session_state.datos_productivos)
+            st.success("✅ Datos de MACHOS guardados correctamente")
 
-    if guardar_m:
-        for lote in lotes:
-            st.session_state.datos_productivos.setdefault(lote, {})
-            st.session_state.datos_productivos[lote]["MACHOS"] = {
-                key: float(df_m_edit.loc[campo, lote])
-                for campo, key in campos_m.items()
-            }
 
-        st.success("✅ Datos de MACHOS guardados correctamente")
+seccion_datos_productivos(tipo, lotes)
 
 # =========================
 # 🧬 CONFIGURACIÓN POR LOTE (CORREGIDO DEFINITIVO)
+# 🔄 FRAGMENTO – Depende de: lotes
+# Escribe: st.session_state.config_lotes. Solo un cambio de MONTO
+# obliga a recalcular pagos (rerun completo); la genética no.
 # =========================
-st.subheader("🧬 Configuración por lote")
-
 # 🔒 Blindaje
 if "config_lotes" not in st.session_state:
     st.session_state.config_lotes = {}
 
-config_lotes = st.session_state.config_lotes
-cols = st.columns(len(lotes))
 
-for i, lote in enumerate(lotes):
-    with cols[i]:
+def marcar_monto_cambiado():
+    st.session_state.monto_cambiado = True
 
-        # 🔑 Lectura SEGURA
-        data_lote = config_lotes.get(lote, {})
-        valor_gen = data_lote.get("GENETICA", "ROSS")
-        valor_monto = data_lote.get("MONTO", 0.0)
 
-        genetica = st.text_input(
-            f"Genética - Lote {lote}",
-            value=str(valor_gen),
-            key=f"gen_{lote}"
-        )
+@st.fragment
+def seccion_config_lotes(lotes):
 
-        monto = st.number_input(
-            f"Monto S/ - Lote {lote}",
-            min_value=0.0,
-            step=50.0,
-            value=float(valor_monto),
-            key=f"monto_{lote}"
-        )
+    st.subheader("🧬 Configuración por lote")
 
-        # 💾 Guardado
-        config_lotes[lote] = {
-            "GENETICA": genetica.strip().upper(),
-            "MONTO": float(monto)
-        }
+    config_lotes = st.session_state.config_lotes
+    cols = st.columns(len(lotes))
+
+    for i, lote in enumerate(lotes):
+        with cols[i]:
 
-# Persistir
-st.session_state.config_lotes = config_lotes
+            # 🔑 Lectura SEGURA
+            data_lote = config_lotes.get(lote, {})
+            valor_gen = data_lote.get("GENETICA", "ROSS")
+            valor_monto = data_lote.get("MONTO", 0.0)
 
+            genetica = st.text_input(
+                f"Genética - Lote {lote}",
+                value=str(valor_gen),
+                key=f"gen_{lote}"
+            )
 
-# SESSION STATE tabla
-if "tabla" not in st.session_state:
-    st.session_state.tabla = df.copy()
-    for lote in lotes:
-        st.session_state.tabla[f"P_{lote}"] = 0.0
-        st.session_state.tabla[f"F_{lote}"] = 0
-else:
-    for lote in lotes:
-        if f"P_{lote}" not in st.session_state.tabla.columns:
-            st.session_state.tabla[f"P_{lote}"] = 0.0
-        if f"F_{lote}" not in st.session_state.tabla.columns:
-            st.session_state.tabla[f"F_{lote}"] = 0
-
-# Ordenar columnas
-base_cols = ["DNI","NOMBRE COMPLETO","CARGO"]
-pct_cols = [f"P_{l}" for l in lotes]
-faltas_cols = [f"F_{l}" for l in lotes]
-st.session_state.tabla = st.session_state.tabla[base_cols + pct_cols + faltas_cols]
-
-# Sincronizar df_edit
-if "df_edit" not in st.session_state:
-    st.session_state.df_edit = st.session_state.tabla.copy()
+            monto = st.number_input(
+                f"Monto S/ - Lote {lote}",
+                min_value=0.0,
+                step=50.0,
+                value=float(valor_monto),
+                key=f"monto_{lote}",
+                on_change=marcar_monto_cambiado
+            )
+
+            # 💾 Guardado
+            config_lotes[lote] = {
+                "GENETICA": genetica.strip().upper(),
+                "MONTO": float(monto)
+            }
+
+    # Persistir
+    st.session_state.config_lotes = config_lotes
+    anotar_contexto(config_lotes=config_lotes)
+
+    # Un monto editado por el usuario cambia los pagos → recalcular toda la página
+    if st.session_state.pop("monto_cambiado", False):
+        st.rerun()
+
+
+seccion_config_lotes(lotes)
+config_lotes = st.session_state.config_lotes
+
+# SESSION STATE: trabajadores + participación en formato largo. Un lote
+# nuevo no agrega nada (sin filas = 0); uno quitado deja de contar.
+if "trabajadores" not in st.session_state:
+    guardar_largo(compactar_tabla(df[COLUMNAS_BASE], lotes), largo_vacio(lotes))
 else:
-    for col in st.session_state.tabla.columns:
-        if col not in st.session_state.df_edit.columns:
-            st.session_state.df_edit[col] = st.session_state.tabla[col]
-    st.session_state.df_edit = st.session_state.df_edit[st.session_state.tabla.columns]
-
-# Agregar trabajador
-st.subheader("➕ Agregar trabajador")
-dni_new = st.text_input("DNI", key="dni_preview", placeholder="Ingrese DNI y luego haga click en Agregar")
-dni_limpio = dni_new.strip().zfill(8) if dni_new else ""
-if dni_limpio:
-    if dni_limpio in st.session_state.tabla["DNI"].values:
-        st.warning("⚠️ El trabajador ya existe en la tabla")
-    else:
-        fila_prev = df_base[df_base["DNI"]==dni_limpio]
-        if not fila_prev.empty:
-            st.markdown(f"<span style='color:#1f77b4; font-weight:bold;'>👤 {fila_prev.iloc[0]['NOMBRE COMPLETO']}</span>", unsafe_allow_html=True)
-        else:
-            st.error("❌ DNI no encontrado en la base de trabajadores")
+    participacion = filtrar(st.session_state.participacion, st.session_state.trabajadores, lotes)
+    if participacion is not st.session_state.participacion:
+        guardar_largo(st.session_state.trabajadores, participacion)
 
-if st.button("Agregar trabajador"):
-    if not dni_limpio:
-        st.warning("⚠️ Ingrese un DNI")
-    elif dni_limpio in st.session_state.tabla["DNI"].values:
-        st.warning("⚠️ El trabajador ya existe en la tabla")
-    else:
-        fila = df_base[df_base["DNI"]==dni_limpio]
-        if fila.empty:
-            st.error("❌ DNI no encontrado en la base de trabajadores")
+
+def cargar_participacion(largo, lotes, aviso_extra="", **reporte_extra):
+    """
+    Aplica a la tabla un DataFrame largo DNI, LOTE, P, F (una sola línea
+    en el diario) y recarga la página con el aviso y lo no aplicado.
+    """
+    previa = vista_tabla(lotes)
+    tabla, reporte = aplicar_participacion(previa, largo, lotes)
+    tabla = compactar_tabla(tabla, lotes)
+    cambios = cambios_tabla(previa, tabla)
+    if cambios:
+        anotar("editar", cambios=cambios)
+    guardar_ancha(tabla, lotes)
+
+    st.session_state.reporte_masivo = {**reporte, **reporte_extra}
+    aviso = (
+        f"✅ Participación y faltas cargadas: {len(reporte['actualizados']):,} trabajadores, "
+        f"{len(cambios):,} celdas cambiadas"
+    )
+    if reporte["filas_repetidas"]:
+        aviso += f" ({reporte['filas_repetidas']:,} filas repetidas: se tomó la última)"
+    st.session_state.aviso_tabla = aviso + aviso_extra
+    st.rerun()
+
+
+# =========================
+# 🔄 FRAGMENTO: TRABAJADORES (AGREGAR / ELIMINAR / EDITAR)
+# Depende de: lotes. Escribir el DNI solo recorre este bloque; los
+# cambios a la tabla sí recalculan la página completa (st.rerun).
+# =========================
+@st.fragment
+def seccion_trabajadores(lotes):
+
+    # Aviso del último cambio (sobrevive al st.rerun)
+    if "aviso_tabla" in st.session_state:
+        st.success(st.session_state.pop("aviso_tabla"))
+
+    # Lo que no se aplicó de una carga masiva (todo junto)
+    if "reporte_masivo" in st.session_state:
+        reporte = st.session_state.pop("reporte_masivo")
+        motivos = {
+            "ya_en_tabla": "DNI que ya estaban en la tabla",
+            "no_encontrados": "DNI no encontrados en la base de trabajadores",
+            "no_en_tabla": "DNI que no estaban en la tabla",
+            "repetidos": "DNI repetidos en la lista",
+            "lotes_desconocidos": "Lotes que no son de este proceso",
+            "estados_desconocidos": "Estados de asistencia no reconocidos (no cuentan)",
+        }
+        for clave, motivo in motivos.items():
+            valores = reporte.get(clave, [])
+            if valores:
+                st.warning(
+                    f"⚠️ {motivo} ({len(valores):,}): "
+                    + ", ".join(valores[:50])
+                    + (" …" if len(valores) > 50 else "")
+                )
+
+    # Índices por DNI (base de trabajadores y tabla actual)
+    indice_base = st.session_state.get("indice_base", {})
+    if "dnis_tabla" not in st.session_state:
+        st.session_state.dnis_tabla = set(st.session_state.trabajadores["DNI"])
+    dnis_tabla = st.session_state.dnis_tabla
+
+    # Agregar trabajador
+    st.subheader("➕ Agregar trabajador")
+    dni_new = st.text_input("DNI", key="dni_preview", placeholder="Ingrese DNI y luego haga click en Agregar")
+    dni_limpio = dni_new.strip().zfill(8) if dni_new else ""
+    fila_base = indice_base.get(dni_limpio) if dni_limpio else None
+    if dni_limpio:
+        if dni_limpio in dnis_tabla:
+            st.warning("⚠️ El trabajador ya existe en la tabla")
         else:
-            fila = fila.iloc[0]
-            nuevo = {"DNI": dni_limpio, "NOMBRE COMPLETO": fila["NOMBRE COMPLETO"], "CARGO": fila["CARGO"]}
-            for lote in lotes:
-                nuevo[f"P_{lote}"] = 0.0
-                nuevo[f"F_{lote}"] = 0
-            st.session_state.tabla = pd.concat([st.session_state.tabla, pd.DataFrame([nuevo])], ignore_index=True)
-            st.session_state.df_edit = st.session_state.tabla.copy()
-            st.success("✅ Trabajador agregado")
-            st.rerun()
+            if fila_base is not None:
+                st.markdown(f"<span style='color:#1f77b4; font-weight:bold;'>👤 {fila_base['NOMBRE COMPLETO']}</span>", unsafe_allow_html=True)
+            else:
+                st.error("❌ DNI no encontrado en la base de trabajadores")
+
+    if st.button("Agregar trabajador"):
+        if not dni_limpio:
+            st.warning("⚠️ Ingrese un DNI")
+        elif dni_limpio in dnis_tabla:
+            st.warning("⚠️ El trabajador ya existe en la tabla")
+        else:
+            if fila_base is None:
+                st.error("❌ DNI no encontrado en la base de trabajadores")
+            else:
+                # Sin filas de participación: P y F en 0 en todos los lotes
+                nuevo = {"DNI": dni_limpio, "NOMBRE COMPLETO": fila_base["NOMBRE COMPLETO"], "CARGO": fila_base["CARGO"]}
+                previa = st.session_state.trabajadores
+                guardar_largo(
+                    compactar_tabla(pd.concat([previa, pd.DataFrame([nuevo])], ignore_index=True), lotes),
+                    reubicar_filas(st.session_state.participacion, previa.index)
+                )
+                anotar("agregar", fila=nuevo)
+                dnis_tabla.add(dni_limpio)
+                st.session_state.aviso_tabla = "✅ Trabajador agregado"
+                st.rerun()
 
-# Eliminar trabajador
-st.subheader("➖ Eliminar trabajador")
-eliminar_dni = st.text_input("DNI a eliminar").strip().zfill(8)
-if st.button("Eliminar trabajador"):
-    st.session_state.tabla = st.session_state.tabla[st.session_state.tabla["DNI"] != eliminar_dni]
-    st.session_state.df_edit = st.session_state.tabla.copy()
-    st.success("✅ Trabajador eliminado")
-
-# Editar tabla
-st.subheader("✍️ Registro por trabajador y lote")
-st.info(
-    "📌 **Leyenda de columnas**\n\n"
-    "**P:** Porcentaje de Participación.\n\n"
-    "**F:** Faltas Injustificadas."
-)
+    # Eliminar trabajador
+    st.subheader("➖ Eliminar trabajador")
+    eliminar_dni = st.text_input("DNI a eliminar").strip().zfill(8)
+    if st.button("Eliminar trabajador"):
+        trabajadores = st.session_state.trabajadores
+        trabajadores = trabajadores[trabajadores["DNI"] != eliminar_dni]
+        guardar_largo(trabajadores, filtrar(st.session_state.participacion, trabajadores, lotes))
+        anotar("eliminar", dni=eliminar_dni)
+        dnis_tabla.discard(eliminar_dni)
+        st.session_state.aviso_tabla = "✅ Trabajador eliminado"
+        st.rerun()
 
-with st.form("form_edicion"):
-    df_edit = st.data_editor(
-        st.session_state.df_edit,
-        use_container_width=True,
-        column_config={
-            "CARGO": st.column_config.SelectboxColumn(
-                "CARGO",
-                options=CARGOS_VALIDOS,
-                required=True
+    # Alta / baja masiva: un solo cruce con la base y un solo rerun
+    st.subheader("📋 Agregar o eliminar varios trabajadores")
+    with st.expander("Pegar o subir una lista de DNIs"):
+        texto_dnis = st.text_area("DNIs (uno por línea, o separados por comas)", key="dnis_masivos")
+        archivo_dnis = st.file_uploader("… o un Excel con columna DNI", type=["xlsx"], key="archivo_dnis_masivos")
+
+        dnis_lista = dnis_de_texto(texto_dnis)
+        if archivo_dnis:
+            dnis_lista += dnis_de_excel(archivo_dnis.getvalue())
+        st.caption(f"{len(dnis_lista):,} DNI en la lista")
+
+        col_alta, col_baja = st.columns(2)
+        with col_alta:
+            alta = st.button("➕ Agregar todos", disabled=not dnis_lista)
+        with col_baja:
+            baja = st.button("➖ Eliminar todos", disabled=not dnis_lista)
+
+        if alta:
+            previa = st.session_state.trabajadores
+            trabajadores, reporte = alta_masiva(previa, dnis_lista, indice_base, [])
+            guardar_largo(
+                compactar_tabla(trabajadores, lotes),
+                reubicar_filas(st.session_state.participacion, previa.index)
             )
-        }
+            if reporte["agregados"]:
+                anotar("agregar", filas=trabajadores.iloc[len(previa):].to_dict("records"))
+            dnis_tabla.update(reporte["agregados"])
+            st.session_state.reporte_masivo = reporte
+            st.session_state.aviso_tabla = f"✅ {len(reporte['agregados']):,} trabajadores agregados"
+            st.rerun()
+
+        if baja:
+            trabajadores, reporte = baja_masiva(st.session_state.trabajadores, dnis_lista)
+            guardar_largo(trabajadores, filtrar(st.session_state.participacion, trabajadores, lotes))
+            if reporte["eliminados"]:
+                anotar("eliminar", dnis=reporte["eliminados"])
+            dnis_tabla.difference_update(reporte["eliminados"])
+            st.session_state.reporte_masivo = reporte
+            st.session_state.aviso_tabla = f"✅ {len(reporte['eliminados']):,} trabajadores eliminados"
+            st.rerun()
+
+    # Participación y faltas desde una hoja larga (DNI, LOTE, P, F)
+    st.subheader("📤 Cargar participación y faltas desde archivo")
+    with st.expander("Subir hoja con una fila por trabajador y lote"):
+        st.caption(
+            "Columnas: DNI, LOTE, PARTICIPACIÓN y/o FALTAS. "
+            "Las celdas vacías no cambian el valor actual."
+        )
+
+        # Se arma solo al hacer clic (con la tabla de este momento)
+        tabla_actual, lotes_actuales = vista_tabla(lotes), list(lotes)
+        st.download_button(
+            "📄 Descargar plantilla con los valores actuales",
+            data=lambda: plantilla_participacion(tabla_actual, lotes_actuales),
+            file_name="plantilla_participacion.xlsx"
+        )
+
+        archivo_part = st.file_uploader("Hoja de participación y faltas", type=["xlsx"], key="archivo_participacion")
+        if archivo_part and st.button("✅ Aplicar a la tabla"):
+            try:
+                largo = leer_participacion(archivo_part.getvalue())
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                cargar_participacion(largo, lotes)
+
+    with st.expander("Calcular desde los registros de asistencia"):
+        st.caption(
+            "Asistencia: DNI, FECHA y ESTADO (o una fila por marcación). "
+            "Asignación: DNI, FECHA y LOTE; no hace falta si la asistencia ya trae LOTE. "
+            "F = días asignados al lote con falta injustificada o sin marcación; "
+            "P = días trabajados en el lote / días del periodo."
+        )
+        archivo_asistencia = st.file_uploader(
+            "Registros de asistencia", type=["csv", "xlsx"], key="archivo_asistencia"
+        )
+        archivo_asignacion = st.file_uploader(
+            "Asignación de turnos por lote (opcional)", type=["csv", "xlsx"], key="archivo_asignacion"
+        )
+        dias_periodo = st.number_input(
+            "Días del periodo (0 = los días de los registros)", min_value=0, max_value=366, value=0, step=1
+        )
+
+        if archivo_asistencia and st.button("⚙️ Calcular y aplicar a la tabla"):
+            try:
+                with st.spinner("Leyendo registros de asistencia..."):
+                    largo, resumen = derivar_participacion(
+                        archivo_asistencia.getvalue(),
+                        archivo_asignacion.getvalue() if archivo_asignacion else None,
+                        lotes=lotes,
+                        dias_periodo=dias_periodo or None
+                    )
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                aviso = (
+                    f" · {resumen['filas']:,} registros, {resumen['dias_periodo']} días del periodo"
+                )
+                if resumen["dias_sin_marcacion"]:
+                    aviso += f", {resumen['dias_sin_marcacion']:,} días asignados sin marcación (contados como falta)"
+                if resumen["dias_sin_lote"]:
+                    aviso += f", {resumen['dias_sin_lote']:,} días trabajados sin lote asignado (no cuentan)"
+                cargar_participacion(
+                    largo, lotes, aviso, estados_desconocidos=resumen["estados_desconocidos"]
+                )
+
+    # Editar tabla
+    st.subheader("✍️ Registro por trabajador y lote")
+    st.info(
+        "📌 **Leyenda de columnas**\n\n"
+        "**P:** Porcentaje de Participación.\n\n"
+        "**F:** Faltas Injustificadas."
     )
 
-    if st.form_submit_button("💾 Actualizar tabla"):
-        # Normalización defensiva
-        df_edit["CARGO"] = df_edit["CARGO"].str.upper().str.strip()
+    with st.form("form_edicion"):
+        tabla_vista = vista_tabla(lotes)
+        df_edit = st.data_editor(
+            tabla_vista,
+            use_container_width=True,
+            column_config={
+                "CARGO": st.column_config.SelectboxColumn(
+                    "CARGO",
+                    options=CARGOS_VALIDOS,
+                    required=True
+                ),
+                **{
+                    f"F_{lote}": st.column_config.NumberColumn(min_value=0, max_value=31, step=1)
+                    for lote in lotes
+                },
+            }
+        )
+
+        if st.form_submit_button("💾 Actualizar tabla"):
+            # Normalización defensiva
+            df_edit["CARGO"] = df_edit["CARGO"].str.upper().str.strip()
+
+            tabla_editada = compactar_tabla(df_edit, lotes)
+            cambios = cambios_tabla(tabla_vista, tabla_editada)
+            if cambios:
+                anotar("editar", cambios=cambios)
+            guardar_ancha(tabla_editada, lotes)
+            st.session_state.dnis_tabla = set(df_edit["DNI"])
+            st.session_state.aviso_tabla = "✅ Tabla actualizada"
+            st.rerun()
 
-        st.session_state.tabla = df_edit.copy()
-        st.session_state.df_edit = df_edit.copy()
-        st.success("✅ Tabla actualizada")
 
+seccion_trabajadores(lotes)
 
-# Cálculo final
-df_final = st.session_state.tabla.copy()
-pagos = []
-for lote in lotes:
-    col = f"PAGO_{lote}"
-    df_final[col] = df_final.apply(lambda r: round(
-        reglas.get(str(r["CARGO"]).upper(),0) * config_lotes[lote]["MONTO"] * (float(r[f"P_{lote}"])/100) * factor_faltas(r[f"F_{lote}"]),
-        2
-    ), axis=1)
-    pagos.append(col)
 
-df_final["TOTAL S/"] = df_final[pagos].sum(axis=1)
+# Cálculo final: sobre la participación en formato largo (solo si algo cambió)
+memo_bono = st.session_state.setdefault("memo_bono", {})
+with etapa("calculo", filas=len(st.session_state.trabajadores), lotes=len(lotes)):
+    df_final = recalcular_bono(
+        memo_bono,
+        vista_tabla(lotes),
+        st.session_state.participacion,
+        config_lotes,
+        reglas,
+        DESCUENTO_FALTAS,
+        lotes=lotes
+    )
+pagos = [f"PAGO_{lote}" for lote in lotes]
 
 # Resultado final
 st.subheader("💰 Resultado final")
@@ -1087,151 +1369,189 @@ st.dataframe(df_final, use_container_width=True)
 
 # Gráfico
 st.subheader("📊 Distribución de bonos por trabajador")
-fig = px.bar(df_final, x="NOMBRE COMPLETO", y="TOTAL S/", text="TOTAL S/", title="Bono total por trabajador")
-fig.update_traces(texttemplate="S/ %{text:,.2f}", textposition="outside", cliponaxis=False)
-fig.update_layout(xaxis_tickangle=-45, height=550, margin=dict(t=100), yaxis=dict(rangemode="tozero"))
-st.plotly_chart(fig, use_container_width=True)
+col_modo, col_top = st.columns([3, 1])
+with col_modo:
+    modo_grafico = st.selectbox(
+        "Vista",
+        MODOS_GRAFICO,
+        index=MODOS_GRAFICO.index(modo_por_defecto(len(df_final))),
+        key="modo_grafico"
+    )
+with col_top:
+    top_n = st.number_input("N", min_value=5, max_value=200, value=30, step=5, key="top_n_grafico")
+
+with etapa("grafico_trabajadores", filas=len(df_final), modo=modo_grafico):
+    # Misma huella y misma vista → misma figura, sin reconstruirla
+    huella_df_final = huella_resultado(df_final)
+    fig = figura_trabajadores_cache(huella_df_final, modo_grafico, int(top_n), df_final)
+    st.plotly_chart(fig, use_container_width=True)
 
 # =========================
-# 📤 EXPORTAR EXCEL COMPLETO
+# 📤 EXPORTAR EXCEL COMPLETO (SOLO CUANDO SE NECESITA)
 # =========================
-output = BytesIO()
+memo_excel = st.session_state.setdefault("memo_excel", {})
+
+# Referencias (no copias): los fragmentos modifican config_lotes y
+# datos_productivos en el mismo dict sin rerun completo
+estado_excel = dict(
+    granja=st.session_state.get("granja_seleccionada", ""),
+    tipo=tipo,
+    lotes=list(lotes),
+    config_lotes=st.session_state.config_lotes,
+    datos_productivos=st.session_state.datos_productivos,
+    tabla=vista_tabla(lotes),
+    df_final=df_final,
+)
 
-with pd.ExcelWriter(output, engine="openpyxl") as writer:
-    sheet_name = "BONO_REPRODUCTORAS"
-    fila_actual = 0
+# 💾 Autoguardado: primera foto de la sesión, o foto nueva cada COMPACTAR_CADA cambios
+contexto_diario = {k: estado_excel[k] for k in ("granja", "tipo", "lotes", "config_lotes", "datos_productivos")}
+if not st.session_state.get("diario_iniciado") or diario.pendientes >= COMPACTAR_CADA:
+    try:
+        with etapa("autoguardado_foto", filas=len(st.session_state.trabajadores)):
+            diario.foto(estado_excel)
+        st.session_state.diario_iniciado = True
+        st.session_state.diario_contexto = huellas_contexto(contexto_diario)
+    except OSError:
+        pass
+else:
+    anotar_contexto(**contexto_diario)
 
-    # =========================
-    # 1️⃣ ENCABEZADO
-    # =========================
-    encabezado = pd.DataFrame({
-        "Campo": ["Granja", "Tipo de Proceso", "Lotes", "Fecha de Generación"],
-        "Valor": [
-            st.session_state.get("granja_seleccionada", ""),
-            tipo,
-            ", ".join(lotes),
-            pd.Timestamp.now().strftime("%Y-%m-%d %H:%M")
-        ]
-    })
-    encabezado.to_excel(
-        writer,
-        sheet_name=sheet_name,
-        index=False,
-        startrow=fila_actual
-    )
-    fila_actual += len(encabezado) + 2
 
-    # =========================
-    # 2️⃣ CONFIGURACIÓN DE LOTES
-    # =========================
-    df_lotes = pd.DataFrame([
-        {
-            "Lote": l,
-            "Genética": config_lotes[l]["GENETICA"],
-            "Monto S/": config_lotes[l]["MONTO"]
-        }
-        for l in lotes
-    ])
-    df_lotes.to_excel(
-        writer,
-        sheet_name=sheet_name,
-        index=False,
-        startrow=fila_actual
+def foto_estado_excel():
+    # El callable de descarga puede ejecutarse en otro hilo
+    return dict(
+        estado_excel,
+        config_lotes=copy.deepcopy(estado_excel["config_lotes"]),
+        datos_productivos=copy.deepcopy(estado_excel["datos_productivos"]),
     )
-    fila_actual += len(df_lotes) + 3
 
-    # =========================
-    # 3️⃣ DATOS PRODUCTIVOS
-    # =========================
-    if tipo == "PRODUCCIÓN":
-        df_prod_excel = pd.DataFrame(data_prod, index=lotes).T
-        df_prod_excel.to_excel(
-            writer,
-            sheet_name=sheet_name,
-            index=True,
-            startrow=fila_actual
-        )
-        fila_actual += len(df_prod_excel) + 3
-
-    else:  # LEVANTE
-        df_h.to_excel(
-            writer,
-            sheet_name=sheet_name,
-            index=True,
-            startrow=fila_actual
-        )
-        fila_actual += len(df_h) + 3
 
-        df_m.to_excel(
-            writer,
-            sheet_name=sheet_name,
-            index=True,
-            startrow=fila_actual
+def obtener_excel():
+    return excel_memorizado(memo_excel, **foto_estado_excel())
+
+
+def registrar_en_historial():
+    # Una sola vez por estado (huella del último Excel generado) y periodo
+    huella = memo_excel.get("huella")
+    if huella is None:
+        return
+    huella = f"{huella}|{periodo_bono}"
+    if memo_excel.get("registrada") != huella:
+        _registrar(huella, foto_estado_excel(), periodo_bono)
+
+
+def registro_al_enviar():
+    # Foto del estado al encolar: el correo puede salir varios segundos después
+    foto = foto_estado_excel()
+    periodo = periodo_bono
+    huella = huella_estado(
+        foto["granja"],
+        foto["tipo"],
+        foto["lotes"],
+        foto["config_lotes"],
+        foto["datos_productivos"],
+        foto["tabla"]
+    ) + f"|{periodo}"
+
+    def registrar():
+        if memo_excel.get("registrada") != huella:
+            _registrar(huella, foto, periodo)
+        terminar_sesion()
+
+    return registrar
+
+
+def terminar_sesion():
+    # Excel descargado o correo enviado: ya no se ofrece para recuperar.
+    # Puede correr en otro hilo: no usa session_state
+    try:
+        diario.terminar()
+    except OSError:
+        pass
+
+
+def _registrar(huella, foto, periodo):
+    try:
+        registrar_corrida(
+            huella,
+            foto["granja"],
+            foto["tipo"],
+            foto["lotes"],
+            foto["config_lotes"],
+            foto["datos_productivos"],
+            foto["df_final"],
+            periodo=periodo
         )
-        fila_actual += len(df_m) + 3
+        memo_excel["registrada"] = huella
+    except sqlite3.Error:
+        # El histórico nunca debe impedir la descarga ni el envío
+        pass
+
+
+def obtener_borrador():
+    foto = foto_estado_excel()
+    with trazado("borrador", trazas_recientes):
+        with etapa("borrador", filas=len(foto["tabla"])) as e:
+            contenido = guardar_borrador(
+                foto["granja"],
+                foto["tipo"],
+                foto["lotes"],
+                foto["config_lotes"],
+                foto["datos_productivos"],
+                foto["tabla"]
+            )
+            e["bytes"] = len(contenido)
+    return contenido
 
-    # =========================
-    # 4️⃣ RESUMEN POR LOTE (RECALCULADO AQUÍ)
-    # =========================
-    pagos_cols = [c for c in df_final.columns if c.startswith("PAGO_")]
 
-    resumen_lote_excel = (
-        df_final[pagos_cols]
-        .sum()
-        .reset_index()
-        .rename(columns={"index": "Lote", 0: "Total S/"})
-    )
+def obtener_excel_final():
+    # Corre en el hilo de la descarga: traza propia
+    with trazado("descarga", trazas_recientes):
+        contenido = obtener_excel()
+        registrar_en_historial()
+        terminar_sesion()
+    return contenido
 
-    resumen_lote_excel["Lote"] = resumen_lote_excel["Lote"].str.replace("PAGO_", "")
-    total_general = resumen_lote_excel["Total S/"].sum()
 
-    resumen_lote_excel["% del total"] = (
-        resumen_lote_excel["Total S/"] / total_general * 100
-    ).round(2)
+# =========================
+# 🔄 FRAGMENTO: DESCARGA
+# El clic de descarga no vuelve a ejecutar la página
+# =========================
+@st.fragment
+def seccion_descarga(tipo):
 
-    resumen_lote_excel.to_excel(
-        writer,
-        sheet_name=sheet_name,
-        index=False,
-        startrow=fila_actual
+    # =========================
+    # 🏷️ NOMBRE DEL ARCHIVO
+    # =========================
+    nombre_archivo = (
+        f"Bono_Reproductoras_"
+        f"{st.session_state.get('granja_seleccionada','NA').replace(' ','')}_"
+        f"{tipo}_"
+        f"{pd.Timestamp.now():%Y%m%d_%H%M}.xlsx"
     )
-    fila_actual += len(resumen_lote_excel) + 2
 
     # =========================
-    # 5️⃣ RESULTADO FINAL POR TRABAJADOR
+    # 📥 BOTÓN DE DESCARGA
     # =========================
-    df_final.to_excel(
-        writer,
-        sheet_name=sheet_name,
-        index=False,
-        startrow=fila_actual
+    st.download_button(
+        "📥 Descargar archivo final",
+        data=obtener_excel_final,
+        file_name=nombre_archivo
     )
 
-# =========================
-# 🏷️ NOMBRE DEL ARCHIVO
-# =========================
-nombre_archivo = (
-    f"Bono_Reproductoras_"
-    f"{st.session_state.get('granja_seleccionada','NA').replace(' ','')}_"
-    f"{tipo}_"
-    f"{pd.Timestamp.now():%Y%m%d_%H%M}.xlsx"
-)
+    # Para seguir después: se carga con "📝 Continuar borrador guardado"
+    st.download_button(
+        "📝 Descargar borrador para continuar luego",
+        data=obtener_borrador,
+        file_name=nombre_archivo.replace("Bono_Reproductoras_", "Borrador_").replace(".xlsx", f".{EXTENSION_BORRADOR}")
+    )
 
-# =========================
-# 📥 BOTÓN DE DESCARGA
-# =========================
-st.download_button(
-    "📥 Descargar archivo final",
-    data=output.getvalue(),
-    file_name=nombre_archivo
-)
+
+seccion_descarga(tipo)
 
 # =========================
 # PREVISUALIZAR Y ENVIAR POR CORREO (MICROSOFT 365)
 # =========================
-import smtplib
-from email.message import EmailMessage
-
 st.subheader("📬 Opciones finales")
 
 tab1, tab2 = st.tabs(["📊 Previsualizar resultado", "📧 Enviar por correo"])
@@ -1247,8 +1567,7 @@ with tab1:
     total_general = df_final["TOTAL S/"].sum()
     num_trabajadores = df_final.shape[0]
     lote_mayor = (
-        df_final[pagos]
-        .sum()
+        memo_bono["totales"]
         .idxmax()
         .replace("PAGO_", "")
     )
@@ -1271,16 +1590,8 @@ with tab1:
 
     if tipo == "PRODUCCIÓN":
 
-        campos_prod = {
-            "Etapa": "ETAPA",
-            "Edad (sem)": "EDAD_AVE",
-            "Huevos sem 41": "HUEVOS_SEM_41",
-            "Población inicial": "POBLACION_INICIAL",
-            "Huevos / AA": "HUEVOS_POR_AA",
-            "Huevos STD 41": "HUEVOS_STD_41",
-            "% Cumplimiento": "PCT_CUMPLIMIENTO",
-            "% Huevos bomba": "PCT_HUEVOS_BOMBA",
-        }
+        # La vista previa muestra además la etapa del lote
+        campos_prod = {"Etapa": "ETAPA", **CAMPOS_PROD}
 
         data_prod = {
             campo: [
@@ -1300,16 +1611,7 @@ with tab1:
         # ---------- HEMBRAS ----------
         st.markdown("#### ♀️ Levante – Hembras")
 
-        campos_h = {
-            "Edad": "EDAD",
-            "Uniformidad (%)": "UNIFORMIDAD",
-            "Aves entregadas": "AVES_ENTREGADAS",
-            "Población inicial": "POBLACION_INICIAL",
-            "% Cumpl. aves": "PCT_CUMP_AVES",
-            "Peso": "PESO",
-            "Peso STD": "PESO_STD",
-            "% Cumpl. peso": "PCT_CUMP_PESO",
-        }
+        campos_h = CAMPOS_H
 
         data_h = {
             campo: [
@@ -1328,15 +1630,7 @@ with tab1:
         # ---------- MACHOS ----------
         st.markdown("#### ♂️ Levante – Machos")
 
-        campos_m = {
-            "Edad": "EDAD",
-            "Uniformidad (%)": "UNIFORMIDAD",
-            "Aves entregadas": "AVES_ENTREGADAS",
-            "Población inicial": "POBLACION_INICIAL",
-            "Peso": "PESO",
-            "Peso STD": "PESO_STD",
-            "% Cumpl. peso": "PCT_CUMP_PESO",
-        }
+        campos_m = CAMPOS_M
 
         data_m = {
             campo: [
@@ -1361,17 +1655,7 @@ with tab1:
     # =========================
     # RESUMEN POR LOTE (SE CREA AQUÍ)
     # =========================
-    resumen_lote = (
-        df_final[pagos]
-        .sum()
-        .reset_index()
-        .rename(columns={"index": "Lote", 0: "Total S/"})
-    )
-
-    resumen_lote["Lote"] = resumen_lote["Lote"].str.replace("PAGO_", "")
-    resumen_lote["% del total"] = (
-        resumen_lote["Total S/"] / resumen_lote["Total S/"].sum() * 100
-    ).round(2)
+    resumen_lote = resumen_por_lote(df_final, memo_bono["totales"])
 
     st.markdown("### 📦 Resumen por lote")
     st.dataframe(resumen_lote, use_container_width=True)
@@ -1381,98 +1665,89 @@ with tab1:
     # =========================
     st.markdown("### 📊 Distribución de pago por lote")
 
-    import plotly.express as px
+    with etapa("grafico_lotes", filas=len(resumen_lote)):
+        fig = figura_resumen_lote_cache(huella_df_final, resumen_lote)
+        st.plotly_chart(fig, use_container_width=True)
 
-    fig = px.bar(
-        resumen_lote,
-        x="Lote",
-        y="Total S/",
-        text="Total S/",
-        labels={"Total S/": "Total S/"},
-    )
 
-    fig.update_traces(
-        texttemplate="S/ %{text:.2f}",
-        textposition="outside"
+# -------- TAB 2: ENVIAR POR CORREO --------
+@st.cache_resource
+def cola_correo():
+    # Un hilo de envío y una sesión SMTP para todo el proceso
+    return ColaCorreo(
+        st.secrets.get("SMTP_HOST", "smtp.office365.com"),
+        int(st.secrets.get("SMTP_PORT", 587)),
+        st.secrets["EMAIL_USER"],
+        st.secrets["EMAIL_PASS"],
+        starttls=como_bool(st.secrets.get("SMTP_STARTTLS", True)),
     )
 
-    fig.update_layout(
-        yaxis_title="Total S/",
-        xaxis_title="Lote",
-        uniformtext_minsize=8,
-        uniformtext_mode="hide",
-    )
 
-    st.plotly_chart(fig, use_container_width=True)
+MAPA_DESTINATARIOS_INICIAL = pd.DataFrame({"CORREO": [""], "LOTES": ["TODOS"]})
 
 
-# -------- TAB 2: ENVIAR POR CORREO --------
-with tab2:
-    st.markdown("### 📧 Enviar resultado por correo corporativo")
+def estado_envios(sondeando=False):
+    envios = st.session_state.get("envios_correo", [])
+    if not envios:
+        return
 
-    # ==================================================
-    # Helper: HTML compacto y limpio (Outlook-safe)
-    # ==================================================
-    def _estilizar_tabla_html(html: str, align_td: str = "right") -> str:
-        html = html.replace(
-            "<table",
-            "<table style='border-collapse:collapse; width:auto; max-width:760px; "
-            "font-family:Arial, sans-serif; font-size:12px;'"
-        )
-        html = html.replace(
-            "<th>",
-            "<th style='border:1px solid #d1d5db; background:#f3f4f6; "
-            "padding:6px 8px; text-align:left; white-space:nowrap;'>"
-        )
-        html = html.replace(
-            "<td>",
-            f"<td style='border:1px solid #d1d5db; padding:6px 8px; "
-            f"text-align:{align_td}; white-space:nowrap;'>"
+    cola = cola_correo()
+    estados = [e for e in (cola.estado(i) for i in envios) if e is not None]
+
+    # Terminaron todos: un rerun vuelve a armar la sección sin run_every
+    # (este fragmento no puede cambiar su propio intervalo)
+    if sondeando and all(e["estado"] in ESTADOS_FINALES for e in estados):
+        st.rerun()
+    iconos = {
+        "en cola": "🕓",
+        "enviando": "📤",
+        "reintentando": "🔁",
+        "enviado": "✅",
+        "error": "❌",
+    }
+
+    # Reporte por destinatario de la última distribución
+    lote_envio = st.session_state.get("envios_distribucion", [])
+    if lote_envio:
+        reporte = pd.DataFrame([
+            e for e in (cola.estado(i) for i in lote_envio) if e is not None
+        ])
+        enviados = (reporte["estado"] == "enviado").sum()
+        st.markdown(f"**📬 Distribución: {enviados} de {len(reporte)} enviados**")
+        reporte["estado"] = reporte["estado"].map(lambda v: f"{iconos.get(v, '')} {v}")
+        st.dataframe(
+            reporte[["destino", "estado", "intentos", "actualizado", "error"]],
+            use_container_width=True,
+            hide_index=True
         )
-        return html
+        return
 
-    # ==================================================
-    # Helper: tabla invertida (filas=campos)
-    # ==================================================
-    def tabla_html_limpia_invertida(df, decimales_por_fila=None):
-        df_fmt = df.copy()
-
-        for fila in df_fmt.index:
-            serie = pd.to_numeric(df_fmt.loc[fila], errors="coerce")
-            if serie.notna().any():
-                if decimales_por_fila and fila in decimales_por_fila:
-                    dec = int(decimales_por_fila[fila])
-                    df_fmt.loc[fila] = serie.apply(
-                        lambda x: f"{x:.{dec}f}" if pd.notna(x) else ""
-                    )
-                else:
-                    df_fmt.loc[fila] = serie.apply(
-                        lambda x: f"{int(x)}" if pd.notna(x) else ""
-                    )
+    for e in reversed(estados[-5:]):
+        detalle = f" – {e['error']}" if e["error"] else ""
+        st.caption(
+            f"{iconos.get(e['estado'], '')} {e['destino']} · {e['estado']} "
+            f"(intento {e['intentos']}, {e['actualizado'][11:]}){detalle}"
+        )
 
-        html = df_fmt.to_html(index=True, border=1)
-        return _estilizar_tabla_html(html, align_td="right")
 
-    # ==================================================
-    # Helper: tabla normal (filas = registros)
-    # ==================================================
-    def tabla_html_limpia_normal(df, decimales_por_col=None, alineacion="left"):
-        df_fmt = df.copy()
-
-        if decimales_por_col:
-            for c, dec in decimales_por_col.items():
-                if c in df_fmt.columns:
-                    df_fmt[c] = pd.to_numeric(df_fmt[c], errors="coerce").apply(
-                        lambda x: f"{x:.{int(dec)}f}" if pd.notna(x) else ""
-                    )
+# 🔄 FRAGMENTO: escribir destino, asunto o mensaje no recalcula la página
+# Depende de: tipo, lotes, df_final, resumen_lote
+@st.fragment
+def seccion_correo(tipo, lotes, df_final, resumen_lote):
+    st.markdown("### 📧 Enviar resultado por correo corporativo")
 
-        html = df_fmt.to_html(index=False, border=1)
-        return _estilizar_tabla_html(html, align_td=alineacion)
+    modo_correo = st.radio(
+        "Destinatarios",
+        ["Un destinatario", "Distribución por destinatario"],
+        horizontal=True,
+        key="modo_correo"
+    )
 
     # ==================================================
     # Inputs
     # ==================================================
-    correo_destino = st.text_input("Correo destino", key="correo_destino")
+    if modo_correo == "Un destinatario":
+        correo_destino = st.text_input("Correo destino", key="correo_destino")
     asunto = st.text_input(
         "Asunto",
         value="Resultado Bono Reproductoras GDP",
@@ -1483,187 +1758,176 @@ with tab2:
         value="Adjunto encontrará el resultado del bono generado.",
         key="mensaje_correo"
     )
+    granja = st.session_state.get("granja_seleccionada", "")
+
+    if modo_correo == "Un destinatario":
+        if st.button("📨 Enviar correo", key="btn_enviar_correo"):
+            if not correo_destino:
+                st.warning("Ingrese un correo destino")
+            else:
+                try:
+                    with trazado("correo", trazas_recientes, filas=len(df_final)):
+                        with etapa("correo_html") as e:
+                            cuerpo_html = cuerpo_correo_html(
+                                granja,
+                                tipo,
+                                lotes,
+                                st.session_state.datos_productivos,
+                                resumen_lote,
+                                df_final,
+                                mensaje
+                            )
+                            e["bytes"] = len(cuerpo_html.encode("utf-8"))
+
+                        msg = mensaje_correo(
+                            st.secrets["EMAIL_USER"],
+                            correo_destino,
+                            asunto,
+                            cuerpo_html,
+                            obtener_excel()
+                        )
+
+                        # El envío sigue en segundo plano; la página no espera al servidor
+                        id_envio = cola_correo().encolar(msg, al_enviar=registro_al_enviar())
+
+                    st.session_state.setdefault("envios_correo", []).append(id_envio)
+                    st.session_state.pop("envios_distribucion", None)
+                    st.info("📤 Correo en cola de envío")
+
+                except Exception as e:
+                    st.error(f"❌ Error al preparar el correo: {e}")
 
-    if st.button("📨 Enviar correo", key="btn_enviar_correo"):
-        if not correo_destino:
-            st.warning("Ingrese un correo destino")
-        else:
-            try:
-                msg = EmailMessage()
-                msg["From"] = st.secrets["EMAIL_USER"]
-                msg["To"] = correo_destino
-                msg["Subject"] = asunto
-
-                # =========================
-                # 📦 Resumen por lote (correo)
-                # =========================
-                tabla_lote_html = tabla_html_limpia_normal(
-                    resumen_lote,
-                    decimales_por_col={"Total S/": 2, "% del total": 2},
-                    alineacion="left"
-                )
-
-                # =========================
-                # 💰 Resultado final (correo)
-                # =========================
-                cols_pago = [c for c in df_final.columns if c.startswith("PAGO_")]
-                if "TOTAL S/" in df_final.columns:
-                    cols_pago.append("TOTAL S/")
-
-                tabla_resultado_html = tabla_html_limpia_normal(
-                    df_final,
-                    decimales_por_col={c: 2 for c in cols_pago},
-                    alineacion="left"
-                )
-
-                # =========================
-                # 🧬 Datos productivos
-                # =========================
-                if tipo == "PRODUCCIÓN":
-                    campos_prod = {
-                        "Etapa": "ETAPA",
-                        "Edad (sem)": "EDAD_AVE",
-                        "Huevos sem 41": "HUEVOS_SEM_41",
-                        "Población inicial": "POBLACION_INICIAL",
-                        "Huevos / AA": "HUEVOS_POR_AA",
-                        "Huevos STD 41": "HUEVOS_STD_41",
-                        "% Cumplimiento": "PCT_CUMPLIMIENTO",
-                        "% Huevos bomba": "PCT_HUEVOS_BOMBA",
-                    }
-
-                    data_prod = {
-                        campo: [
-                            st.session_state.datos_productivos
-                            .get(lote, {})
-                            .get(key, "Primera etapa" if key == "ETAPA" else 0)
-                            for lote in lotes
-                        ]
-                        for campo, key in campos_prod.items()
-                    }
-
-                    df_prod_mail = pd.DataFrame(data_prod, index=lotes).T
-
-                    df_etapa = df_prod_mail.loc[["Etapa"]]
-                    df_num = df_prod_mail.drop(index=["Etapa"])
-
-                    bloque_productivo_html = f"""
-                    <h3>🏭 Datos productivos – Producción</h3>
-                    {_estilizar_tabla_html(df_etapa.to_html(index=True, border=1), align_td="left")}
-                    {tabla_html_limpia_invertida(df_num, {
-                        "Huevos / AA": 2,
-                        "% Cumplimiento": 2,
-                        "% Huevos bomba": 2
-                    })}
-                    """
-                else:
-                    # Hembras
-                    df_h_mail = pd.DataFrame({
-                        campo: [
-                            st.session_state.datos_productivos
-                            .get(l, {}).get("HEMBRAS", {}).get(key, 0)
-                            for l in lotes
-                        ]
-                        for campo, key in {
-                            "Edad": "EDAD",
-                            "Uniformidad (%)": "UNIFORMIDAD",
-                            "Aves entregadas": "AVES_ENTREGADAS",
-                            "Población inicial": "POBLACION_INICIAL",
-                            "% Cumpl. aves": "PCT_CUMP_AVES",
-                            "Peso": "PESO",
-                            "Peso STD": "PESO_STD",
-                            "% Cumpl. peso": "PCT_CUMP_PESO",
-                        }.items()
-                    }, index=lotes).T
-
-                    # Machos
-                    df_m_mail = pd.DataFrame({
-                        campo: [
-                            st.session_state.datos_productivos
-                            .get(l, {}).get("MACHOS", {}).get(key, 0)
-                            for l in lotes
-                        ]
-                        for campo, key in {
-                            "Edad": "EDAD",
-                            "Uniformidad (%)": "UNIFORMIDAD",
-                            "Aves entregadas": "AVES_ENTREGADAS",
-                            "Población inicial": "POBLACION_INICIAL",
-                            "Peso": "PESO",
-                            "Peso STD": "PESO_STD",
-                            "% Cumpl. peso": "PCT_CUMP_PESO",
-                        }.items()
-                    }, index=lotes).T
-
-                    bloque_productivo_html = f"""
-                    <h3>🐔 Datos productivos – Levante (Hembras)</h3>
-                    {tabla_html_limpia_invertida(df_h_mail, {
-                        "Uniformidad (%)": 2,
-                        "% Cumpl. aves": 2,
-                        "% Cumpl. peso": 2,
-                        "Peso": 3,
-                        "Peso STD": 2
-                    })}
-                    <h3>🐔 Datos productivos – Levante (Machos)</h3>
-                    {tabla_html_limpia_invertida(df_m_mail, {
-                        "Uniformidad (%)": 2,
-                        "% Cumpl. peso": 2,
-                        "Peso": 3,
-                        "Peso STD": 3
-                    })}
-                    """
-
-                # =========================
-                # CUERPO DEL CORREO
-                # =========================
-                cuerpo_html = f"""
-                <html>
-                <body style="font-family:Arial, sans-serif; font-size:12px;">
-                    <h2>Bono Reproductoras GDP</h2>
-                    <p><b>Granja:</b> {st.session_state.get("granja_seleccionada","")}</p>
-                    <p><b>Tipo de proceso:</b> {tipo}</p>
-                    <p><b>Lotes:</b> {", ".join(lotes)}</p>
-                    <p><b>Fecha:</b> {pd.Timestamp.now().strftime("%Y-%m-%d %H:%M")}</p>
-
-                    {bloque_productivo_html}
-
-                    <h3>📦 Resumen por lote</h3>
-                    {tabla_lote_html}
-
-                    <h3>💰 Resultado final por trabajador</h3>
-                    {tabla_resultado_html}
-
-                    <p>{mensaje}</p>
-                    <p><b>Equipo de Control de Gestión</b></p>
-                </body>
-                </html>
-                """
-
-                msg.add_alternative(cuerpo_html, subtype="html")
-
-                msg.add_attachment(
-                    output.getvalue(),
-                    maintype="application",
-                    subtype="vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    filename="bono_reproductoras_final.xlsx"
-                )
-
-                with smtplib.SMTP("smtp.office365.com", 587) as smtp:
-                    smtp.starttls()
-                    smtp.login(
-                        st.secrets["EMAIL_USER"],
-                        st.secrets["EMAIL_PASS"]
-                    )
-                    smtp.send_message(msg)
-
-                st.success("✅ Correo enviado correctamente")
-
-            except Exception as e:
-                st.error(f"❌ Error al enviar el correo: {e}")
-
-
-
+    # ==================================================
+    # 📬 DISTRIBUCIÓN: CADA DESTINATARIO RECIBE SOLO SUS LOTES
+    # ==================================================
+    else:
+        st.caption(
+            "Una fila por destinatario. **LOTES**: separados por coma; "
+            "vacío o TODOS = todos los lotes (supervisor de granja)."
+        )
+        mapa = st.data_editor(
+            MAPA_DESTINATARIOS_INICIAL,
+            num_rows="dynamic",
+            use_container_width=True,
+            key="editor_destinatarios"
+        )
+        destinos = lotes_por_destinatario(mapa, lotes)
+        st.caption(f"👥 {len(destinos)} destinatarios con lotes de esta corrida")
+
+        if st.button("📨 Enviar a todos", key="btn_distribuir"):
+            if not destinos:
+                st.warning("Ingrese al menos un correo con lotes de esta corrida")
+            else:
+                try:
+                    ids = []
+                    with trazado("distribucion", trazas_recientes, destinatarios=len(destinos)):
+                        al_enviar = registro_al_enviar()
+                        config = st.session_state.config_lotes
+                        datos = st.session_state.datos_productivos
+
+                        for destino, lotes_destino in destinos.items():
+                            with etapa("mensaje", destino=destino, lotes=len(lotes_destino)) as e:
+                                # El supervisor de granja (todos los lotes) recibe la corrida completa
+                                if lotes_destino == list(lotes):
+                                    parte, resumen_parte = df_final, resumen_lote
+                                else:
+                                    parte = particion_df_final(df_final, lotes_destino)
+                                    resumen_parte = resumen_por_lote(parte)
+                                cuerpo_html = cuerpo_correo_html(
+                                    granja,
+                                    tipo,
+                                    lotes_destino,
+                                    datos,
+                                    resumen_parte,
+                                    parte,
+                                    mensaje
+                                )
+                                adjunto = generar_excel(
+                                    granja,
+                                    tipo,
+                                    lotes_destino,
+                                    {l: config[l] for l in lotes_destino},
+                                    datos,
+                                    parte
+                                )
+                                e["filas"] = len(parte)
+                                e["bytes"] = len(adjunto)
+
+                            # Todos salen por la misma sesión SMTP de la cola
+                            ids.append(cola_correo().encolar(
+                                mensaje_correo(
+                                    st.secrets["EMAIL_USER"],
+                                    destino,
+                                    asunto,
+                                    cuerpo_html,
+                                    adjunto
+                                ),
+                                al_enviar=al_enviar
+                            ))
+
+                    st.session_state.setdefault("envios_correo", []).extend(ids)
+                    st.session_state.envios_distribucion = ids
+                    st.info(f"📤 {len(ids)} correos en cola de envío")
+
+                except Exception as e:
+                    st.error(f"❌ Error al preparar la distribución: {e}")
 
+    # =========================
+    # ESTADO DE LOS ENVÍOS (SE ACTUALIZA SOLO MIENTRAS HAYA PENDIENTES)
+    # =========================
+    envios = st.session_state.get("envios_correo", [])
+    en_curso = any(
+        (cola_correo().estado(i) or {}).get("estado") not in ESTADOS_FINALES
+        for i in envios
+    )
+    st.fragment(run_every=2 if en_curso else None)(estado_envios)(sondeando=en_curso)
 
 
+with tab2:
+    seccion_correo(tipo, lotes, df_final, resumen_lote)
 
 
+# =========================
+# ⏱️ CIERRE DE LA TRAZA + PANEL (SOLO CONTROL DE GESTIÓN)
+# =========================
+traza_rerun = cerrar_traza(st.session_state.traza_rerun)
+trazas_recientes.append(traza_rerun)
+
+if st.session_state.get("rol") == "control":
+    with st.sidebar:
+        with st.expander("⏱️ Tiempos del último rerun"):
+            st.caption(f"Total: {traza_rerun['total_segundos']:.3f} s")
+            st.dataframe(tabla_etapas(traza_rerun), use_container_width=True, hide_index=True)
+
+            st.markdown("**Recientes**")
+            st.dataframe(
+                pd.DataFrame([
+                    {
+                        "origen": t["origen"],
+                        "inicio": t["inicio"],
+                        "total s": t["total_segundos"],
+                        "etapas": ", ".join(
+                            f"{e['etapa']} {e['segundos']:.2f}" for e in t["etapas"]
+                        ),
+                    }
+                    for t in reversed(trazas_recientes[-20:])
+                ]),
+                use_container_width=True,
+                hide_index=True
+            )
 
+        with st.expander("🧠 Memoria de la sesión"):
+            reporte = reporte_memoria({
+                "df (carga)": df,
+                "base de trabajadores": df_base,
+                "trabajadores": st.session_state.trabajadores,
+                "participación (larga)": st.session_state.participacion,
+                "vista editor / exportación": vista_tabla(lotes),
+                "memo cálculo": memo_bono.get("tabla"),
+                "df_final": df_final,
+            })
+            st.caption(
+                f"Total: {reporte['MB'].sum():.2f} MB "
+                f"(sin compactar: {reporte['MB sin compactar'].sum():.2f} MB)"
+            )
+            st.dataframe(reporte, use_container_width=True, hide_index=True)
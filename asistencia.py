@@ -0,0 +1,348 @@
+"""
+Faltas y participación calculadas desde los registros de asistencia.
+
+Entradas (CSV o xlsx, pueden tener millones de filas):
+    asistencia  DNI, FECHA y ESTADO (una o más marcaciones por día;
+                sin ESTADO, cada fila es una asistencia)
+    asignación  DNI, FECHA, LOTE (lote del turno de cada día); no hace
+                falta si la asistencia ya trae LOTE
+
+Los archivos se leen por bloques de FILAS_BLOQUE. Cada bloque se reduce
+a códigos enteros (trabajador, día, lote, estado) sin repetidos, así la
+memoria depende de los trabajador-día del periodo y no de las filas.
+
+Por trabajador y lote:
+    F_{lote}  días asignados al lote con falta injustificada (o sin
+              ninguna marcación)
+    P_{lote}  100 × días trabajados en el lote / días del periodo
+Un día asignado a dos lotes cuenta medio día en cada uno para P y la
+falta en los dos para F.
+"""
+import unicodedata
+from io import BytesIO
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from carga import limpiar_dni
+from traza import etapa
+
+FILAS_BLOQUE = 200_000
+# Filas reducidas acumuladas antes de volver a quitar repetidos
+LIMITE_PENDIENTES = 2_000_000
+
+INJUSTIFICADA, JUSTIFICADA, ASISTIO = 0, 1, 2
+
+# Texto del ESTADO (mayúsculas, sin tildes) → código. Si un día tiene
+# varias marcaciones vale la de código mayor (asistió gana).
+ESTADOS = {
+    "A": ASISTIO,
+    "ASISTIO": ASISTIO,
+    "ASISTENCIA": ASISTIO,
+    "PRESENTE": ASISTIO,
+    "P": ASISTIO,
+    "X": ASISTIO,
+    "T": ASISTIO,
+    "TARDANZA": ASISTIO,
+    "FJ": JUSTIFICADA,
+    "JUSTIFICADA": JUSTIFICADA,
+    "FALTA JUSTIFICADA": JUSTIFICADA,
+    "DM": JUSTIFICADA,
+    "DESCANSO": JUSTIFICADA,
+    "DESCANSO MEDICO": JUSTIFICADA,
+    "V": JUSTIFICADA,
+    "VACACIONES": JUSTIFICADA,
+    "LICENCIA": JUSTIFICADA,
+    "PERMISO": JUSTIFICADA,
+    "FERIADO": JUSTIFICADA,
+    "F": INJUSTIFICADA,
+    "FI": INJUSTIFICADA,
+    "FALTA": INJUSTIFICADA,
+    "INJUSTIFICADA": INJUSTIFICADA,
+    "FALTA INJUSTIFICADA": INJUSTIFICADA,
+}
+
+COLUMNAS_ASISTENCIA = {
+    "DNI": "DNI",
+    "DOCUMENTO": "DNI",
+    "NRO DOCUMENTO": "DNI",
+    "FECHA": "FECHA",
+    "DIA": "FECHA",
+    "FECHA MARCACION": "FECHA",
+    "LOTE": "LOTE",
+    "ESTADO": "ESTADO",
+    "ASISTENCIA": "ESTADO",
+}
+
+
+def _sin_tildes(texto):
+    texto = unicodedata.normalize("NFKD", str(texto).strip().upper())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+# =========================
+# LECTURA POR BLOQUES
+# =========================
+def _formato_csv(contenido):
+    # Codificación (exportes de Windows suelen venir en latin-1) y separador
+    muestra = contenido[:65536]
+    try:
+        muestra.decode("utf-8")
+        codificacion = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # Un carácter cortado al final de la muestra no cuenta
+        codificacion = "utf-8-sig" if e.start >= len(muestra) - 3 else "latin-1"
+
+    primera = muestra.decode(codificacion, errors="ignore").splitlines()[0] if muestra else ""
+    separador = max([",", ";", "\t", "|"], key=primera.count)
+    return codificacion, separador
+
+
+def _columnas_utiles(encabezado):
+    # {nombre en el archivo: nombre normalizado}
+    return {
+        c: COLUMNAS_ASISTENCIA[_sin_tildes(c)]
+        for c in encabezado
+        if c is not None and _sin_tildes(c) in COLUMNAS_ASISTENCIA
+    }
+
+
+def leer_bloques(contenido, filas=FILAS_BLOQUE):
+    """
+    Bloques de hasta filas filas (DataFrames con DNI, FECHA y, si están,
+    LOTE y ESTADO) de un CSV o xlsx (bytes). Solo se leen esas columnas.
+    """
+    if contenido[:2] == b"PK":
+        libro = load_workbook(BytesIO(contenido), read_only=True, data_only=True)
+        try:
+            filas_hoja = libro.worksheets[0].iter_rows(values_only=True)
+            encabezado = next(filas_hoja, ())
+            utiles = _columnas_utiles(encabezado)
+            posiciones = [i for i, c in enumerate(encabezado) if c in utiles]
+            nombres = [utiles[encabezado[i]] for i in posiciones]
+
+            while True:
+                bloque = list(islice(filas_hoja, filas))
+                if not bloque:
+                    break
+                yield pd.DataFrame(
+                    [[fila[i] if i < len(fila) else None for i in posiciones] for fila in bloque],
+                    columns=nombres
+                )
+        finally:
+            libro.close()
+        return
+
+    codificacion, separador = _formato_csv(contenido)
+    encabezado = pd.read_csv(
+        BytesIO(contenido), sep=separador, encoding=codificacion, nrows=0
+    ).columns
+    utiles = _columnas_utiles(encabezado)
+
+    for bloque in pd.read_csv(
+        BytesIO(contenido),
+        sep=separador,
+        encoding=codificacion,
+        dtype=str,
+        usecols=list(utiles),
+        chunksize=filas,
+    ):
+        yield bloque.rename(columns=utiles)
+
+
+# =========================
+# BLOQUE → CÓDIGOS ENTEROS
+# =========================
+class _Codigos:
+    """
+    Código entero estable por valor (DNI, lote) entre bloques.
+    """
+
+    def __init__(self):
+        self.valores = pd.Index([], dtype=object)
+
+    def codificar(self, unicos):
+        unicos = pd.Index(unicos, dtype=object)
+        nuevos = unicos.unique().difference(self.valores)
+        if len(nuevos):
+            self.valores = self.valores.append(nuevos)
+        return self.valores.get_indexer(unicos)
+
+
+def _por_unicos(serie, funcion):
+    # funcion se aplica una vez por valor distinto (no vacío) y devuelve
+    # un código entero; las celdas vacías quedan en -1
+    codigos, unicos = pd.factorize(serie)
+    convertidos = np.asarray(funcion(pd.Series(unicos, dtype=object)), dtype=np.int64)
+    return np.append(convertidos, -1)[codigos]
+
+
+def _dias(fechas):
+    # Días desde 1970 (-1 si la fecha no se entiende)
+    if not len(fechas):
+        return np.array([], dtype=np.int64)
+    convertidas = pd.to_datetime(fechas, dayfirst=True, errors="coerce")
+    if convertidas.isna().all():
+        convertidas = pd.to_datetime(fechas, dayfirst=True, errors="coerce", format="mixed")
+    dias = convertidas.dt.normalize().to_numpy(dtype="datetime64[D]")
+    return np.where(np.isnat(dias), -1, dias.astype(np.int64))
+
+
+def _estados(textos, desconocidos):
+    normalizados = textos.map(_sin_tildes)
+    codigos = normalizados.map(ESTADOS)
+    desconocidos.update(normalizados[codigos.isna()])
+    return codigos.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def _lotes(textos):
+    return textos.astype(str).str.replace(r"\.0$", "", regex=True).str.strip()
+
+
+def _reducir(bloque, trabajadores, lotes, desconocidos):
+    """
+    (clave, estado, lote, descartadas): códigos de cada fila válida del
+    bloque. clave junta trabajador y día en un entero; estado y lote son
+    None si el archivo no trae esas columnas.
+    """
+    dni = _por_unicos(bloque["DNI"], lambda u: trabajadores.codificar(limpiar_dni(u)))
+    dia = _por_unicos(bloque["FECHA"], _dias)
+    validas = (dni >= 0) & (dia >= 0)
+    clave = (dni[validas].astype(np.int64) << 20) | dia[validas]
+
+    estado = lote = None
+    if "ESTADO" in bloque.columns:
+        estado = _por_unicos(bloque["ESTADO"], lambda u: _estados(u, desconocidos))[validas]
+    if "LOTE" in bloque.columns:
+        lote = _por_unicos(bloque["LOTE"], lambda u: lotes.codificar(_lotes(u)))[validas]
+
+    return clave, estado, lote, int((~validas).sum())
+
+
+class _Acumulado:
+    """
+    Pares únicos (clave, valor). Con maximo=True queda un valor por clave,
+    el mayor (estado del día); si no, todos los pares distintos (lotes del
+    día). Se vuelve a reducir cada LIMITE_PENDIENTES filas.
+    """
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self.partes = []
+        self.pendientes = 0
+
+    def agregar(self, clave, valor):
+        parte = pd.DataFrame({"clave": clave, "valor": valor})
+        self.partes.append(self._reducir(parte))
+        self.pendientes += len(self.partes[-1])
+        if self.pendientes > LIMITE_PENDIENTES:
+            self.partes = [self.total()]
+            self.pendientes = len(self.partes[0])
+
+    def _reducir(self, df):
+        if self.maximo:
+            return df.groupby("clave", as_index=False, sort=False)["valor"].max()
+        return df.drop_duplicates()
+
+    def total(self):
+        if not self.partes:
+            return pd.DataFrame({"clave": np.array([], dtype=np.int64), "valor": np.array([], dtype=np.int64)})
+        return self._reducir(pd.concat(self.partes, ignore_index=True))
+
+
+# =========================
+# DERIVAR P_ / F_
+# =========================
+def _leer(contenido, nombre, trabajadores, lotes, desconocidos, estados, asignaciones, resumen):
+    with etapa(f"leer_{nombre}", bytes=len(contenido)) as e:
+        filas = 0
+        for bloque in leer_bloques(contenido):
+            if "DNI" not in bloque.columns or "FECHA" not in bloque.columns:
+                raise ValueError(f"El archivo de {nombre} debe tener columnas DNI y FECHA")
+            if nombre == "asignación" and "LOTE" not in bloque.columns:
+                raise ValueError("El archivo de asignación debe tener columna LOTE")
+
+            clave, estado, lote, descartadas = _reducir(bloque, trabajadores, lotes, desconocidos)
+            filas += len(bloque)
+            resumen["filas_descartadas"] += descartadas
+
+            if estados is not None:
+                # Sin ESTADO, cada marcación es una asistencia
+                estados.agregar(clave, np.full(len(clave), ASISTIO) if estado is None else estado)
+            if lote is not None:
+                asignaciones.agregar(clave, lote)
+
+        e["filas"] = filas
+        resumen["filas"] += filas
+
+
+def derivar_participacion(contenido_asistencia, contenido_asignacion=None, lotes=None, dias_periodo=None):
+    """
+    Lee los registros y devuelve (largo, resumen).
+
+    largo: DNI, LOTE, P, F (mismo formato que carga.leer_participacion).
+    Con lotes, cada trabajador de los registros tiene una fila por cada
+    lote de la lista (0 si no trabajó en él).
+    dias_periodo: por defecto, los días distintos de los registros.
+
+    Lanza ValueError si faltan columnas.
+    """
+    trabajadores, codigos_lote = _Codigos(), _Codigos()
+    desconocidos = set()
+    estados = _Acumulado(maximo=True)
+    asignaciones = _Acumulado(maximo=False)
+    resumen = {"filas": 0, "filas_descartadas": 0}
+
+    _leer(contenido_asistencia, "asistencia", trabajadores, codigos_lote, desconocidos,
+          estados, asignaciones, resumen)
+    if contenido_asignacion is not None:
+        _leer(contenido_asignacion, "asignación", trabajadores, codigos_lote, desconocidos,
+              None, asignaciones, resumen)
+
+    with etapa("derivar_participacion") as e:
+        estado = estados.total().set_index("clave")["valor"]
+        asignado = asignaciones.total().rename(columns={"valor": "lote"})
+        asignado = asignado[asignado["lote"] >= 0]
+        if not len(asignado) and len(estado):
+            raise ValueError("Los registros no indican el LOTE de cada día (falta el archivo de asignación)")
+
+        claves = np.concatenate([estado.index.to_numpy(), asignado["clave"].to_numpy()])
+        if not dias_periodo:
+            dias_periodo = max(len(np.unique(claves & 0xFFFFF)), 1)
+
+        # Estado de cada día asignado (-2 = sin marcación)
+        asignado["estado"] = asignado["clave"].map(estado).fillna(-2).to_numpy(dtype=np.int64)
+        asignado["peso"] = 1 / asignado.groupby("clave")["clave"].transform("size")
+        asignado["trabajado"] = np.where(asignado["estado"] == ASISTIO, asignado["peso"], 0.0)
+        asignado["falta"] = np.isin(asignado["estado"], [INJUSTIFICADA, -2]).astype(np.int64)
+        asignado["trabajador"] = asignado["clave"].to_numpy() >> 20
+
+        por_lote = asignado.groupby(["trabajador", "lote"], as_index=False)[["trabajado", "falta"]].sum()
+        largo = pd.DataFrame({
+            "DNI": trabajadores.valores[por_lote["trabajador"]].astype(str),
+            "LOTE": codigos_lote.valores[por_lote["lote"]].astype(str),
+            "P": np.round(100 * por_lote["trabajado"].to_numpy() / dias_periodo, 2),
+            "F": por_lote["falta"].to_numpy(dtype=float),
+        })
+
+        if lotes is not None:
+            # Todos los lotes de la página para cada trabajador de los registros
+            largo = largo.set_index(["DNI", "LOTE"])
+            completo = pd.MultiIndex.from_product(
+                [largo.index.unique("DNI"), list(lotes)], names=["DNI", "LOTE"]
+            )
+            largo = largo.reindex(largo.index.union(completo, sort=False), fill_value=0.0).reset_index()
+
+        sin_lote = ~estado.index.isin(asignado["clave"]) & (estado.to_numpy() == ASISTIO)
+        resumen.update({
+            "trabajadores": int(por_lote["trabajador"].nunique()),
+            "dias_periodo": int(dias_periodo),
+            "dias_sin_marcacion": int((asignado["estado"] == -2).sum()),
+            "dias_sin_lote": int(sin_lote.sum()),
+            "estados_desconocidos": sorted(desconocidos),
+        })
+        e["filas"] = len(largo)
+
+    return largo, resumen
@@ -0,0 +1,65 @@
+"""
+Comparación de motores de exportación (openpyxl vs streaming).
+
+Uso:
+    python -m benchmarks.exportar_excel --trabajadores 50000 --lotes 20
+"""
+import argparse
+import time
+import tracemalloc
+
+from calculo import REGLAS_PRODUCCION, calcular_bono
+from exportar import generar_excel, MOTORES_EXCEL
+
+from .sintetico import tabla_sintetica
+
+
+def medir_tiempo(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return resultado, time.perf_counter() - inicio
+
+
+def medir_memoria(funcion):
+    # tracemalloc vuelve lento el código, por eso se mide aparte
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trabajadores", type=int, default=50000)
+    parser.add_argument("--lotes", type=int, default=20)
+    parser.add_argument(
+        "--memoria", action="store_true",
+        help="medir también el pico de memoria (tracemalloc, mucho más lento)"
+    )
+    args = parser.parse_args()
+
+    lotes = [str(200 + i) for i in range(args.lotes)]
+    config_lotes = {l: {"GENETICA": "ROSS", "MONTO": 1000.0} for l in lotes}
+    tabla = tabla_sintetica(args.trabajadores, lotes)
+    df_final = calcular_bono(tabla, config_lotes, REGLAS_PRODUCCION, lotes=lotes)
+
+    print(f"{args.trabajadores} trabajadores × {args.lotes} lotes")
+    print(f"{'motor':<10} {'segundos':>9} {'pico MB':>9} {'archivo MB':>11}")
+
+    for motor in MOTORES_EXCEL:
+        def exportar():
+            return generar_excel(
+                "Chilco I", "PRODUCCIÓN", lotes, config_lotes, {}, df_final, motor=motor
+            )
+
+        contenido, segundos = medir_tiempo(exportar)
+        pico = f"{medir_memoria(exportar) / 1e6:.1f}" if args.memoria else "-"
+        print(
+            f"{motor:<10} {segundos:>9.2f} {pico:>9} "
+            f"{len(contenido) / 1e6:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Generador de datos sintéticos: base de trabajadores, Excel de DNIs,
+config_lotes, datos_productivos y tablas P_/F_ llenas.
+
+Todo es reproducible con la misma semilla.
+"""
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from calculo import CARGOS_VALIDOS
+from productivos import CAMPOS_PROD, CAMPOS_H, CAMPOS_M, PESO_STD_HEMBRAS, PESO_STD_MACHOS
+
+GENETICAS = ["ROSS", "COBB"]
+GRANJAS = ["Chilco I", "Chilco II", "Chilco III", "Chilco IV"]
+
+# Proporción aproximada de cargos en una granja
+PESOS_CARGO = {
+    "GALPONERO": 0.40,
+    "AYUDANTE GALPONERO": 0.15,
+    "VOLANTE DESCANSERO": 0.08,
+    "VOLANTE ALIMENTO": 0.06,
+    "BIOSEGURIDAD": 0.06,
+    "GUARDIANES": 0.06,
+    "CAPORAL": 0.05,
+    "SUPERVISOR": 0.02,
+    "MANTENIMIENTO": 0.04,
+    "GRADING": 0.04,
+    "VACUNADORES": 0.04,
+}
+
+
+def lotes_sinteticos(n_lotes):
+    return [str(200 + i) for i in range(n_lotes)]
+
+
+def config_sintetica(lotes, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return {
+        l: {
+            "GENETICA": str(rng.choice(GENETICAS)),
+            "MONTO": float(rng.integers(5, 60) * 100),
+        }
+        for l in lotes
+    }
+
+
+def datos_productivos_sinteticos(tipo, lotes, semilla=0):
+    rng = np.random.default_rng(semilla)
+    datos = {}
+
+    for l in lotes:
+        if tipo == "PRODUCCIÓN":
+            datos[l] = {key: float(rng.uniform(1, 100)) for key in CAMPOS_PROD.values()}
+            datos[l]["ETAPA"] = "Primera etapa"
+            datos[l]["VALIDACION"] = "CERRADO"
+        else:
+            hembras = {key: float(rng.uniform(1, 100)) for key in CAMPOS_H.values()}
+            machos = {key: float(rng.uniform(1, 100)) for key in CAMPOS_M.values()}
+            hembras["PESO_STD"] = PESO_STD_HEMBRAS
+            machos["PESO_STD"] = PESO_STD_MACHOS
+            datos[l] = {"HEMBRAS": hembras, "MACHOS": machos}
+
+    return datos
+
+
+# =========================
+# TRABAJADORES
+# =========================
+def base_trabajadores(n_trabajadores, semilla=0):
+    """
+    Base de trabajadores como la exporta RR.HH.: DNI numérico (sin
+    ceros a la izquierda), algunos duplicados y columnas extra.
+    """
+    rng = np.random.default_rng(semilla)
+
+    dnis = rng.choice(99_999_999, size=n_trabajadores, replace=False) + 1
+    cargos = rng.choice(
+        list(PESOS_CARGO),
+        size=n_trabajadores,
+        p=np.array(list(PESOS_CARGO.values())) / sum(PESOS_CARGO.values())
+    )
+
+    base = pd.DataFrame({
+        "DNI": dnis,
+        "NOMBRE COMPLETO": [f"TRABAJADOR SINTETICO {i}" for i in range(n_trabajadores)],
+        "CARGO": cargos,
+        "AREA": rng.choice(["GRANJA", "PLANTA", "ADMINISTRACION"], n_trabajadores),
+        "FECHA INGRESO": pd.Timestamp("2015-01-01")
+        + pd.to_timedelta(rng.integers(0, 3650, n_trabajadores), unit="D"),
+    })
+
+    # ~1 % de filas repetidas (la base real trae duplicados)
+    repetidas = base.sample(frac=0.01, random_state=semilla)
+    return pd.concat([base, repetidas], ignore_index=True)
+
+
+def dnis_sinteticos(base, fraccion=0.9, semilla=0):
+    """
+    Excel de DNIs a pagar: texto con apóstrofo, con ".0" o sin ceros,
+    y ~2 % de DNIs que no están en la base.
+    """
+    rng = np.random.default_rng(semilla)
+
+    dnis = base["DNI"].drop_duplicates().sample(frac=fraccion, random_state=semilla)
+    texto = dnis.astype(str).str.zfill(8)
+
+    formato = rng.integers(0, 3, len(texto))
+    texto = np.where(formato == 0, "'" + texto, texto)
+    texto = np.where(formato == 1, dnis.astype(float).astype(str), texto)
+
+    desconocidos = rng.integers(1, 99_999_999, max(1, len(texto) // 50)).astype(str)
+    return pd.DataFrame({"DNI": np.concatenate([texto, desconocidos])})
+
+
+def tabla_sintetica(n_trabajadores, lotes, semilla=0):
+    rng = np.random.default_rng(semilla)
+
+    columnas = {
+        "DNI": [f"{i:08d}" for i in range(n_trabajadores)],
+        "NOMBRE COMPLETO": [f"TRABAJADOR {i}" for i in range(n_trabajadores)],
+        "CARGO": rng.choice(CARGOS_VALIDOS, n_trabajadores),
+    }
+    for lote in lotes:
+        columnas[f"P_{lote}"] = rng.choice([0.0, 25.0, 50.0, 100.0], n_trabajadores)
+    for lote in lotes:
+        columnas[f"F_{lote}"] = rng.integers(0, 6, n_trabajadores)
+
+    # De una vez: columna por columna, 60+ lotes fragmentan el frame
+    return pd.DataFrame(columnas)
+
+
+def a_xlsx(df):
+    output = BytesIO()
+    df.to_excel(output, index=False)
+    return output.getvalue()
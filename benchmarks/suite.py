@@ -0,0 +1,247 @@
+"""
+Suite de rendimiento por etapas con datos sintéticos.
+
+Uso:
+    python -m benchmarks.suite                                  # escenarios "rapido"
+    python -m benchmarks.suite --escenarios completo --guardar benchmarks/baselines/completo.json
+    python -m benchmarks.suite --comparar benchmarks/baselines/rapido.json
+
+Etapas medidas por escenario (tipo × trabajadores × lotes):
+    cruce       normalización de DNI y cruce con la base (desde bytes xlsx)
+    calculo     calcular_bono
+    exportar    generar_excel (motor "auto")
+    reimportar  leer_excel_generado sobre el Excel exportado
+    correo_html cuerpo HTML del correo
+    graficos    figuras de la página (construcción + serialización)
+
+--comparar sale con código 1 si alguna etapa es más lenta que la línea
+base en más de --tolerancia (proporción).
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calculo import calcular_bono, reglas_por_tipo, resumen_por_lote
+from carga import cruzar_trabajadores, leer_excel_generado
+from correo import cuerpo_correo_html
+from exportar import generar_excel
+from graficos import figura_resumen_lote, figura_trabajadores, modo_por_defecto
+
+from .sintetico import (
+    GRANJAS,
+    a_xlsx,
+    base_trabajadores,
+    config_sintetica,
+    datos_productivos_sinteticos,
+    dnis_sinteticos,
+    lotes_sinteticos,
+)
+
+TIPOS = ["PRODUCCIÓN", "LEVANTE"]
+
+# (trabajadores, lotes)
+ESCENARIOS = {
+    "rapido": [(100, 1), (1000, 5), (5000, 10)],
+    "completo": [(100, 1), (1000, 5), (10000, 20), (50000, 40), (200000, 60)],
+}
+
+ETAPAS = ["cruce", "calculo", "exportar", "reimportar", "correo_html", "graficos"]
+
+
+def medir(funcion, repeticiones=1):
+    """
+    Devuelve (resultado, segundos): el mejor tiempo de las repeticiones.
+    """
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return resultado, mejor
+
+
+# =========================
+# GRÁFICOS (MISMAS FIGURAS QUE LA PÁGINA)
+# =========================
+def figuras(df_final, resumen_lote):
+    fig_trabajador = figura_trabajadores(df_final, modo_por_defecto(len(df_final)))
+    fig_lote = figura_resumen_lote(resumen_lote)
+
+    # Streamlit serializa la figura completa en cada rerun
+    return [fig_trabajador.to_json(), fig_lote.to_json()]
+
+
+# =========================
+# UN ESCENARIO
+# =========================
+def correr_escenario(tipo, n_trabajadores, n_lotes, repeticiones=1, semilla=0):
+    rng = np.random.default_rng(semilla)
+    lotes = lotes_sinteticos(n_lotes)
+    config_lotes = config_sintetica(lotes, semilla)
+    datos_productivos = datos_productivos_sinteticos(tipo, lotes, semilla)
+    granja = GRANJAS[semilla % len(GRANJAS)]
+
+    # Archivos de entrada (preparación, no se mide)
+    base = base_trabajadores(int(n_trabajadores / 0.9) + 1, semilla)
+    contenido_base = a_xlsx(base)
+    contenido_dni = a_xlsx(dnis_sinteticos(base, 0.9, semilla))
+
+    tiempos = {}
+
+    (df, _), tiempos["cruce"] = medir(
+        lambda: cruzar_trabajadores(contenido_dni, contenido_base), repeticiones
+    )
+
+    # De una vez: columna por columna, 60+ lotes fragmentan el frame
+    columnas = {f"P_{l}": rng.choice([0.0, 25.0, 50.0, 100.0], len(df)) for l in lotes}
+    columnas.update({f"F_{l}": rng.integers(0, 6, len(df)) for l in lotes})
+    tabla = pd.concat([df[["DNI", "NOMBRE COMPLETO", "CARGO"]], pd.DataFrame(columnas, index=df.index)], axis=1)
+
+    df_final, tiempos["calculo"] = medir(
+        lambda: calcular_bono(tabla, config_lotes, reglas_por_tipo(tipo), lotes=lotes),
+        repeticiones
+    )
+    resumen_lote = resumen_por_lote(df_final)
+
+    contenido, tiempos["exportar"] = medir(
+        lambda: generar_excel(granja, tipo, lotes, config_lotes, datos_productivos, df_final),
+        repeticiones
+    )
+
+    _, tiempos["reimportar"] = medir(lambda: leer_excel_generado(contenido), repeticiones)
+
+    _, tiempos["correo_html"] = medir(
+        lambda: cuerpo_correo_html(
+            granja, tipo, lotes, datos_productivos, resumen_lote, df_final, ""
+        ),
+        repeticiones
+    )
+
+    _, tiempos["graficos"] = medir(lambda: figuras(df_final, resumen_lote), repeticiones)
+
+    return [
+        {
+            "tipo": tipo,
+            "trabajadores": n_trabajadores,
+            "lotes": n_lotes,
+            "etapa": etapa,
+            "segundos": round(tiempos[etapa], 4),
+            "filas": len(df_final),
+        }
+        for etapa in ETAPAS
+    ]
+
+
+def correr(escenarios, tipos, repeticiones=1, al_terminar=None):
+    # Calentamiento: la primera figura de plotly y la primera lectura
+    # de openpyxl cargan módulos y plantillas
+    for tipo in tipos:
+        correr_escenario(tipo, 10, 1)
+
+    resultados = []
+    for n_trabajadores, n_lotes in escenarios:
+        for tipo in tipos:
+            filas = correr_escenario(tipo, n_trabajadores, n_lotes, repeticiones)
+            resultados.extend(filas)
+            if al_terminar:
+                al_terminar(filas)
+
+    return {
+        "fecha": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "resultados": resultados,
+    }
+
+
+# =========================
+# LÍNEA BASE
+# =========================
+def _clave(r):
+    return (r["tipo"], r["trabajadores"], r["lotes"], r["etapa"])
+
+
+def comparar(actual, base, tolerancia=0.25, minimo=0.05):
+    """
+    Etapas más lentas que la línea base en más de tolerancia (proporción).
+    Se ignoran las que duran menos de minimo segundos en ambas corridas
+    (el ruido domina).
+    """
+    anteriores = {_clave(r): r["segundos"] for r in base["resultados"]}
+    regresiones = []
+
+    for r in actual["resultados"]:
+        antes = anteriores.get(_clave(r))
+        if antes is None or max(antes, r["segundos"]) < minimo:
+            continue
+        if r["segundos"] > antes * (1 + tolerancia):
+            regresiones.append({**r, "base": antes, "cambio": r["segundos"] / antes - 1})
+
+    return regresiones
+
+
+def _imprimir(filas):
+    for r in filas:
+        print(
+            f"{r['tipo']:<11} {r['trabajadores']:>7} × {r['lotes']:>2} lotes  "
+            f"{r['etapa']:<12} {r['segundos']:>9.3f} s"
+        )
+
+
+def _escenarios(texto):
+    # "rapido" | "completo" | "1000x5,20000x30"
+    if texto in ESCENARIOS:
+        return ESCENARIOS[texto]
+    return [tuple(int(v) for v in par.split("x")) for par in texto.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--escenarios", default="rapido", help="rapido, completo o TRABAJADORESxLOTES,...")
+    parser.add_argument("--tipos", default=",".join(TIPOS))
+    parser.add_argument("--repeticiones", type=int, default=3, help="se toma el mejor tiempo")
+    parser.add_argument("--guardar", help="ruta del JSON de resultados")
+    parser.add_argument("--comparar", help="JSON de línea base")
+    parser.add_argument("--tolerancia", type=float, default=0.25)
+    args = parser.parse_args()
+
+    actual = correr(
+        _escenarios(args.escenarios),
+        args.tipos.split(","),
+        args.repeticiones,
+        al_terminar=_imprimir
+    )
+
+    if args.guardar:
+        Path(args.guardar).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.guardar).write_text(
+            json.dumps(actual, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+    if args.comparar:
+        base = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        regresiones = comparar(actual, base, args.tolerancia)
+        if regresiones:
+            print(f"\n⚠️ {len(regresiones)} etapas más lentas que la línea base:")
+            for r in regresiones:
+                print(
+                    f"  {r['tipo']} {r['trabajadores']}×{r['lotes']} {r['etapa']}: "
+                    f"{r['base']:.3f} s → {r['segundos']:.3f} s (+{r['cambio']:.0%})"
+                )
+            sys.exit(1)
+        print("\n✅ Sin regresiones respecto de la línea base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Borrador de trabajo (.bono): guardar y retomar la sesión sin pasar por
+el Excel.
+
+Es un archivo Parquet con la tabla (y su índice si no es 0..n-1). El
+manifiesto va en los metadatos del esquema, clave "bono_borrador":
+granja, tipo, lotes, config_lotes y datos_productivos.
+
+Los dtypes vuelven tal cual (float32, Int8, categóricas, texto), así que
+no hay que volver a normalizar DNI ni adivinar tipos como con el Excel.
+"""
+import json
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from exportar import json_nativo
+
+FORMATO_BORRADOR = "bono-borrador"
+VERSION_BORRADOR = 2
+EXTENSION_BORRADOR = "bono"
+
+CLAVE_MANIFIESTO = b"bono_borrador"
+
+
+# =========================
+# GUARDAR / LEER
+# =========================
+def guardar_borrador(granja, tipo, lotes, config_lotes, datos_productivos, tabla):
+    """
+    Bytes del borrador (.bono) con el estado completo de la sesión.
+    """
+    manifiesto = {
+        "formato": FORMATO_BORRADOR,
+        "version": VERSION_BORRADOR,
+        "guardado": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "granja": granja,
+        "tipo": tipo,
+        "lotes": list(lotes),
+        "config_lotes": config_lotes,
+        "datos_productivos": datos_productivos,
+        "filas": len(tabla),
+    }
+
+    # El índice con huecos (filas eliminadas) se guarda para que las
+    # etiquetas sigan valiendo al retomar (el diario de cambios las usa)
+    tabla_arrow = pa.Table.from_pandas(tabla, preserve_index=True)
+    tabla_arrow = tabla_arrow.replace_schema_metadata({
+        **tabla_arrow.schema.metadata,
+        CLAVE_MANIFIESTO: json.dumps(manifiesto, ensure_ascii=False, default=json_nativo).encode("utf-8"),
+    })
+
+    output = BytesIO()
+    pq.write_table(tabla_arrow, output)
+    return output.getvalue()
+
+
+def leer_borrador(contenido):
+    """
+    Mismo dict que carga.leer_excel_generado (granja, tipo, lotes,
+    config_lotes, tabla, datos_productivos).
+    Lanza ValueError si el archivo no es un borrador válido.
+    """
+    if contenido[:2] == b"PK":
+        # Versión 1 (zip con matrices numpy)
+        raise ValueError("El borrador es de una versión anterior del sistema: cárguelo desde el Excel")
+    try:
+        tabla_arrow = pq.read_table(pa.BufferReader(contenido))
+        manifiesto = json.loads((tabla_arrow.schema.metadata or {})[CLAVE_MANIFIESTO])
+    except (pa.ArrowInvalid, KeyError, json.JSONDecodeError):
+        raise ValueError("El archivo no es un borrador válido")
+
+    if manifiesto.get("formato") != FORMATO_BORRADOR:
+        raise ValueError("El archivo no es un borrador válido")
+    if manifiesto.get("version", 0) > VERSION_BORRADOR:
+        raise ValueError("El borrador es de una versión más nueva del sistema")
+
+    tabla = tabla_arrow.to_pandas()
+
+    return {
+        "granja": manifiesto["granja"],
+        "tipo": manifiesto["tipo"],
+        "lotes": manifiesto["lotes"],
+        "config_lotes": manifiesto["config_lotes"],
+        "tabla": tabla,
+        "datos_productivos": manifiesto["datos_productivos"],
+    }
@@ -0,0 +1,382 @@
+import numpy as np
+import pandas as pd
+
+from participacion import a_largo
+
+# =========================
+# TABLAS DE % POR CARGO
+# =========================
+REGLAS_PRODUCCION = {
+    "GALPONERO": 1.00,
+    "AYUDANTE GALPONERO": 0.125,
+    "VOLANTE DESCANSERO": 0.125,
+    "VOLANTE ALIMENTO": 0.125,
+    "BIOSEGURIDAD": 0.0625,
+    "GUARDIANES": 0.0625,
+    "CAPORAL": 0.125,
+    "SUPERVISOR": 1.00,
+    "MANTENIMIENTO": 0.0,
+    "GRADING": 0.08,
+    "VACUNADORES": 0.07
+}
+REGLAS_LEVANTE = REGLAS_PRODUCCION.copy()
+
+# =========================
+# LISTA OFICIAL DE CARGOS
+# =========================
+CARGOS_VALIDOS = sorted(REGLAS_PRODUCCION.keys())
+
+
+def reglas_por_tipo(tipo):
+    return REGLAS_PRODUCCION if tipo == "PRODUCCIÓN" else REGLAS_LEVANTE
+
+
+DESCUENTO_FALTAS = {0:1.0, 1:0.90, 2:0.80, 3:0.70, 4:0.60}
+FACTOR_FALTAS_DEFECTO = 0.50
+
+
+def factor_faltas(f, descuento_faltas=DESCUENTO_FALTAS):
+    try:
+        f = int(f)
+    except:
+        return FACTOR_FALTAS_DEFECTO
+    return descuento_faltas.get(f, FACTOR_FALTAS_DEFECTO)
+
+
+# =========================
+# HELPERS VECTORIZADOS
+# =========================
+def factores_cargo(cargos, reglas):
+    """
+    Factor por trabajador según su CARGO (0 si el cargo no está en reglas).
+    """
+    return (
+        pd.Series(cargos)
+        .astype(str)
+        .str.upper()
+        .map(reglas)
+        .fillna(0)
+        .to_numpy(dtype=float)
+    )
+
+
+def factores_faltas(faltas, descuento_faltas=DESCUENTO_FALTAS):
+    """
+    Matriz de factores de descuento para un bloque F_* (filas × lotes).
+
+    Se evalúa factor_faltas solo sobre los valores únicos y luego se
+    reparte con una tabla de búsqueda, así el costo en Python no depende
+    del número de trabajadores.
+    """
+    valores = np.asarray(faltas, dtype=object)
+    codigos, unicos = pd.factorize(valores.ravel())
+
+    tabla = np.array(
+        [factor_faltas(u, descuento_faltas) for u in unicos] + [FACTOR_FALTAS_DEFECTO],
+        dtype=float
+    )
+    # código -1 (vacío / NaN) → última posición = factor por defecto
+    return tabla[codigos].reshape(valores.shape)
+
+
+def redondear_2(valores):
+    """
+    Redondeo a 2 decimales idéntico al round() de Python.
+
+    np.round puede diferir de round() en valores que caen justo en la
+    mitad; esos casos (muy pocos) se corrigen con round().
+    """
+    valores = np.asarray(valores, dtype=float)
+    resultado = np.round(valores, 2)
+
+    escalado = valores * 100
+    dudosos = np.isclose(
+        np.abs(escalado - np.trunc(escalado)), 0.5, rtol=0, atol=1e-6
+    )
+    if dudosos.any():
+        resultado[dudosos] = [round(float(v), 2) for v in valores[dudosos]]
+
+    return resultado
+
+
+# =========================
+# MOTOR DE CÁLCULO DEL BONO
+# =========================
+def calcular_bono(tabla, config_lotes, reglas, descuento_faltas=DESCUENTO_FALTAS, lotes=None):
+    """
+    tabla           : trabajadores con CARGO, P_{lote} y F_{lote}
+    config_lotes    : {lote: {"GENETICA": ..., "MONTO": ...}}
+    reglas          : {cargo: factor}
+    descuento_faltas: {n° faltas: factor}
+    lotes           : orden de lotes a pagar (por defecto, el de config_lotes)
+
+    Devuelve una copia de tabla con PAGO_{lote} y TOTAL S/.
+    """
+    if lotes is None:
+        lotes = list(config_lotes.keys())
+    lotes = list(lotes)
+
+    _, participacion = a_largo(tabla, lotes)
+    df_final, _ = _resultado(tabla, participacion, config_lotes, reglas, descuento_faltas, lotes)
+    return df_final
+
+
+def _porcentaje_decimal(serie):
+    # float32 (tabla compacta) → float64 con el valor tecleado (33.3, no 33.2999992)
+    if serie.dtype == "float32":
+        return np.round(serie.astype(float), 4)
+    return serie
+
+
+def _pagos_largo(factor_cargo, montos, participacion, descuento_faltas):
+    """
+    PAGO redondeado por fila de participacion (factor_cargo y montos ya
+    alineados con esas filas).
+    """
+    pct = pd.to_numeric(_porcentaje_decimal(participacion["P"]), errors="coerce").to_numpy(dtype=float)
+    factor_f = factores_faltas(participacion["F"].to_numpy(dtype=object), descuento_faltas)
+
+    # Mismo orden de operaciones que el cálculo fila a fila
+    pago = (factor_cargo * montos) * (pct / 100) * factor_f
+    return redondear_2(pago)
+
+
+def _celdas(tabla, participacion, lotes):
+    # (posición en tabla, índice de lote) por fila de participacion;
+    # las de trabajadores o lotes que no están se descartan
+    posiciones = tabla.index.get_indexer(participacion["fila"])
+    j = pd.Index(lotes, dtype=object).get_indexer(participacion["LOTE"])
+    validas = (posiciones >= 0) & (j >= 0)
+    return posiciones[validas], j[validas], participacion[validas]
+
+
+def _pagos_celdas(tabla, participacion, config_lotes, reglas, descuento_faltas, lotes):
+    """
+    (posiciones, índices de lote, PAGO) de las celdas de participacion.
+    """
+    posiciones, j, participacion = _celdas(tabla, participacion, lotes)
+
+    factor_cargo = factores_cargo(tabla["CARGO"].iloc[posiciones], reglas)
+    montos = np.array([config_lotes[lote]["MONTO"] for lote in lotes], dtype=float)
+    pago = _pagos_largo(factor_cargo, montos[j], participacion, descuento_faltas)
+    return posiciones, j, pago
+
+
+def _armar_df_final(tabla, lotes, matriz):
+    # matriz: PAGO (lotes × filas de tabla)
+    pagos = [f"PAGO_{lote}" for lote in lotes]
+
+    df_final = tabla.drop(columns=[c for c in [*pagos, "TOTAL S/"] if c in tabla.columns])
+    for lote in lotes:
+        df_final[f"P_{lote}"] = _porcentaje_decimal(df_final[f"P_{lote}"])
+
+    # Todas las PAGO_ en un solo bloque (de a una, 60+ lotes fragmentan el frame)
+    df_final = pd.concat(
+        [df_final, pd.DataFrame(matriz.T, index=tabla.index, columns=pagos)],
+        axis=1
+    )
+    df_final["TOTAL S/"] = df_final[pagos].sum(axis=1)
+    return df_final
+
+
+def _resultado(tabla, participacion, config_lotes, reglas, descuento_faltas, lotes):
+    """
+    (df_final, totales por columna PAGO_). Los pagos se calculan solo
+    sobre las filas de participacion (formato largo); una celda que no
+    está paga 0. tabla da el CARGO y el formato del resultado.
+    """
+    posiciones, j, pago = _pagos_celdas(tabla, participacion, config_lotes, reglas, descuento_faltas, lotes)
+
+    # Vista ancha solo para mostrar y exportar
+    matriz = np.zeros((len(lotes), len(tabla)))
+    matriz[j, posiciones] = pago
+    df_final = _armar_df_final(tabla, lotes, matriz)
+
+    # Total por lote directo de la tabla larga; son montos con 2 decimales
+    totales = pd.Series(
+        redondear_2(np.bincount(j, weights=np.nan_to_num(pago), minlength=len(lotes))),
+        index=[f"PAGO_{lote}" for lote in lotes]
+    )
+    return df_final, totales
+
+
+# =========================
+# RECÁLCULO INCREMENTAL
+# =========================
+def _filas_distintas(actual, previa):
+    # Etiquetas con valor distinto (NaN == NaN). Categóricas con otras
+    # categorías no se comparan directo
+    if actual.dtype != previa.dtype:
+        actual, previa = actual.astype(object), previa.astype(object)
+    iguales = (actual == previa).to_numpy(dtype=bool, na_value=False) | (actual.isna() & previa.isna()).to_numpy()
+    return actual.index[~iguales]
+
+
+def _filas_participacion(actual, previa, lotes):
+    """
+    Etiquetas de fila con alguna celda (lote, P, F) agregada, quitada o
+    cambiada entre dos tablas largas. Cada celda se identifica por
+    fila × n° de lotes + posición del lote.
+    """
+    if actual is previa:
+        return pd.Index([], dtype=np.int64)
+
+    indice_lotes = pd.Index(lotes, dtype=object)
+
+    def claves(participacion):
+        j = indice_lotes.get_indexer(participacion["LOTE"])
+        return participacion["fila"].to_numpy(dtype=np.int64) * len(lotes) + j
+
+    clave_actual, clave_previa = claves(actual), claves(previa)
+    en_previa = pd.Index(clave_previa).get_indexer(clave_actual)
+    hay = en_previa >= 0
+
+    distintas = ~hay
+    for col in ("P", "F"):
+        a = actual[col].to_numpy(dtype=np.float32)[hay]
+        p = previa[col].to_numpy(dtype=np.float32)[en_previa[hay]]
+        distintas[hay] |= ~((a == p) | (np.isnan(a) & np.isnan(p)))
+
+    # Celdas que estaban y ya no están
+    quitadas = ~np.isin(clave_previa, clave_actual)
+    return pd.Index(np.unique(np.concatenate([
+        actual["fila"].to_numpy(dtype=np.int64)[distintas],
+        previa["fila"].to_numpy(dtype=np.int64)[quitadas],
+    ])))
+
+
+def recalcular_bono(memo, tabla, participacion, config_lotes, reglas, descuento_faltas=DESCUENTO_FALTAS, lotes=None):
+    """
+    Igual que calcular_bono, pero con la participación ya en formato
+    largo (ver participacion.py): tabla es la vista ancha de la sesión y
+    solo da el CARGO y el formato del resultado.
+
+    memo: dict persistente (p. ej. en st.session_state) con la última
+    participacion, los CARGO, montos y df_final. Solo se recalculan las
+    columnas PAGO_ cuyo MONTO cambió y las filas nuevas, con otro CARGO
+    o con alguna celda de participacion distinta (por etiqueta de fila).
+    memo["totales"] guarda el total por columna PAGO_, corregido solo con
+    las filas afectadas.
+
+    Si cambian los lotes, las reglas, los descuentos o las columnas de
+    tabla, se hace el cálculo completo.
+    """
+    if lotes is None:
+        lotes = list(config_lotes.keys())
+    lotes = list(lotes)
+    pagos = [f"PAGO_{lote}" for lote in lotes]
+    montos = {lote: float(config_lotes[lote]["MONTO"]) for lote in lotes}
+
+    previo = memo.get("df_final")
+    completo = (
+        previo is None
+        or memo.get("lotes") != lotes
+        or memo.get("reglas") != reglas
+        or memo.get("descuento_faltas") != descuento_faltas
+        or list(memo["columnas"]) != list(tabla.columns)
+        or not tabla.index.is_unique
+    )
+
+    if completo:
+        df_final, totales = _resultado(tabla, participacion, config_lotes, reglas, descuento_faltas, lotes)
+
+    elif (
+        memo["tabla"] is tabla
+        and memo["participacion"] is participacion
+        and memo["montos"] == montos
+    ):
+        # Nada cambió (la sesión reemplaza sus tablas, no las modifica)
+        df_final, totales = previo, memo["totales"]
+
+    else:
+        cargos_previos = memo["cargos"]
+
+        # Filas nuevas, eliminadas y editadas (por etiqueta)
+        comunes = tabla.index.intersection(cargos_previos.index, sort=False)
+        nuevas = tabla.index.difference(cargos_previos.index, sort=False)
+        eliminadas = cargos_previos.index.difference(tabla.index, sort=False)
+        editadas = _filas_distintas(tabla["CARGO"].loc[comunes], cargos_previos.loc[comunes])
+        editadas = editadas.union(
+            _filas_participacion(participacion, memo["participacion"], lotes).intersection(comunes),
+            sort=False
+        )
+        filas = editadas.append(nuevas)
+
+        # Lotes cuyo monto cambió: columna completa
+        cambio_monto = np.array([memo["montos"].get(l) != montos[l] for l in lotes])
+        lotes_filas = ~cambio_monto
+
+        # Pagos anteriores (lotes × filas), 0 en las filas nuevas
+        matriz = previo[pagos].reindex(tabla.index).to_numpy(dtype=float, na_value=0.0).T.copy()
+
+        # Celdas a recalcular: las de lotes con otro monto y las de filas afectadas
+        en_filas = participacion["fila"].isin(filas).to_numpy()
+        k_lote = pd.Index(lotes, dtype=object).get_indexer(participacion["LOTE"])
+        en_lotes = (k_lote >= 0) & cambio_monto[np.maximum(k_lote, 0)]
+        a_recalcular = participacion[en_filas | en_lotes]
+
+        posiciones_filas = tabla.index.get_indexer(filas)
+        matriz[np.ix_(lotes_filas, posiciones_filas)] = 0.0
+        matriz[cambio_monto] = 0.0
+
+        posiciones, j, pago = _pagos_celdas(tabla, a_recalcular, config_lotes, reglas, descuento_faltas, lotes)
+        matriz[j, posiciones] = pago
+        df_final = _armar_df_final(tabla, lotes, matriz)
+
+        # Totales por lote: los de otro monto desde cero; el resto, se
+        # resta lo anterior de las filas afectadas y se suma lo nuevo
+        totales = memo["totales"].reindex(pagos).copy()
+        if cambio_monto.any():
+            totales[cambio_monto] = redondear_2(
+                np.bincount(j, weights=np.nan_to_num(pago), minlength=len(lotes))[cambio_monto]
+            )
+        cols_filas = [col for col, si in zip(pagos, lotes_filas) if si]
+        if cols_filas:
+            salientes = editadas.append(eliminadas)
+            totales[cols_filas] = redondear_2(
+                totales[cols_filas]
+                - previo.loc[salientes, cols_filas].sum()
+                + df_final.loc[filas, cols_filas].sum()
+            )
+
+    # Referencias, no copias: la sesión reemplaza (no modifica) sus tablas
+    memo.update(
+        lotes=lotes,
+        reglas=dict(reglas),
+        descuento_faltas=dict(descuento_faltas),
+        montos=montos,
+        columnas=list(tabla.columns),
+        tabla=tabla,
+        cargos=tabla["CARGO"],
+        participacion=participacion,
+        df_final=df_final,
+        totales=totales,
+    )
+
+    return df_final
+
+
+# =========================
+# RESUMEN POR LOTE
+# =========================
+def resumen_por_lote(df_final, totales=None):
+    """
+    totales: suma ya calculada por columna PAGO_ (p. ej. memo["totales"]
+    de recalcular_bono); si no se da, se suma df_final.
+    """
+    pagos = [c for c in df_final.columns if c.startswith("PAGO_")]
+    if totales is None:
+        totales = df_final[pagos].sum()
+
+    resumen_lote = (
+        totales[pagos]
+        .reset_index()
+        .rename(columns={"index": "Lote", 0: "Total S/"})
+    )
+
+    resumen_lote["Lote"] = resumen_lote["Lote"].str.replace("PAGO_", "")
+    resumen_lote["% del total"] = (
+        resumen_lote["Total S/"] / resumen_lote["Total S/"].sum() * 100
+    ).round(2)
+
+    return resumen_lote
@@ -0,0 +1,604 @@
+import json
+import re
+import numpy as np
+import pandas as pd
+from io import BytesIO
+
+from exportar import SHEET_NAME, HOJA_META, META_VERSION, META_PREFIJO
+from traza import etapa
+
+
+# =========================
+# NORMALIZACIÓN DE DNI
+# =========================
+def limpiar_dni(s):
+    return (
+        s.astype(str)
+        .str.replace("'", "", regex=False)
+        .str.replace(".0", "", regex=False)
+        .str.strip()
+        .str.zfill(8)
+    )
+
+
+def leer_excel_str(contenido):
+    """
+    Lee la primera hoja de un xlsx (bytes) como texto, con columnas
+    normalizadas en mayúsculas.
+    """
+    df = pd.read_excel(BytesIO(contenido), dtype=str)
+    df.columns = df.columns.str.strip().str.upper()
+    return df
+
+
+# =========================
+# CRUCE DNIs × BASE DE TRABAJADORES
+# =========================
+def cruzar_trabajadores(contenido_dni, contenido_base):
+    """
+    contenido_dni : bytes del Excel con DNIs
+    contenido_base: bytes de la Base de trabajadores
+
+    Devuelve (df, df_base): el cruce con NOMBRE COMPLETO y CARGO,
+    y la base normalizada y sin duplicados.
+    """
+    with etapa("read_excel", bytes=len(contenido_dni) + len(contenido_base)) as e:
+        df_dni = leer_excel_str(contenido_dni)
+        df_base = leer_excel_str(contenido_base)
+        e["filas"] = len(df_dni) + len(df_base)
+
+    with etapa("limpiar_dni_y_cruce") as e:
+        df_dni["DNI"] = limpiar_dni(df_dni["DNI"])
+        df_base["DNI"] = limpiar_dni(df_base["DNI"])
+        df_base = df_base.drop_duplicates("DNI")
+
+        df = df_dni.merge(
+            df_base[["DNI", "NOMBRE COMPLETO", "CARGO"]],
+            on="DNI",
+            how="left"
+        )
+        e["filas"] = len(df)
+
+    return df, df_base
+
+
+# =========================
+# ÍNDICE POR DNI
+# =========================
+def indice_dni(df_base):
+    """
+    {DNI: {"NOMBRE COMPLETO": ..., "CARGO": ...}} para búsquedas O(1).
+    Si un DNI se repite, se conserva la primera aparición (igual que
+    drop_duplicates).
+    """
+    if df_base is None:
+        return {}
+
+    indice = {}
+    for dni, nombre, cargo in zip(
+        df_base["DNI"], df_base["NOMBRE COMPLETO"], df_base["CARGO"]
+    ):
+        indice.setdefault(dni, {"NOMBRE COMPLETO": nombre, "CARGO": cargo})
+
+    return indice
+
+
+# =========================
+# ALTAS Y BAJAS MASIVAS POR LISTA DE DNI
+# =========================
+def dnis_de_texto(texto):
+    """
+    DNIs pegados (uno por línea, o separados por comas, punto y coma o
+    espacios), normalizados como limpiar_dni.
+    """
+    partes = pd.Series(re.split(r"[\s,;]+", texto or ""), dtype=str)
+    return limpiar_dni(partes[partes.str.strip() != ""]).tolist()
+
+
+def dnis_de_excel(contenido):
+    """
+    DNIs de la columna DNI (o de la primera columna) de un xlsx.
+    """
+    df = leer_excel_str(contenido)
+    columna = df["DNI"] if "DNI" in df.columns else df.iloc[:, 0]
+    return limpiar_dni(columna.dropna()).tolist()
+
+
+def buscar_en_base(indice, dnis):
+    """
+    DNI, NOMBRE COMPLETO y CARGO de cada DNI (vacío si no está en la
+    base). indice es el dict de indice_dni o un maestro.MaestroTrabajadores.
+    """
+    dnis = pd.Series(dnis, dtype=str)
+    if hasattr(indice, "columnas"):
+        nombre, cargo = indice.columnas(dnis)
+        return pd.DataFrame({"DNI": dnis, "NOMBRE COMPLETO": nombre.to_numpy(), "CARGO": cargo.to_numpy()})
+
+    base = pd.DataFrame.from_dict(indice, orient="index", columns=["NOMBRE COMPLETO", "CARGO"])
+    return base.reindex(dnis).reset_index(names="DNI")
+
+
+def _separar_repetidos(dnis):
+    dnis = pd.Series(dnis, dtype=str)
+    repetidos = dnis[dnis.duplicated()].unique().tolist()
+    return dnis.drop_duplicates(), repetidos
+
+
+def alta_masiva(tabla, dnis, indice, lotes):
+    """
+    Agrega de una vez los DNIs que están en la base y aún no en tabla,
+    con P_/F_ en cero. Devuelve (tabla, reporte) con las listas
+    agregados, ya_en_tabla, no_encontrados y repetidos.
+    """
+    dnis, repetidos = _separar_repetidos(dnis)
+
+    ya_en_tabla = dnis.isin(tabla["DNI"])
+    encontrados = buscar_en_base(indice, dnis[~ya_en_tabla])
+    en_base = encontrados["NOMBRE COMPLETO"].notna() | encontrados["CARGO"].notna()
+
+    nuevos = encontrados[en_base].reset_index(drop=True)
+    for lote in lotes:
+        nuevos[f"P_{lote}"] = 0.0
+    for lote in lotes:
+        nuevos[f"F_{lote}"] = 0
+
+    if len(nuevos):
+        tabla = pd.concat([tabla, nuevos.reindex(columns=tabla.columns)], ignore_index=True)
+
+    return tabla, {
+        "agregados": nuevos["DNI"].tolist(),
+        "ya_en_tabla": dnis[ya_en_tabla].tolist(),
+        "no_encontrados": encontrados.loc[~en_base, "DNI"].tolist(),
+        "repetidos": repetidos,
+    }
+
+
+def baja_masiva(tabla, dnis):
+    """
+    Quita de una vez los DNIs de la lista. Devuelve (tabla, reporte) con
+    las listas eliminados, no_en_tabla y repetidos.
+    """
+    dnis, repetidos = _separar_repetidos(dnis)
+
+    en_tabla = dnis.isin(tabla["DNI"])
+    tabla = tabla[~tabla["DNI"].isin(dnis)]
+
+    return tabla, {
+        "eliminados": dnis[en_tabla].tolist(),
+        "no_en_tabla": dnis[~en_tabla].tolist(),
+        "repetidos": repetidos,
+    }
+
+
+# =========================
+# PARTICIPACIÓN Y FALTAS EN FORMATO LARGO (DNI, LOTE, P, F)
+# =========================
+COLUMNAS_PARTICIPACION = {
+    "DNI": "DNI",
+    "LOTE": "LOTE",
+    "PARTICIPACION": "P",
+    "PARTICIPACIÓN": "P",
+    "% PARTICIPACION": "P",
+    "% PARTICIPACIÓN": "P",
+    "P": "P",
+    "FALTAS": "F",
+    "FALTAS INJUSTIFICADAS": "F",
+    "F": "F",
+}
+
+
+def _numero(serie):
+    # "50%", "12,5" → 50.0, 12.5; vacío o texto → NaN
+    return pd.to_numeric(
+        serie.astype(str).str.replace("%", "", regex=False).str.replace(",", ".", regex=False).str.strip(),
+        errors="coerce"
+    )
+
+
+def leer_participacion(contenido):
+    """
+    Hoja con una fila por trabajador y lote: DNI, LOTE, PARTICIPACIÓN y/o
+    FALTAS. Devuelve DataFrame DNI, LOTE, P, F (NaN = no cambiar).
+    Lanza ValueError si faltan columnas.
+    """
+    df = leer_excel_str(contenido).rename(columns=COLUMNAS_PARTICIPACION)
+    if "DNI" not in df.columns or "LOTE" not in df.columns:
+        raise ValueError("La hoja debe tener columnas DNI y LOTE")
+    if "P" not in df.columns and "F" not in df.columns:
+        raise ValueError("La hoja debe tener PARTICIPACIÓN y/o FALTAS")
+
+    df = df.dropna(subset=["DNI", "LOTE"])
+    return pd.DataFrame({
+        "DNI": limpiar_dni(df["DNI"]),
+        "LOTE": df["LOTE"].str.replace(r"\.0$", "", regex=True).str.strip(),
+        "P": _numero(df["P"]) if "P" in df.columns else np.nan,
+        "F": _numero(df["F"]) if "F" in df.columns else np.nan,
+    })
+
+
+def aplicar_participacion(tabla, largo, lotes):
+    """
+    Copia P y F de largo a las columnas P_{lote} / F_{lote} de tabla, por
+    DNI, de una vez por lote. Si un DNI y lote se repiten, vale la última
+    fila. Devuelve (tabla, reporte) con actualizados y no_en_tabla (DNIs),
+    lotes_desconocidos y filas_repetidas (cantidad).
+    """
+    lote_valido = largo["LOTE"].isin(lotes)
+    dni_valido = largo["DNI"].isin(tabla["DNI"])
+    validas = largo[lote_valido & dni_valido]
+    repetidos = int(validas.duplicated(["DNI", "LOTE"]).sum())
+
+    ultimas = validas.drop_duplicates(["DNI", "LOTE"], keep="last")
+    cambios = {}
+    for lote, grupo in ultimas.groupby("LOTE", sort=False):
+        for valor, prefijo in (("P", "P_"), ("F", "F_")):
+            nuevos = grupo.dropna(subset=[valor])
+            if len(nuevos):
+                col = f"{prefijo}{lote}"
+                por_dni = tabla["DNI"].map(nuevos.set_index("DNI")[valor])
+                # En float; compactar_tabla devuelve los tipos compactos
+                cambios[col] = tabla[col].astype(float).where(por_dni.isna(), por_dni)
+
+    return tabla.assign(**cambios), {
+        "actualizados": ultimas["DNI"].unique().tolist(),
+        "no_en_tabla": largo.loc[lote_valido & ~dni_valido, "DNI"].unique().tolist(),
+        "lotes_desconocidos": largo.loc[~lote_valido, "LOTE"].unique().tolist(),
+        "filas_repetidas": repetidos,
+    }
+
+
+def plantilla_participacion(tabla, lotes):
+    """
+    Bytes xlsx de la hoja larga con los valores actuales de tabla, lista
+    para completar y volver a subir.
+    """
+    filas = []
+    for lote in lotes:
+        filas.append(pd.DataFrame({
+            "DNI": tabla["DNI"].to_numpy(),
+            "NOMBRE COMPLETO": tabla["NOMBRE COMPLETO"].to_numpy(),
+            "LOTE": lote,
+            "PARTICIPACIÓN": np.round(tabla[f"P_{lote}"].to_numpy(dtype=float), 4),
+            "FALTAS": tabla[f"F_{lote}"].to_numpy(),
+        }))
+    largo = pd.concat(filas, ignore_index=True) if filas else pd.DataFrame(
+        columns=["DNI", "NOMBRE COMPLETO", "LOTE", "PARTICIPACIÓN", "FALTAS"]
+    )
+
+    output = BytesIO()
+    largo.to_excel(output, index=False)
+    return output.getvalue()
+
+
+# =========================
+# EXCEL PREVIAMENTE GENERADO
+# =========================
+MARCADORES = ("LOTE", "DNI", "EDAD")
+
+
+def leer_bloque_invertido(raw, fila_inicio, n_filas):
+    """
+    raw        : dataframe completo sin header
+    fila_inicio: fila donde está 'Edad'
+    n_filas    : número de filas del bloque
+    """
+
+    # encabezados (lotes) están UNA FILA ARRIBA
+    lotes = (
+        raw.iloc[fila_inicio - 1, 1:]
+        .astype(str)
+        .str.replace(".0", "", regex=False)
+        .str.strip()
+    )
+
+    bloque = raw.iloc[fila_inicio:fila_inicio + n_filas].copy()
+
+    data = bloque.iloc[:, 1:]
+    data.columns = lotes
+
+    data.index = (
+        bloque.iloc[:, 0]
+        .astype(str)
+        .str.strip()
+    )
+
+    return data
+
+
+def get_valor(df, fila_idx, col, default=0.0):
+    try:
+        v = df.iloc[fila_idx][col]
+        return float(v) if pd.notna(v) else default
+    except:
+        return default
+
+
+def indice_marcadores(raw):
+    """
+    {marcador: [filas]} para LOTE, DNI y EDAD en la columna A,
+    recorriendo la columna una sola vez.
+    """
+    col_a = raw.iloc[:, 0].astype(str).str.strip().str.upper()
+    filas = col_a[col_a.isin(MARCADORES)]
+
+    indice = {m: [] for m in MARCADORES}
+    for fila, marcador in filas.items():
+        indice[marcador].append(fila)
+
+    return indice
+
+
+def _como_texto(serie):
+    # Igual que read_excel(dtype=str): texto, pero los vacíos siguen vacíos
+    return serie.map(str).where(serie.notna())
+
+
+def _es_numerico(dtype):
+    if dtype is None:
+        return False
+    try:
+        return pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(dtype))
+    except TypeError:
+        return False
+
+
+def _con_tipo(serie, dtype):
+    valores = pd.to_numeric(serie, errors="coerce")
+    # Un entero con vacíos no puede volver a int: se queda en float
+    if pd.api.types.is_integer_dtype(dtype) and valores.isna().any():
+        return valores.astype(float)
+    return valores.astype(dtype)
+
+
+def _tabla_desde_raw(raw, fila_tabla, dtypes=None):
+    """
+    Tabla de trabajadores a partir de la fila de encabezados, sin volver
+    a leer el archivo. Con dtypes (de los metadatos) las columnas
+    numéricas recuperan su tipo; el resto queda como texto.
+    """
+    encabezados = raw.iloc[fila_tabla]
+    columnas = [
+        str(c) if pd.notna(c) else f"Unnamed: {i}"
+        for i, c in enumerate(encabezados)
+    ]
+
+    df = raw.iloc[fila_tabla + 1:].copy()
+    df.columns = columnas
+    df = df.dropna(how="all").reset_index(drop=True)
+
+    dtypes = dtypes or {}
+    for c in df.columns:
+        if _es_numerico(dtypes.get(c)):
+            df[c] = _con_tipo(df[c], dtypes[c])
+        else:
+            df[c] = _como_texto(df[c])
+
+    return df
+
+
+def _limpiar_tabla(df):
+    df.columns = df.columns.str.strip().str.upper()
+    df["DNI"] = (
+        df["DNI"]
+        .str.replace("'", "", regex=False)
+        .str.replace(".0", "", regex=False)
+        .str.zfill(8)
+    )
+    return df
+
+
+# =========================
+# METADATOS (HOJA OCULTA)
+# =========================
+def leer_metadatos(xls):
+    """
+    Metadatos de la hoja oculta, o None si el archivo es antiguo,
+    de una versión más nueva o la hoja está dañada.
+    """
+    if HOJA_META not in xls.sheet_names:
+        return None
+
+    try:
+        filas = xls.parse(HOJA_META, header=None, dtype=object).iloc[:, 0]
+        texto = "".join(
+            str(f)[len(META_PREFIJO):] for f in filas if pd.notna(f)
+        )
+        meta = json.loads(texto)
+    except (ValueError, IndexError):
+        return None
+
+    if not isinstance(meta, dict) or meta.get("version", 0) > META_VERSION:
+        return None
+
+    return meta
+
+
+def _estado_desde_meta(xls, meta):
+    """
+    Estado directo desde los metadatos; solo se lee el bloque de
+    trabajadores, en la fila indicada. None si la hoja ya no coincide
+    (p. ej. alguien insertó filas a mano).
+    """
+    try:
+        seccion = meta["secciones"]["trabajadores"]
+        fila, filas = int(seccion["fila"]), int(seccion["filas"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    raw = xls.parse(
+        SHEET_NAME,
+        header=None,
+        skiprows=fila,
+        nrows=filas + 1,
+        dtype=object
+    )
+    if raw.empty or str(raw.iat[0, 0]).strip().upper() != "DNI":
+        return None
+
+    df = _limpiar_tabla(_tabla_desde_raw(raw, 0, meta.get("dtypes")))
+    if len(df) != filas:
+        return None
+
+    return {
+        "granja": meta["granja"],
+        "tipo": meta["tipo"],
+        "lotes": meta["lotes"],
+        "config_lotes": meta["config_lotes"],
+        "tabla": df,
+        "datos_productivos": meta["datos_productivos"],
+    }
+
+
+def leer_excel_generado(contenido):
+    """
+    Reconstruye el estado desde un Excel descargado del sistema.
+    Si trae la hoja de metadatos, va directo a cada bloque; si no
+    (archivos antiguos), ubica los bloques por sus marcadores.
+
+    Devuelve dict con granja, tipo, lotes, config_lotes, tabla y
+    datos_productivos (None si no se pueden reconstruir).
+    Lanza ValueError si el archivo no tiene la estructura esperada.
+    """
+    xls = pd.ExcelFile(BytesIO(contenido), engine="openpyxl")
+
+    meta = leer_metadatos(xls)
+    if meta is not None:
+        estado = _estado_desde_meta(xls, meta)
+        if estado is not None:
+            return estado
+
+    # =========================
+    # LECTURA RAW (ÚNICA)
+    # =========================
+    raw = xls.parse(SHEET_NAME, header=None, dtype=object)
+    return _estado_por_marcadores(raw)
+
+
+def _estado_por_marcadores(raw):
+    marcadores = indice_marcadores(raw)
+
+    # =========================
+    # 1️⃣ ENCABEZADO
+    # =========================
+    encabezado = raw.iloc[0:5, 0:2].copy()
+    encabezado.columns = ["CAMPO", "VALOR"]
+    encabezado["CAMPO"] = encabezado["CAMPO"].astype(str).str.upper().str.strip()
+
+    granja = encabezado.loc[
+        encabezado["CAMPO"] == "GRANJA", "VALOR"
+    ].values[0]
+
+    tipo = encabezado.loc[
+        encabezado["CAMPO"] == "TIPO DE PROCESO", "VALOR"
+    ].values[0]
+
+    lotes_txt = encabezado.loc[
+        encabezado["CAMPO"] == "LOTES", "VALOR"
+    ].values[0]
+
+    lotes = [l.strip() for l in lotes_txt.split(",")]
+
+    # =========================
+    # 2️⃣ CONFIGURACIÓN POR LOTE (ROBUSTA, SOLO A–C)
+    # =========================
+    if not marcadores["LOTE"] or not marcadores["DNI"]:
+        raise ValueError("No se detectaron los bloques de lotes y trabajadores")
+
+    fila_lotes = marcadores["LOTE"][0]
+
+    # Cortar al primer vacío (evita Hembras/Machos)
+    fin_lotes = fila_lotes + 1
+    while fin_lotes < len(raw) and pd.notna(raw.iat[fin_lotes, 0]):
+        fin_lotes += 1
+
+    # Leer SOLO columnas A, B y C
+    df_lotes_raw = raw.iloc[fila_lotes + 1:fin_lotes, 0:3].copy()
+    df_lotes_raw.columns = ["LOTE", "GENETICA", "MONTO"]
+
+    # Limpieza fuerte
+    df_lotes_raw["LOTE"] = df_lotes_raw["LOTE"].astype(str).str.strip()
+    df_lotes_raw["GENETICA"] = (
+        df_lotes_raw["GENETICA"]
+        .astype(str)
+        .str.strip()
+        .str.upper()
+    )
+
+    df_lotes_raw["MONTO"] = (
+        df_lotes_raw["MONTO"]
+        .astype(str)
+        .str.replace(",", "", regex=False)
+    )
+    df_lotes_raw["MONTO"] = pd.to_numeric(
+        df_lotes_raw["MONTO"], errors="coerce"
+    )
+
+    df_lotes_raw = df_lotes_raw[df_lotes_raw["LOTE"] != ""]
+
+    # Construir config_lotes LIMPIO
+    config_lotes = {}
+    for lote, genetica, monto in zip(
+        df_lotes_raw["LOTE"], df_lotes_raw["GENETICA"], df_lotes_raw["MONTO"]
+    ):
+        config_lotes[lote] = {
+            "GENETICA": genetica if genetica else "ROSS",
+            "MONTO": float(monto) if pd.notna(monto) else 0.0
+        }
+
+    # =========================
+    # 3️⃣ TABLA DE TRABAJADORES
+    # =========================
+    df = _limpiar_tabla(_tabla_desde_raw(raw, marcadores["DNI"][0]))
+
+    # =========================
+    # 4️⃣ DATOS PRODUCTIVOS – LEVANTE
+    # =========================
+    datos_productivos = None
+
+    if tipo == "LEVANTE":
+
+        datos_productivos = {}
+
+        idx_edades = marcadores["EDAD"]
+
+        if len(idx_edades) < 2:
+            raise ValueError("No se detectaron bloques de Hembras y Machos")
+
+        inicio_h = idx_edades[0]   # Hembras
+        inicio_m = idx_edades[1]   # Machos
+
+        df_h = leer_bloque_invertido(raw, inicio_h, 8)
+        df_m = leer_bloque_invertido(raw, inicio_m, 7)
+
+        for lote in df_h.columns:
+            datos_productivos.setdefault(lote, {})
+
+            datos_productivos[lote]["HEMBRAS"] = {
+                "EDAD": get_valor(df_h, 0, lote),
+                "UNIFORMIDAD": get_valor(df_h, 1, lote),
+                "AVES_ENTREGADAS": get_valor(df_h, 2, lote),
+                "POBLACION_INICIAL": get_valor(df_h, 3, lote),
+                "PCT_CUMP_AVES": get_valor(df_h, 4, lote),
+                "PESO": get_valor(df_h, 5, lote),
+                "PESO_STD": get_valor(df_h, 6, lote),
+                "PCT_CUMP_PESO": get_valor(df_h, 7, lote),
+            }
+
+            datos_productivos[lote]["MACHOS"] = {
+                "EDAD": get_valor(df_m, 0, lote),
+                "UNIFORMIDAD": get_valor(df_m, 1, lote),
+                "AVES_ENTREGADAS": get_valor(df_m, 2, lote),
+                "POBLACION_INICIAL": get_valor(df_m, 3, lote),
+                "PESO": get_valor(df_m, 4, lote),
+                "PESO_STD": get_valor(df_m, 5, lote),
+                "PCT_CUMP_PESO": get_valor(df_m, 6, lote),
+            }
+
+    return {
+        "granja": granja,
+        "tipo": tipo,
+        "lotes": lotes,
+        "config_lotes": config_lotes,
+        "tabla": df,
+        "datos_productivos": datos_productivos,
+    }
@@ -0,0 +1,156 @@
+"""
+Recalcula y consolida, sin interfaz, muchos Excel BONO_REPRODUCTORAS.
+
+Uso:
+    python consolidar.py CARPETA [--salida consolidado.xlsx] [--csv] [--procesos N]
+
+Cada archivo se lee con el mismo lector de la app, se recalcula con
+REGLAS_PRODUCCION / REGLAS_LEVANTE y DESCUENTO_FALTAS, y se compara el
+TOTAL S/ guardado contra el recalculado.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from calculo import DESCUENTO_FALTAS, calcular_bono, reglas_por_tipo
+from carga import leer_excel_generado
+
+# Diferencia mínima (S/) para reportar una discrepancia
+TOLERANCIA = 0.005
+
+
+# =========================
+# UN ARCHIVO (SE EJECUTA EN UN PROCESO DEL POOL)
+# =========================
+def procesar_archivo(ruta):
+    """
+    Devuelve (resumen, df_recalculado). Si el archivo no se puede leer o
+    calcular, df_recalculado es None y el error queda en el resumen.
+    """
+    resumen = {"ARCHIVO": Path(ruta).name}
+
+    try:
+        estado = leer_excel_generado(Path(ruta).read_bytes())
+        tabla = estado["tabla"]
+        lotes = estado["lotes"]
+
+        guardado = pd.to_numeric(
+            tabla.get("TOTAL S/", pd.Series(index=tabla.index, dtype=float)),
+            errors="coerce"
+        )
+        base = tabla.drop(
+            columns=[c for c in tabla.columns if c.startswith("PAGO_") or c == "TOTAL S/"]
+        )
+
+        df_final = calcular_bono(
+            base,
+            estado["config_lotes"],
+            reglas_por_tipo(estado["tipo"]),
+            DESCUENTO_FALTAS,
+            lotes=lotes
+        )
+    except Exception as e:
+        resumen["ESTADO"] = f"ERROR: {e}"
+        return resumen, None
+
+    df_final.insert(0, "ARCHIVO", resumen["ARCHIVO"])
+    df_final.insert(1, "GRANJA", estado["granja"])
+    df_final.insert(2, "TIPO", estado["tipo"])
+    df_final["TOTAL GUARDADO S/"] = guardado.to_numpy()
+    df_final["DIFERENCIA S/"] = (
+        df_final["TOTAL S/"] - df_final["TOTAL GUARDADO S/"]
+    ).round(2)
+
+    resumen.update({
+        "GRANJA": estado["granja"],
+        "TIPO": estado["tipo"],
+        "LOTES": ", ".join(lotes),
+        "TRABAJADORES": len(df_final),
+        "TOTAL GUARDADO S/": round(guardado.sum(), 2),
+        "TOTAL RECALCULADO S/": round(df_final["TOTAL S/"].sum(), 2),
+        "ESTADO": "OK",
+    })
+
+    return resumen, df_final
+
+
+def discrepancias(consolidado):
+    diferencia = consolidado["DIFERENCIA S/"].abs()
+    sin_guardado = consolidado["TOTAL GUARDADO S/"].isna()
+    return consolidado[(diferencia > TOLERANCIA) | sin_guardado]
+
+
+# =========================
+# CONSOLIDACIÓN
+# =========================
+def consolidar(archivos, procesos=None):
+    """
+    Procesa los archivos en paralelo y devuelve
+    (resumen_archivos, consolidado, discrepancias).
+    """
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        resultados = list(pool.map(procesar_archivo, archivos))
+
+    resumen_archivos = pd.DataFrame([r for r, _ in resultados])
+    tablas = [df for _, df in resultados if df is not None]
+
+    if tablas:
+        consolidado = pd.concat(tablas, ignore_index=True)
+    else:
+        consolidado = pd.DataFrame(columns=["ARCHIVO", "TOTAL S/", "TOTAL GUARDADO S/", "DIFERENCIA S/"])
+
+    return resumen_archivos, consolidado, discrepancias(consolidado)
+
+
+def guardar(salida, resumen_archivos, consolidado, df_discrepancias, csv=False):
+    salida = Path(salida)
+
+    if csv:
+        base = salida.with_suffix("")
+        consolidado.to_csv(f"{base}_consolidado.csv", index=False, encoding="utf-8-sig")
+        df_discrepancias.to_csv(f"{base}_discrepancias.csv", index=False, encoding="utf-8-sig")
+        resumen_archivos.to_csv(f"{base}_archivos.csv", index=False, encoding="utf-8-sig")
+        return
+
+    with pd.ExcelWriter(salida, engine="openpyxl") as writer:
+        resumen_archivos.to_excel(writer, sheet_name="ARCHIVOS", index=False)
+        df_discrepancias.to_excel(writer, sheet_name="DISCREPANCIAS", index=False)
+        consolidado.to_excel(writer, sheet_name="CONSOLIDADO", index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recalcula y consolida Excel BONO_REPRODUCTORAS"
+    )
+    parser.add_argument("carpeta", help="carpeta con los .xlsx generados")
+    parser.add_argument("--salida", default="consolidado.xlsx")
+    parser.add_argument("--csv", action="store_true", help="escribir CSV en lugar de xlsx")
+    parser.add_argument("--procesos", type=int, default=None, help="por defecto, todos los núcleos")
+    args = parser.parse_args()
+
+    archivos = sorted(
+        str(p) for p in Path(args.carpeta).glob("*.xlsx")
+        if not p.name.startswith("~$")
+    )
+    if not archivos:
+        raise SystemExit(f"No hay archivos .xlsx en {args.carpeta}")
+
+    inicio = time.perf_counter()
+    resumen_archivos, consolidado, df_discrepancias = consolidar(archivos, args.procesos)
+    guardar(args.salida, resumen_archivos, consolidado, df_discrepancias, csv=args.csv)
+
+    errores = (resumen_archivos["ESTADO"] != "OK").sum()
+    print(
+        f"{len(archivos)} archivos ({errores} con error), "
+        f"{len(consolidado)} trabajadores, "
+        f"{len(df_discrepancias)} discrepancias "
+        f"en {time.perf_counter() - inicio:.1f} s (procesos: {args.procesos or os.cpu_count()})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+from email.message import EmailMessage
+from html import escape
+
+import numpy as np
+import pandas as pd
+
+from productivos import CAMPOS_PROD, CAMPOS_H, CAMPOS_M
+
+
+# ==================================================
+# ESTILOS INLINE (OUTLOOK-SAFE), ARMADOS UNA SOLA VEZ
+# ==================================================
+_ESTILO_TABLA = (
+    "border-collapse:collapse; width:auto; max-width:760px; "
+    "font-family:Arial, sans-serif; font-size:12px;"
+)
+_TH = (
+    "<th style='border:1px solid #d1d5db; background:#f3f4f6; "
+    "padding:6px 8px; text-align:left; white-space:nowrap;'>"
+)
+_TD = {
+    alineacion: (
+        f"<td style='border:1px solid #d1d5db; padding:6px 8px; "
+        f"text-align:{alineacion}; white-space:nowrap;'>"
+    )
+    for alineacion in ("left", "right", "center")
+}
+_TD_NOTA = (
+    "<td colspan='{n}' style='border:1px solid #d1d5db; padding:6px 8px; "
+    "font-style:italic; color:#6b7280;'>{texto}</td>"
+)
+
+# Filas de trabajadores que se muestran en el cuerpo del correo
+FILAS_MAX_CORREO = 200
+
+
+# ==================================================
+# FORMATO VECTORIZADO (UNA COLUMNA / FILA → TEXTO)
+# ==================================================
+def _texto_numerico(valores, decimales):
+    """
+    Números → texto con decimales fijos (None = entero truncado, como
+    int(x)); vacío donde no hay número.
+    """
+    numeros = pd.to_numeric(pd.Series(valores), errors="coerce").to_numpy(dtype=float)
+    vacios = np.isnan(numeros)
+    relleno = np.where(vacios, 0, numeros)
+
+    if decimales is None:
+        texto = np.char.mod("%d", np.trunc(relleno).astype(np.int64))
+    else:
+        texto = np.char.mod(f"%.{int(decimales)}f", relleno)
+
+    return np.where(vacios, "", texto).astype(object)
+
+
+def _texto_libre(valores):
+    serie = pd.Series(valores, dtype=object)
+    texto = serie.where(serie.notna(), "").astype(str)
+    # Solo se escapa lo que hace falta (la mayoría de columnas no tiene < > &)
+    if texto.str.contains("[&<>\"']", regex=True).any():
+        texto = texto.map(escape)
+    return texto.to_numpy(dtype=object)
+
+
+def _tabla_html(titulos, columnas, alineacion, etiquetas=None, nota=None):
+    """
+    Arma la tabla en una pasada: titulos (encabezado), columnas (listas
+    de texto ya formateado), etiquetas opcionales de fila (<th>).
+    """
+    td = _TD[alineacion]
+    celdas = [[td + v + "</td>" for v in col] for col in columnas]
+    if etiquetas is not None:
+        celdas.insert(0, [_TH + escape(str(e)) + "</th>" for e in etiquetas])
+        titulos = [""] + list(titulos)
+
+    partes = [
+        f"<table border='1' style='{_ESTILO_TABLA}'><thead><tr>",
+        "".join(_TH + escape(str(t)) + "</th>" for t in titulos),
+        "</tr></thead><tbody>",
+    ]
+    partes.extend("<tr>" + "".join(fila) + "</tr>" for fila in zip(*celdas))
+    if nota:
+        partes.append("<tr>" + _TD_NOTA.format(n=len(titulos), texto=escape(nota)) + "</tr>")
+    partes.append("</tbody></table>")
+
+    return "".join(partes)
+
+
+# ==================================================
+# Helper: tabla invertida (filas=campos)
+# ==================================================
+def tabla_html_limpia_invertida(df, decimales_por_fila=None, alineacion="right"):
+    """
+    Filas con algún número: decimales de decimales_por_fila o entero.
+    Filas sin números (p. ej. Etapa): texto tal cual.
+    """
+    decimales_por_fila = decimales_por_fila or {}
+    valores = df.to_numpy(dtype=object)
+
+    filas = []
+    for i, fila in enumerate(df.index):
+        numeros = pd.to_numeric(pd.Series(valores[i]), errors="coerce")
+        if numeros.notna().any():
+            filas.append(_texto_numerico(numeros, decimales_por_fila.get(fila)))
+        else:
+            filas.append(_texto_libre(valores[i]))
+
+    # Se arma por columnas (lotes)
+    columnas = list(zip(*filas)) if filas else [[] for _ in df.columns]
+    return _tabla_html(df.columns, columnas, alineacion, etiquetas=df.index)
+
+
+# ==================================================
+# Helper: tabla normal (filas = registros)
+# ==================================================
+def tabla_html_limpia_normal(df, decimales_por_col=None, alineacion="left", max_filas=None):
+    """
+    max_filas: solo las primeras filas y una nota al pie con las que
+    faltan (el detalle completo va en el Excel adjunto).
+    """
+    decimales_por_col = decimales_por_col or {}
+
+    nota = None
+    if max_filas is not None and len(df) > max_filas:
+        nota = (
+            f"… y {len(df) - max_filas:,} filas más. "
+            "Ver el detalle completo en el Excel adjunto."
+        )
+        df = df.iloc[:max_filas]
+
+    columnas = [
+        _texto_numerico(df[c], decimales_por_col[c])
+        if c in decimales_por_col
+        else _texto_libre(df[c])
+        for c in df.columns
+    ]
+    return _tabla_html(df.columns, columnas, alineacion, nota=nota)
+
+
+# =========================
+# 🧬 DATOS PRODUCTIVOS (CORREO)
+# =========================
+def bloque_productivo_html(tipo, lotes, datos_productivos):
+    if tipo == "PRODUCCIÓN":
+        campos_prod = {"Etapa": "ETAPA", **CAMPOS_PROD}
+
+        data_prod = {
+            campo: [
+                datos_productivos
+                .get(lote, {})
+                .get(key, "Primera etapa" if key == "ETAPA" else 0)
+                for lote in lotes
+            ]
+            for campo, key in campos_prod.items()
+        }
+
+        df_prod_mail = pd.DataFrame(data_prod, index=lotes).T
+
+        df_etapa = df_prod_mail.loc[["Etapa"]]
+        df_num = df_prod_mail.drop(index=["Etapa"])
+
+        return f"""
+        <h3>🏭 Datos productivos – Producción</h3>
+        {tabla_html_limpia_invertida(df_etapa, alineacion="left")}
+        {tabla_html_limpia_invertida(df_num, {
+            "Huevos / AA": 2,
+            "% Cumplimiento": 2,
+            "% Huevos bomba": 2
+        })}
+        """
+
+    # Hembras
+    df_h_mail = pd.DataFrame({
+        campo: [
+            datos_productivos
+            .get(l, {}).get("HEMBRAS", {}).get(key, 0)
+            for l in lotes
+        ]
+        for campo, key in CAMPOS_H.items()
+    }, index=lotes).T
+
+    # Machos
+    df_m_mail = pd.DataFrame({
+        campo: [
+            datos_productivos
+            .get(l, {}).get("MACHOS", {}).get(key, 0)
+            for l in lotes
+        ]
+        for campo, key in CAMPOS_M.items()
+    }, index=lotes).T
+
+    return f"""
+    <h3>🐔 Datos productivos – Levante (Hembras)</h3>
+    {tabla_html_limpia_invertida(df_h_mail, {
+        "Uniformidad (%)": 2,
+        "% Cumpl. aves": 2,
+        "% Cumpl. peso": 2,
+        "Peso": 3,
+        "Peso STD": 2
+    })}
+    <h3>🐔 Datos productivos – Levante (Machos)</h3>
+    {tabla_html_limpia_invertida(df_m_mail, {
+        "Uniformidad (%)": 2,
+        "% Cumpl. peso": 2,
+        "Peso": 3,
+        "Peso STD": 3
+    })}
+    """
+
+
+# =========================
+# CUERPO DEL CORREO
+# =========================
+def cuerpo_correo_html(granja, tipo, lotes, datos_productivos, resumen_lote, df_final, mensaje):
+    # 📦 Resumen por lote
+    tabla_lote_html = tabla_html_limpia_normal(
+        resumen_lote,
+        decimales_por_col={"Total S/": 2, "% del total": 2},
+        alineacion="left"
+    )
+
+    # 💰 Resultado final
+    cols_pago = [c for c in df_final.columns if c.startswith("PAGO_")]
+    if "TOTAL S/" in df_final.columns:
+        cols_pago.append("TOTAL S/")
+
+    tabla_resultado_html = tabla_html_limpia_normal(
+        df_final,
+        decimales_por_col={c: 2 for c in cols_pago},
+        alineacion="left",
+        max_filas=FILAS_MAX_CORREO
+    )
+
+    return f"""
+    <html>
+    <body style="font-family:Arial, sans-serif; font-size:12px;">
+        <h2>Bono Reproductoras GDP</h2>
+        <p><b>Granja:</b> {granja}</p>
+        <p><b>Tipo de proceso:</b> {tipo}</p>
+        <p><b>Lotes:</b> {", ".join(lotes)}</p>
+        <p><b>Fecha:</b> {pd.Timestamp.now().strftime("%Y-%m-%d %H:%M")}</p>
+
+        {bloque_productivo_html(tipo, lotes, datos_productivos)}
+
+        <h3>📦 Resumen por lote</h3>
+        {tabla_lote_html}
+
+        <h3>💰 Resultado final por trabajador</h3>
+        {tabla_resultado_html}
+
+        <p>{mensaje}</p>
+        <p><b>Equipo de Control de Gestión</b></p>
+    </body>
+    </html>
+    """
+
+
+# =========================
+# MENSAJE COMPLETO
+# =========================
+def mensaje_correo(remitente, destino, asunto, cuerpo_html, adjunto, nombre_adjunto="bono_reproductoras_final.xlsx"):
+    msg = EmailMessage()
+    msg["From"] = remitente
+    msg["To"] = destino
+    msg["Subject"] = asunto
+
+    msg.add_alternative(cuerpo_html, subtype="html")
+
+    msg.add_attachment(
+        adjunto,
+        maintype="application",
+        subtype="vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=nombre_adjunto
+    )
+    return msg
+
+
+# =========================
+# 📬 DISTRIBUCIÓN POR DESTINATARIO
+# =========================
+TODOS_LOS_LOTES = ("", "TODOS", "*")
+
+
+def lotes_por_destinatario(mapa, lotes):
+    """
+    mapa: DataFrame con CORREO y LOTES ("201, 202"; vacío o TODOS = todos).
+    Devuelve {correo: [lotes]} en el orden de lotes; un correo repetido
+    junta sus lotes. Lotes que no están en la corrida se ignoran.
+    """
+    destinatarios = {}
+
+    for correo, texto in zip(mapa["CORREO"], mapa["LOTES"]):
+        correo = str(correo or "").strip()
+        if not correo or correo.lower() == "nan":
+            continue
+
+        texto = str(texto if pd.notna(texto) else "").strip()
+        if texto.upper() in TODOS_LOS_LOTES:
+            pedidos = set(lotes)
+        else:
+            pedidos = {l.strip() for l in texto.split(",")}
+
+        destinatarios.setdefault(correo, set()).update(pedidos)
+
+    return {
+        correo: [l for l in lotes if l in pedidos]
+        for correo, pedidos in destinatarios.items()
+        if any(l in pedidos for l in lotes)
+    }
+
+
+def particion_df_final(df_final, lotes):
+    """
+    Trabajadores con participación en alguno de los lotes, solo con las
+    columnas de esos lotes y TOTAL S/ recalculado sobre ellos.
+    """
+    pcts = [f"P_{l}" for l in lotes]
+    pagos = [f"PAGO_{l}" for l in lotes]
+    base = [c for c in ("DNI", "NOMBRE COMPLETO", "CARGO") if c in df_final.columns]
+
+    participa = (
+        df_final[pcts].apply(pd.to_numeric, errors="coerce").fillna(0) > 0
+    ).any(axis=1)
+
+    parte = df_final.loc[
+        participa,
+        base + pcts + [f"F_{l}" for l in lotes] + pagos
+    ].copy()
+    parte["TOTAL S/"] = parte[pagos].sum(axis=1)
+
+    return parte
@@ -0,0 +1,283 @@
+"""
+Autoguardado por sesión: foto + diario de cambios (solo se agrega).
+
+    <usuario>/<sesion>.bono   foto completa del estado (formato borrador)
+    <usuario>/<sesion>.jsonl  un cambio por línea desde la última foto
+
+Las cuentas se comparten entre supervisores: cada sesión de la página
+escribe solo sus propios archivos. Recuperar una sesión sin terminar la
+adopta (se renombran sus archivos a los de la sesión nueva); si la
+ventana original seguía abierta, su próximo cambio no encuentra la foto
+y vuelve a empezar con una propia.
+
+Cada acción de guardado de la página agrega una línea pequeña (agregar /
+eliminar trabajador, celdas editadas, contexto de granja, lotes y datos
+productivos). Cada COMPACTAR_CADA cambios se escribe una foto nueva y el
+diario vuelve a empezar. Recuperar = leer la foto y aplicar las líneas:
+no pasa por el Excel.
+
+Si el proceso se cae a mitad de una línea, esa línea incompleta se ignora.
+
+Al descargar el Excel o enviar el correo se anota {"op": "terminada"}:
+mientras sea la última línea, la sesión no se ofrece para recuperar. Un
+cambio posterior la vuelve a dejar sin terminar.
+"""
+import json
+import os
+import re
+import time
+import uuid
+
+import pandas as pd
+
+from borrador import guardar_borrador, leer_borrador
+from exportar import json_nativo
+
+DIR_DIARIO = os.environ.get("BONO_DIARIO_DIR", "diario_sesiones")
+COMPACTAR_CADA = 50
+DIAS_CONSERVAR = 7
+LINEA_TERMINADA = b'{"op": "terminada"}'
+
+CAMPOS_CONTEXTO = ("granja", "tipo", "lotes", "config_lotes", "datos_productivos")
+
+
+def _valor(v):
+    return None if pd.isna(v) else v
+
+
+def _ultima_linea(ruta):
+    try:
+        with open(ruta, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            lineas = f.read().splitlines()
+    except OSError:
+        return None
+    return lineas[-1] if lineas else None
+
+
+def _escribir_atomico(ruta, contenido):
+    temporal = f"{ruta}.tmp{os.getpid()}"
+    with open(temporal, "wb") as f:
+        f.write(contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+# =========================
+# CAMBIOS EN LA TABLA
+# =========================
+def _por_defecto(col):
+    return 0.0 if col.startswith("P_") else 0
+
+
+def cambios_tabla(antes, despues):
+    """
+    [[etiqueta, columna, valor], ...] de las celdas de despues que
+    difieren de antes (mismas etiquetas de fila). En columnas nuevas
+    (lote agregado) solo las que no tienen el valor por defecto.
+    """
+    cambios = []
+    comunes = despues.index.intersection(antes.index, sort=False)
+
+    for col in despues.columns:
+        nuevo = despues.loc[comunes, col]
+        if col in antes.columns:
+            previo = antes.loc[comunes, col]
+        else:
+            previo = pd.Series(_por_defecto(col), index=comunes)
+
+        if nuevo.dtype != previo.dtype:
+            nuevo, previo = nuevo.astype(object), previo.astype(object)
+        iguales = (
+            (nuevo == previo).to_numpy(dtype=bool, na_value=False)
+            | (nuevo.isna() & previo.isna()).to_numpy()
+        )
+        nuevo = nuevo[~iguales]
+
+        cambios.extend(
+            [etiqueta, col, _valor(v)]
+            for etiqueta, v in zip(nuevo.index.tolist(), nuevo.astype(object).tolist())
+        )
+
+    return cambios
+
+
+def _aplicar(estado, cambio):
+    op = cambio["op"]
+    tabla = estado["tabla"]
+
+    if op == "contexto":
+        estado.update({k: cambio[k] for k in CAMPOS_CONTEXTO if k in cambio})
+
+    elif op == "agregar":
+        # Una fila (alta individual) o varias (alta masiva)
+        filas = pd.DataFrame(cambio["filas"] if "filas" in cambio else [cambio["fila"]])
+        # Las altas se anotan sin P_/F_ (empiezan en 0)
+        for col in tabla.columns:
+            if col.startswith(("P_", "F_")) and col not in filas.columns:
+                filas[col] = _por_defecto(col)
+        estado["tabla"] = pd.concat([tabla, filas], ignore_index=True)
+
+    elif op == "eliminar":
+        dnis = cambio["dnis"] if "dnis" in cambio else [cambio["dni"]]
+        estado["tabla"] = tabla[~tabla["DNI"].isin(dnis)]
+
+    elif op == "editar":
+        cambios = pd.DataFrame(cambio["cambios"], columns=["fila", "columna", "valor"])
+        for col, grupo in cambios.groupby("columna", sort=False):
+            if col not in tabla.columns:
+                tabla[col] = _por_defecto(col)
+            elif isinstance(tabla[col].dtype, pd.CategoricalDtype):
+                tabla[col] = tabla[col].astype(object)
+            valores = grupo["valor"]
+            if tabla[col].dtype.kind in "iuf":
+                valores = pd.to_numeric(valores)
+            tabla.loc[grupo["fila"].to_numpy(), col] = valores.to_numpy()
+        estado["tabla"] = tabla
+
+
+# =========================
+# DIARIO DE UNA SESIÓN
+# =========================
+class Diario:
+    def __init__(self, usuario, sesion=None, directorio=DIR_DIARIO):
+        cuenta = re.sub(r"[^\w.-]", "_", str(usuario)) or "anonimo"
+        self.sesion = sesion or uuid.uuid4().hex
+        self.directorio = os.path.join(directorio, cuenta)
+        self.ruta_foto, self.ruta_diario = self._rutas(self.sesion)
+        self.pendientes = 0
+
+    def _rutas(self, sesion):
+        base = os.path.join(self.directorio, sesion)
+        return f"{base}.bono", f"{base}.jsonl"
+
+    def existe(self):
+        return os.path.exists(self.ruta_foto)
+
+    def guardado(self):
+        """
+        Momento del último cambio guardado (o None).
+        """
+        rutas = [r for r in (self.ruta_foto, self.ruta_diario) if os.path.exists(r)]
+        if not rutas:
+            return None
+        return pd.Timestamp.fromtimestamp(max(os.path.getmtime(r) for r in rutas))
+
+    def sin_terminar(self):
+        """
+        [(sesion, último cambio), ...] de las otras sesiones de la cuenta
+        con foto y sin terminar, la más reciente primero.
+        """
+        if not os.path.isdir(self.directorio):
+            return []
+        otras = []
+        for archivo in os.listdir(self.directorio):
+            sesion, extension = os.path.splitext(archivo)
+            if extension != ".bono" or sesion == self.sesion:
+                continue
+            if _ultima_linea(self._rutas(sesion)[1]) == LINEA_TERMINADA:
+                continue
+            rutas = [r for r in self._rutas(sesion) if os.path.exists(r)]
+            try:
+                otras.append((sesion, pd.Timestamp.fromtimestamp(max(os.path.getmtime(r) for r in rutas))))
+            except (OSError, ValueError):
+                # Adoptada o descartada mientras se listaba
+                continue
+        return sorted(otras, key=lambda x: x[1], reverse=True)
+
+    def adoptar(self, sesion):
+        """
+        Pasa la foto y el diario de otra sesión a esta. La foto se mueve
+        primero: desde ese momento la otra sesión deja de anotar.
+        FileNotFoundError si otra ventana la adoptó antes.
+        """
+        foto, cambios = self._rutas(sesion)
+        os.replace(foto, self.ruta_foto)
+        try:
+            os.replace(cambios, self.ruta_diario)
+        except FileNotFoundError:
+            _escribir_atomico(self.ruta_diario, b"")
+
+    def limpiar(self, dias=DIAS_CONSERVAR):
+        """
+        Borra las sesiones de la cuenta sin cambios hace más de dias.
+        """
+        limite = time.time() - dias * 86400
+        if not os.path.isdir(self.directorio):
+            return
+        for archivo in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, archivo)
+            try:
+                if os.path.getmtime(ruta) < limite:
+                    os.remove(ruta)
+            except OSError:
+                pass
+
+    def foto(self, estado):
+        """
+        Foto completa del estado; el diario vuelve a empezar.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        _escribir_atomico(self.ruta_foto, guardar_borrador(
+            estado["granja"],
+            estado["tipo"],
+            estado["lotes"],
+            estado["config_lotes"],
+            estado["datos_productivos"],
+            estado["tabla"]
+        ))
+        _escribir_atomico(self.ruta_diario, b"")
+        self.pendientes = 0
+
+    def anotar(self, op, **datos):
+        # Sin foto (otra ventana adoptó esta sesión): la página toma una nueva
+        if not self.existe():
+            raise FileNotFoundError(self.ruta_foto)
+        linea = json.dumps({"op": op, **datos}, ensure_ascii=False, default=json_nativo)
+        with open(self.ruta_diario, "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.pendientes += 1
+
+    def terminar(self):
+        """
+        Marca la sesión como terminada (Excel descargado o correo enviado).
+        """
+        self.anotar("terminada")
+
+    def recuperar(self):
+        """
+        Estado (mismo dict que leer_borrador) con todos los cambios aplicados.
+        """
+        with open(self.ruta_foto, "rb") as f:
+            estado = leer_borrador(f.read())
+
+        if os.path.exists(self.ruta_diario):
+            with open(self.ruta_diario, encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        cambio = json.loads(linea)
+                    except json.JSONDecodeError:
+                        # Línea cortada por una caída: es la última
+                        break
+                    _aplicar(estado, cambio)
+                    self.pendientes += 1
+
+        # Lotes agregados sin celdas editadas: columnas por defecto (como la página)
+        for lote in estado["lotes"]:
+            for col in (f"P_{lote}", f"F_{lote}"):
+                if col not in estado["tabla"].columns:
+                    estado["tabla"][col] = _por_defecto(col)
+
+        return estado
+
+    def descartar(self):
+        for ruta in (self.ruta_foto, self.ruta_diario):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+        self.pendientes = 0
@@ -0,0 +1,202 @@
+"""
+Envío de correos en segundo plano.
+
+Un solo hilo por proceso atiende una cola de mensajes y reutiliza la
+conexión SMTP autenticada entre envíos (se cierra tras un rato sin uso).
+Los fallos transitorios se reintentan con espera creciente; el estado de
+cada envío se consulta con estado(id).
+
+Para pruebas locales basta apuntar host/puerto a un servidor de
+depuración, p. ej.:
+    python -m aiosmtpd -n -l localhost:8025
+con starttls=False y usuario=None.
+"""
+import itertools
+import queue
+import smtplib
+import threading
+import time
+
+import pandas as pd
+
+from traza import etapa, trazado
+
+# Errores que no se arreglan reintentando
+ERRORES_PERMANENTES = (
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+)
+
+EN_COLA = "en cola"
+ENVIANDO = "enviando"
+REINTENTANDO = "reintentando"
+ENVIADO = "enviado"
+ERROR = "error"
+ESTADOS_FINALES = (ENVIADO, ERROR)
+MAX_ESTADOS = 500
+
+
+def como_bool(valor):
+    """
+    Opción de secrets/entorno: true/false de TOML o texto ("false", "0",
+    "no", "off" son False).
+    """
+    if isinstance(valor, str):
+        return valor.strip().lower() not in ("", "0", "false", "no", "off")
+    return bool(valor)
+
+
+class ColaCorreo:
+    def __init__(
+        self,
+        host,
+        puerto,
+        usuario=None,
+        clave=None,
+        starttls=True,
+        reintentos=3,
+        espera=2.0,
+        inactividad=60.0,
+        timeout=30.0,
+    ):
+        self.host = host
+        self.puerto = puerto
+        self.usuario = usuario
+        self.clave = clave
+        self.starttls = starttls
+        self.reintentos = reintentos
+        self.espera = espera
+        self.inactividad = inactividad
+        self.timeout = timeout
+
+        self._cola = queue.Queue()
+        self._estados = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._smtp = None
+
+        self._hilo = threading.Thread(target=self._trabajar, name="cola-correo", daemon=True)
+        self._hilo.start()
+
+    # =========================
+    # API
+    # =========================
+    def encolar(self, msg, al_enviar=None):
+        """
+        Agrega el mensaje a la cola y devuelve su id. al_enviar() se llama
+        (en el hilo de envío) solo si el envío termina bien.
+        """
+        id_envio = next(self._ids)
+        with self._lock:
+            # Solo se conservan los últimos MAX_ESTADOS envíos terminados
+            terminados = [i for i, e in self._estados.items() if e["estado"] in ESTADOS_FINALES]
+            for i in terminados[:-MAX_ESTADOS]:
+                del self._estados[i]
+
+            self._estados[id_envio] = {
+                "id": id_envio,
+                "destino": msg["To"],
+                "asunto": msg["Subject"],
+                "estado": EN_COLA,
+                "intentos": 0,
+                "error": None,
+                "actualizado": pd.Timestamp.now().isoformat(timespec="seconds"),
+            }
+        self._cola.put((id_envio, msg, al_enviar))
+        return id_envio
+
+    def estado(self, id_envio):
+        with self._lock:
+            estado = self._estados.get(id_envio)
+            return dict(estado) if estado else None
+
+    def pendientes(self):
+        return self._cola.unfinished_tasks
+
+    # =========================
+    # HILO DE ENVÍO
+    # =========================
+    def _actualizar(self, id_envio, **cambios):
+        with self._lock:
+            self._estados[id_envio].update(
+                cambios,
+                actualizado=pd.Timestamp.now().isoformat(timespec="seconds")
+            )
+
+    def _conexion(self):
+        # Reutiliza la sesión si sigue viva
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._cerrar()
+
+        smtp = smtplib.SMTP(self.host, self.puerto, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.usuario:
+                smtp.login(self.usuario, self.clave)
+        except BaseException:
+            smtp.close()
+            raise
+
+        self._smtp = smtp
+        return smtp
+
+    def _cerrar(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    def _enviar(self, id_envio, msg, al_enviar):
+        for intento in range(1, self.reintentos + 1):
+            self._actualizar(id_envio, estado=ENVIANDO, intentos=intento)
+            try:
+                with etapa("smtp", intento=intento):
+                    self._conexion().send_message(msg)
+            except ERRORES_PERMANENTES as e:
+                self._cerrar()
+                self._actualizar(id_envio, estado=ERROR, error=str(e))
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                self._cerrar()
+                if intento == self.reintentos:
+                    self._actualizar(id_envio, estado=ERROR, error=str(e))
+                    return
+                self._actualizar(id_envio, estado=REINTENTANDO, error=str(e))
+                time.sleep(self.espera * 2 ** (intento - 1))
+                continue
+
+            self._actualizar(id_envio, estado=ENVIADO, error=None)
+            if al_enviar is not None:
+                try:
+                    al_enviar()
+                except Exception:
+                    # El correo ya salió; un fallo posterior no lo cambia
+                    pass
+            return
+
+    def _trabajar(self):
+        while True:
+            try:
+                id_envio, msg, al_enviar = self._cola.get(timeout=self.inactividad)
+            except queue.Empty:
+                self._cerrar()
+                continue
+
+            try:
+                with trazado("cola_correo", id=id_envio):
+                    self._enviar(id_envio, msg, al_enviar)
+            except Exception as e:
+                self._cerrar()
+                self._actualizar(id_envio, estado=ERROR, error=str(e))
+            finally:
+                self._cola.task_done()
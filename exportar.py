@@ -0,0 +1,290 @@
+import hashlib
+import json
+import pandas as pd
+from io import BytesIO
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+from calculo import resumen_por_lote
+from productivos import tabla_produccion, tabla_hembras, tabla_machos
+from traza import etapa
+
+SHEET_NAME = "BONO_REPRODUCTORAS"
+
+# Hoja oculta con metadatos para reimportar sin buscar marcadores
+HOJA_META = "_META"
+META_VERSION = 1
+# Límite de caracteres por celda en Excel (32 767), con margen
+META_CHUNK = 30000
+META_PREFIJO = "|"
+
+
+# =========================
+# HUELLA DEL ESTADO A EXPORTAR
+# =========================
+def huella_estado(granja, tipo, lotes, config_lotes, datos_productivos, tabla):
+    """
+    Hash estable de todo lo que define el Excel final. Si no cambia,
+    el archivo generado anteriormente sigue siendo válido.
+    """
+    h = hashlib.sha256()
+
+    h.update(json.dumps(
+        [granja, tipo, list(lotes), config_lotes, datos_productivos],
+        sort_keys=True,
+        default=str
+    ).encode("utf-8"))
+
+    h.update(json.dumps([str(c) for c in tabla.columns]).encode("utf-8"))
+    h.update(
+        pd.util.hash_pandas_object(tabla.astype(str), index=False)
+        .to_numpy()
+        .tobytes()
+    )
+
+    return h.hexdigest()
+
+
+# =========================
+# BLOQUES DE LA HOJA (EN ORDEN)
+# =========================
+def bloques_excel(granja, tipo, lotes, config_lotes, datos_productivos, df_final):
+    """
+    Lista de (nombre, dataframe, con_indice, salto) en el orden de la hoja.
+    salto es lo que avanza la fila después del bloque, además de su
+    largo (igual que fila_actual += len(df) + salto).
+    """
+    bloques = []
+
+    # =========================
+    # 1️⃣ ENCABEZADO
+    # =========================
+    encabezado = pd.DataFrame({
+        "Campo": ["Granja", "Tipo de Proceso", "Lotes", "Fecha de Generación"],
+        "Valor": [
+            granja,
+            tipo,
+            ", ".join(lotes),
+            pd.Timestamp.now().strftime("%Y-%m-%d %H:%M")
+        ]
+    })
+    bloques.append(("encabezado", encabezado, False, 2))
+
+    # =========================
+    # 2️⃣ CONFIGURACIÓN DE LOTES
+    # =========================
+    df_lotes = pd.DataFrame([
+        {
+            "Lote": l,
+            "Genética": config_lotes[l]["GENETICA"],
+            "Monto S/": config_lotes[l]["MONTO"]
+        }
+        for l in lotes
+    ])
+    bloques.append(("lotes", df_lotes, False, 3))
+
+    # =========================
+    # 3️⃣ DATOS PRODUCTIVOS
+    # =========================
+    if tipo == "PRODUCCIÓN":
+        bloques.append(("produccion", tabla_produccion(datos_productivos, lotes), True, 3))
+    else:  # LEVANTE
+        bloques.append(("hembras", tabla_hembras(datos_productivos, lotes), True, 3))
+        bloques.append(("machos", tabla_machos(datos_productivos, lotes), True, 3))
+
+    # =========================
+    # 4️⃣ RESUMEN POR LOTE
+    # =========================
+    bloques.append(("resumen", resumen_por_lote(df_final), False, 2))
+
+    # =========================
+    # 5️⃣ RESULTADO FINAL POR TRABAJADOR
+    # =========================
+    bloques.append(("trabajadores", df_final, False, 0))
+
+    return bloques
+
+
+# =========================
+# METADATOS (HOJA OCULTA)
+# =========================
+def json_nativo(o):
+    # default= de json.dumps: escalares numpy → tipos de Python
+    return o.item() if hasattr(o, "item") else str(o)
+
+
+def metadatos_excel(granja, tipo, lotes, config_lotes, datos_productivos, bloques):
+    """
+    Estado completo + posición de cada bloque en la hoja principal.
+    fila es la fila (base 0) del encabezado del bloque.
+    """
+    secciones = {}
+    fila_actual = 0
+    for nombre, df, con_indice, salto in bloques:
+        secciones[nombre] = {"fila": fila_actual, "filas": len(df)}
+        fila_actual += len(df) + salto
+
+    df_final = bloques[-1][1]
+
+    return {
+        "version": META_VERSION,
+        "granja": granja,
+        "tipo": tipo,
+        "lotes": list(lotes),
+        "config_lotes": config_lotes,
+        "datos_productivos": datos_productivos,
+        "secciones": secciones,
+        "dtypes": {str(c): str(df_final[c].dtype) for c in df_final.columns},
+    }
+
+
+def _filas_meta(meta):
+    texto = json.dumps(meta, ensure_ascii=False, default=json_nativo)
+    # Prefijo fijo: un trozo que empiece con "=" no debe leerse como fórmula
+    return [
+        META_PREFIJO + texto[i:i + META_CHUNK]
+        for i in range(0, len(texto), META_CHUNK)
+    ]
+
+
+# =========================
+# MOTOR 1: PANDAS + OPENPYXL (EN MEMORIA)
+# =========================
+def _escribir_openpyxl(bloques, meta, output):
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        fila_actual = 0
+        for _, df, con_indice, salto in bloques:
+            df.to_excel(
+                writer,
+                sheet_name=SHEET_NAME,
+                index=con_indice,
+                startrow=fila_actual
+            )
+            fila_actual += len(df) + salto
+
+        pd.DataFrame(_filas_meta(meta)).to_excel(
+            writer,
+            sheet_name=HOJA_META,
+            index=False,
+            header=False
+        )
+        writer.sheets[HOJA_META].sheet_state = "hidden"
+
+
+# =========================
+# MOTOR 2: STREAMING (WRITE-ONLY, MEMORIA CONSTANTE)
+# =========================
+def _celda_titulo(ws, valor):
+    # Mismo estilo que pandas usa para encabezados e índice
+    celda = WriteOnlyCell(ws, value=valor)
+    celda.font = Font(bold=True)
+    celda.border = Border(
+        left=Side(style="thin"),
+        right=Side(style="thin"),
+        top=Side(style="thin"),
+        bottom=Side(style="thin")
+    )
+    celda.alignment = Alignment(horizontal="center", vertical="top")
+    return celda
+
+
+# Filas por trozo: solo un trozo del bloque se convierte a la vez
+FILAS_POR_TROZO = 5000
+
+
+def _trozos(df):
+    # Tipos nativos de Python y vacío en lugar de NaN, trozo por trozo
+    for inicio in range(0, len(df), FILAS_POR_TROZO):
+        trozo = df.iloc[inicio:inicio + FILAS_POR_TROZO].astype(object)
+        yield trozo.where(trozo.notna(), None)
+
+
+def _escribir_streaming(bloques, meta, output):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_NAME)
+
+    for _, df, con_indice, salto in bloques:
+        # Encabezado del bloque
+        titulos = [str(c) for c in df.columns]
+        if con_indice:
+            titulos = [None] + titulos
+        ws.append([_celda_titulo(ws, t) if t is not None else None for t in titulos])
+
+        # Filas
+        for trozo in _trozos(df):
+            if con_indice:
+                for indice, *fila in trozo.itertuples(name=None):
+                    ws.append([_celda_titulo(ws, indice), *fila])
+            else:
+                for fila in trozo.itertuples(index=False, name=None):
+                    ws.append(fila)
+
+        # Filas vacías entre bloques
+        for _ in range(salto - 1):
+            ws.append([])
+
+    ws_meta = wb.create_sheet(HOJA_META)
+    ws_meta.sheet_state = "hidden"
+    for texto in _filas_meta(meta):
+        ws_meta.append([texto])
+
+    wb.save(output)
+
+
+MOTORES_EXCEL = {
+    "openpyxl": _escribir_openpyxl,
+    "streaming": _escribir_streaming,
+}
+
+# A partir de este número de trabajadores, "auto" usa streaming
+UMBRAL_STREAMING = 5000
+
+
+# =========================
+# 📤 EXCEL COMPLETO
+# =========================
+def generar_excel(granja, tipo, lotes, config_lotes, datos_productivos, df_final, motor="auto"):
+    """
+    Construye el libro BONO_REPRODUCTORAS y devuelve sus bytes.
+
+    motor: "openpyxl" (en memoria), "streaming" (write-only) o "auto",
+    que elige streaming para tablas grandes. Ambos producen la misma
+    distribución de celdas y la misma hoja oculta de metadatos.
+    """
+    if motor == "auto":
+        motor = "streaming" if len(df_final) >= UMBRAL_STREAMING else "openpyxl"
+
+    bloques = bloques_excel(
+        granja, tipo, lotes, config_lotes, datos_productivos, df_final
+    )
+
+    meta = metadatos_excel(
+        granja, tipo, lotes, config_lotes, datos_productivos, bloques
+    )
+
+    with etapa("excel", motor=motor, filas=len(df_final)) as e:
+        output = BytesIO()
+        MOTORES_EXCEL[motor](bloques, meta, output)
+        e["bytes"] = output.getbuffer().nbytes
+    return output.getvalue()
+
+
+# =========================
+# MEMO: UN SOLO EXCEL POR ESTADO
+# =========================
+def excel_memorizado(memo, granja, tipo, lotes, config_lotes, datos_productivos, tabla, df_final):
+    """
+    memo: dict persistente (p. ej. en st.session_state) con la última
+    huella y sus bytes. Solo se serializa de nuevo si el estado cambió.
+    """
+    huella = huella_estado(granja, tipo, lotes, config_lotes, datos_productivos, tabla)
+
+    if memo.get("huella") != huella:
+        contenido = generar_excel(
+            granja, tipo, lotes, config_lotes, datos_productivos, df_final
+        )
+        memo["bytes"] = contenido
+        memo["huella"] = huella
+
+    return memo["bytes"]
@@ -0,0 +1,156 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# =========================
+# MODOS DEL GRÁFICO DE RESULTADOS
+# =========================
+TODOS = "Todos los trabajadores"
+TOP_N = "Top N + otros"
+POR_CARGO = "Total por cargo"
+POR_LOTE = "Total por lote"
+HISTOGRAMA = "Histograma de TOTAL S/"
+MODOS_GRAFICO = [TOP_N, POR_CARGO, POR_LOTE, HISTOGRAMA, TODOS]
+
+# Hasta aquí se dibuja una barra con etiqueta por trabajador (como siempre)
+UMBRAL_BARRAS = 100
+# Desde aquí "Todos" usa puntos WebGL (scattergl) en lugar de barras SVG
+UMBRAL_WEBGL = 1000
+BINS_HISTOGRAMA = 30
+
+
+def modo_por_defecto(n_trabajadores):
+    return TODOS if n_trabajadores <= UMBRAL_BARRAS else TOP_N
+
+
+def huella_resultado(df_final):
+    """
+    Hash de lo que dibujan los gráficos (nombres, cargos y pagos).
+    """
+    columnas = ["NOMBRE COMPLETO", "CARGO", "TOTAL S/"] + [
+        c for c in df_final.columns if c.startswith("PAGO_")
+    ]
+    h = hashlib.sha256("|".join(columnas).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df_final[columnas], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _barras(df, x, y, titulo, texto="S/ %{text:,.2f}"):
+    fig = px.bar(df, x=x, y=y, text=y, title=titulo)
+    fig.update_traces(texttemplate=texto, textposition="outside", cliponaxis=False)
+    fig.update_layout(height=550, margin=dict(t=100), yaxis=dict(rangemode="tozero"))
+    return fig
+
+
+# =========================
+# 📊 RESULTADO POR TRABAJADOR
+# =========================
+def figura_trabajadores(df_final, modo=TOP_N, top_n=30):
+    total = pd.to_numeric(df_final["TOTAL S/"], errors="coerce").fillna(0)
+
+    if modo == TODOS:
+        if len(df_final) < UMBRAL_WEBGL:
+            fig = _barras(df_final, "NOMBRE COMPLETO", "TOTAL S/", "Bono total por trabajador")
+            fig.update_layout(xaxis_tickangle=-45)
+            return fig
+
+        # Muchos puntos: WebGL, sin etiquetas de texto
+        orden = np.argsort(-total.to_numpy(), kind="stable")
+        fig = go.Figure(go.Scattergl(
+            x=np.arange(1, len(orden) + 1),
+            y=total.to_numpy()[orden],
+            mode="markers",
+            marker=dict(size=4),
+            text=df_final["NOMBRE COMPLETO"].to_numpy()[orden],
+            hovertemplate="%{text}<br>S/ %{y:,.2f}<extra></extra>",
+        ))
+        fig.update_layout(
+            title=f"Bono total por trabajador ({len(orden):,}, de mayor a menor)",
+            xaxis_title="Puesto",
+            yaxis_title="TOTAL S/",
+            height=550,
+        )
+        return fig
+
+    if modo == TOP_N:
+        mayores = total.nlargest(top_n)
+        datos = pd.DataFrame({
+            "NOMBRE COMPLETO": df_final.loc[mayores.index, "NOMBRE COMPLETO"].astype(str),
+            "TOTAL S/": mayores.to_numpy(),
+        })
+        resto = len(df_final) - len(mayores)
+        if resto > 0:
+            datos.loc[len(datos)] = [f"Otros ({resto:,})", total.drop(mayores.index).sum()]
+        fig = _barras(datos, "NOMBRE COMPLETO", "TOTAL S/", f"Top {top_n} trabajadores + otros")
+        fig.update_layout(xaxis_tickangle=-45)
+        return fig
+
+    if modo == POR_CARGO:
+        datos = (
+            pd.DataFrame({"CARGO": df_final["CARGO"].astype(str), "TOTAL S/": total})
+            .groupby("CARGO", as_index=False)
+            .agg(**{"TOTAL S/": ("TOTAL S/", "sum"), "Trabajadores": ("TOTAL S/", "size")})
+            .sort_values("TOTAL S/", ascending=False)
+        )
+        fig = _barras(datos, "CARGO", "TOTAL S/", "Bono total por cargo")
+        fig.update_traces(customdata=datos[["Trabajadores"]],
+                          hovertemplate="%{x}<br>S/ %{y:,.2f}<br>%{customdata[0]} trabajadores<extra></extra>")
+        return fig
+
+    if modo == POR_LOTE:
+        pagos = [c for c in df_final.columns if c.startswith("PAGO_")]
+        datos = pd.DataFrame({
+            "Lote": [c.replace("PAGO_", "") for c in pagos],
+            "TOTAL S/": df_final[pagos].sum().to_numpy(),
+        })
+        return _barras(datos, "Lote", "TOTAL S/", "Bono total por lote")
+
+    if modo == HISTOGRAMA:
+        # Se agrupa aquí: al navegador solo llegan BINS_HISTOGRAMA barras
+        conteo, bordes = np.histogram(total.to_numpy(), bins=BINS_HISTOGRAMA)
+        fig = go.Figure(go.Bar(
+            x=(bordes[:-1] + bordes[1:]) / 2,
+            y=conteo,
+            width=np.diff(bordes),
+            customdata=np.column_stack([bordes[:-1], bordes[1:]]),
+            hovertemplate="S/ %{customdata[0]:,.2f} – %{customdata[1]:,.2f}<br>%{y} trabajadores<extra></extra>",
+        ))
+        fig.update_layout(
+            title="Distribución de TOTAL S/",
+            xaxis_title="TOTAL S/",
+            yaxis_title="Trabajadores",
+            bargap=0.05,
+            height=450,
+        )
+        return fig
+
+    raise ValueError(f"Modo de gráfico desconocido: {modo}")
+
+
+# =========================
+# 📊 DISTRIBUCIÓN DE PAGO POR LOTE (PREVISUALIZACIÓN)
+# =========================
+def figura_resumen_lote(resumen_lote):
+    fig = px.bar(
+        resumen_lote,
+        x="Lote",
+        y="Total S/",
+        text="Total S/",
+        labels={"Total S/": "Total S/"},
+    )
+
+    fig.update_traces(
+        texttemplate="S/ %{text:.2f}",
+        textposition="outside"
+    )
+
+    fig.update_layout(
+        yaxis_title="Total S/",
+        xaxis_title="Lote",
+        uniformtext_minsize=8,
+        uniformtext_mode="hide",
+    )
+    return fig
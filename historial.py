@@ -0,0 +1,251 @@
+"""
+Histórico local de corridas finalizadas (SQLite).
+
+Cada descarga o envío registra la corrida una sola vez (por su huella):
+encabezado, config_lotes, datos_productivos y el pago por trabajador y lote.
+
+Solo se agrega, nunca se borra. Una corrida nueva de la misma granja,
+tipo, lotes y periodo del bono (el que elige el usuario, no la fecha de
+la corrida) marca a las anteriores con reemplazada_por: los totales y
+pagos por DNI cuentan solo las vigentes, así una corrección no suma dos
+veces el mismo bono. Sin periodo no se reemplaza nada.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import pandas as pd
+
+RUTA_HISTORIAL = os.environ.get("BONO_HISTORIAL_DB", "historial_bonos.sqlite")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS corridas (
+    id                INTEGER PRIMARY KEY,
+    huella            TEXT NOT NULL UNIQUE,
+    fecha             TEXT NOT NULL,
+    granja            TEXT,
+    tipo              TEXT,
+    lotes             TEXT,
+    config_lotes      TEXT,
+    datos_productivos TEXT,
+    trabajadores      INTEGER,
+    total             REAL,
+    periodo           TEXT,
+    reemplazada_por   INTEGER REFERENCES corridas (id)
+);
+CREATE INDEX IF NOT EXISTS ix_corridas_granja ON corridas (granja, fecha);
+CREATE INDEX IF NOT EXISTS ix_corridas_tipo   ON corridas (tipo, fecha);
+CREATE INDEX IF NOT EXISTS ix_corridas_fecha  ON corridas (fecha);
+
+CREATE TABLE IF NOT EXISTS pagos (
+    corrida_id    INTEGER NOT NULL REFERENCES corridas (id),
+    dni           TEXT NOT NULL,
+    nombre        TEXT,
+    cargo         TEXT,
+    lote          TEXT NOT NULL,
+    participacion REAL,
+    faltas        REAL,
+    pago          REAL
+);
+CREATE INDEX IF NOT EXISTS ix_pagos_dni  ON pagos (dni, corrida_id);
+CREATE INDEX IF NOT EXISTS ix_pagos_lote ON pagos (lote, corrida_id);
+"""
+
+
+_preparadas = set()
+_candado = threading.Lock()
+
+
+def _migrar(con):
+    """
+    Históricos anteriores: se agregan las columnas nuevas; sus corridas
+    quedan sin periodo (vigentes).
+    """
+    columnas = [fila[1] for fila in con.execute("PRAGMA table_info(corridas)")]
+    if "periodo" not in columnas:
+        con.execute("ALTER TABLE corridas ADD COLUMN periodo TEXT")
+    if "reemplazada_por" not in columnas:
+        con.execute("ALTER TABLE corridas ADD COLUMN reemplazada_por INTEGER REFERENCES corridas (id)")
+    # Varias corridas por periodo son válidas: solo se marcan
+    con.execute("DROP INDEX IF EXISTS ux_corridas_periodo")
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS ix_corridas_periodo "
+        "ON corridas (granja, tipo, lotes, periodo)"
+    )
+
+
+def conectar(ruta=RUTA_HISTORIAL):
+    """
+    Conexión nueva; el esquema se crea (y migra) una vez por archivo y
+    proceso. Usar con contextlib.closing: el with de sqlite3 solo
+    confirma la transacción, no cierra.
+    """
+    con = sqlite3.connect(ruta, timeout=10)
+    if ruta not in _preparadas:
+        with _candado:
+            if ruta not in _preparadas:
+                # WAL queda guardado en el archivo
+                con.execute("PRAGMA journal_mode=WAL")
+                con.executescript(ESQUEMA)
+                with con:
+                    _migrar(con)
+                _preparadas.add(ruta)
+    return con
+
+
+def _pagos_largos(df_final, lotes):
+    """
+    Una fila por trabajador y lote: (dni, nombre, cargo, lote, P, F, pago).
+    """
+    partes = []
+    for lote in lotes:
+        partes.append(pd.DataFrame({
+            "dni": df_final["DNI"].astype(str),
+            "nombre": df_final["NOMBRE COMPLETO"],
+            "cargo": df_final["CARGO"],
+            "lote": str(lote),
+            "participacion": pd.to_numeric(df_final[f"P_{lote}"], errors="coerce"),
+            "faltas": pd.to_numeric(df_final[f"F_{lote}"], errors="coerce"),
+            "pago": df_final[f"PAGO_{lote}"],
+        }))
+
+    if not partes:
+        return pd.DataFrame()
+    return pd.concat(partes, ignore_index=True)
+
+
+def registrar_corrida(huella, granja, tipo, lotes, config_lotes, datos_productivos, df_final,
+                      periodo=None, ruta=RUTA_HISTORIAL):
+    """
+    Agrega la corrida si su huella no existe. Con periodo ("AAAA-MM"),
+    las corridas vigentes de la misma granja, tipo, lotes y periodo
+    quedan reemplazadas por esta. Devuelve True si se agregó.
+    """
+    largos = _pagos_largos(df_final, lotes)
+    largos = largos.astype(object).where(largos.notna(), None)
+
+    lotes_texto = ", ".join(lotes)
+
+    with closing(conectar(ruta)) as con, con:
+        cur = con.execute(
+            """
+            INSERT OR IGNORE INTO corridas
+                (huella, fecha, granja, tipo, lotes, config_lotes,
+                 datos_productivos, trabajadores, total, periodo)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                huella,
+                pd.Timestamp.now().isoformat(timespec="seconds"),
+                granja,
+                tipo,
+                lotes_texto,
+                json.dumps(config_lotes, ensure_ascii=False, default=str),
+                json.dumps(datos_productivos, ensure_ascii=False, default=str),
+                len(df_final),
+                float(df_final["TOTAL S/"].sum()),
+                periodo,
+            )
+        )
+        if cur.rowcount == 0:
+            return False
+
+        if periodo:
+            con.execute(
+                """
+                UPDATE corridas SET reemplazada_por = ?
+                WHERE granja IS ? AND tipo IS ? AND lotes IS ? AND periodo = ?
+                  AND id != ? AND reemplazada_por IS NULL
+                """,
+                (cur.lastrowid, granja, tipo, lotes_texto, periodo, cur.lastrowid)
+            )
+
+        con.executemany(
+            """
+            INSERT INTO pagos
+                (corrida_id, dni, nombre, cargo, lote, participacion, faltas, pago)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                (cur.lastrowid, *fila)
+                for fila in largos[
+                    ["dni", "nombre", "cargo", "lote", "participacion", "faltas", "pago"]
+                ].itertuples(index=False, name=None)
+            )
+        )
+
+    return True
+
+
+# =========================
+# CONSULTAS
+# =========================
+def total_por_dni(dni, anio=None, ruta=RUTA_HISTORIAL):
+    # Solo corridas vigentes: una corrección no cuenta dos veces
+    consulta = """
+        SELECT COALESCE(SUM(p.pago), 0)
+        FROM pagos p JOIN corridas c ON c.id = p.corrida_id
+        WHERE p.dni = ? AND c.reemplazada_por IS NULL
+    """
+    parametros = [dni]
+    if anio is not None:
+        # Por el periodo del bono; las corridas sin periodo, por su fecha
+        consulta += " AND COALESCE(c.periodo || '-01', c.fecha) >= ? AND COALESCE(c.periodo || '-01', c.fecha) < ?"
+        parametros += [f"{anio}-01-01", f"{int(anio) + 1}-01-01"]
+
+    with closing(conectar(ruta)) as con:
+        return con.execute(consulta, parametros).fetchone()[0]
+
+
+def pagos_por_dni(dni, ruta=RUTA_HISTORIAL):
+    with closing(conectar(ruta)) as con:
+        return pd.read_sql_query(
+            """
+            SELECT c.fecha, c.periodo, c.granja, c.tipo, p.lote, p.cargo,
+                   p.participacion, p.faltas, p.pago
+            FROM pagos p JOIN corridas c ON c.id = p.corrida_id
+            WHERE p.dni = ? AND c.reemplazada_por IS NULL
+            ORDER BY c.fecha
+            """,
+            con,
+            params=[dni]
+        )
+
+
+def listar_corridas(granja=None, tipo=None, lote=None, desde=None, hasta=None, ruta=RUTA_HISTORIAL):
+    """
+    Corridas filtradas por granja, tipo, lote y rango de fechas (ISO).
+    Incluye las reemplazadas (reemplazada_por = id de la que la corrige).
+    """
+    condiciones, parametros = [], []
+    if granja:
+        condiciones.append("granja = ?")
+        parametros.append(granja)
+    if tipo:
+        condiciones.append("tipo = ?")
+        parametros.append(tipo)
+    if lote:
+        condiciones.append("id IN (SELECT corrida_id FROM pagos WHERE lote = ?)")
+        parametros.append(str(lote))
+    if desde:
+        condiciones.append("fecha >= ?")
+        parametros.append(desde)
+    if hasta:
+        condiciones.append("fecha < ?")
+        parametros.append(hasta)
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+    with closing(conectar(ruta)) as con:
+        return pd.read_sql_query(
+            f"""
+            SELECT id, fecha, periodo, granja, tipo, lotes, trabajadores, total,
+                   reemplazada_por
+            FROM corridas {where}
+            ORDER BY fecha DESC
+            """,
+            con,
+            params=parametros
+        )
@@ -0,0 +1,199 @@
+"""
+Base de trabajadores compartida por todo el servidor (opcional).
+
+RR.HH. publica el Excel de la base en una ruta fija (RUTA_BASE_PUBLICADA).
+La primera sesión que la necesita la lee, normaliza el DNI con
+limpiar_dni, quita duplicados y guarda una foto columnar en DIR_MAESTRO:
+
+    <version>/dni.npy     DNI ordenado, texto de ancho fijo (índice)
+    <version>/nombre.npy  NOMBRE COMPLETO, texto de ancho fijo
+    <version>/cargo.npy   códigos int16 de CARGO (-1 = vacío)
+    <version>/cargos.json categorías de CARGO
+
+Las columnas se abren con np.load(mmap_mode="r"): los procesos del
+servidor comparten las mismas páginas del archivo y las sesiones solo
+guardan una referencia al MaestroTrabajadores, no su propia copia.
+Un Excel publicado más nuevo (otro mtime o tamaño) es otra versión.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from carga import leer_excel_str, limpiar_dni
+from traza import etapa
+
+RUTA_BASE_PUBLICADA = os.environ.get("BONO_BASE_TRABAJADORES", "")
+DIR_MAESTRO = os.environ.get("BONO_MAESTRO_DIR", "maestro_trabajadores")
+
+
+class MaestroTrabajadores:
+    """
+    Foto de solo lectura de la base. get(dni) responde como el dict de
+    carga.indice_dni, así que puede usarse en su lugar.
+    """
+
+    def __init__(self, directorio, version):
+        self.directorio = directorio
+        self.version = version
+
+        self._dni = np.load(os.path.join(directorio, "dni.npy"), mmap_mode="r")
+        self._nombre = np.load(os.path.join(directorio, "nombre.npy"), mmap_mode="r")
+        self._cargo = np.load(os.path.join(directorio, "cargo.npy"), mmap_mode="r")
+        with open(os.path.join(directorio, "cargos.json"), encoding="utf-8") as f:
+            self._cargos = json.load(f)
+
+    def __len__(self):
+        return len(self._dni)
+
+    def posiciones(self, dnis):
+        """
+        Posición de cada DNI en la foto (-1 si no está). Búsqueda binaria
+        sobre la columna ordenada.
+        """
+        dnis = np.asarray(dnis, dtype=str)
+        if not len(self._dni):
+            return np.full(len(dnis), -1)
+
+        pos = np.searchsorted(self._dni, dnis)
+        pos = np.minimum(pos, len(self._dni) - 1)
+        return np.where(self._dni[pos] == dnis, pos, -1)
+
+    def get(self, dni, default=None):
+        pos = self.posiciones([dni])[0]
+        if pos < 0:
+            return default
+        return {
+            "NOMBRE COMPLETO": str(self._nombre[pos]) or np.nan,
+            "CARGO": self._categoria(self._cargo[pos]),
+        }
+
+    def _categoria(self, codigo):
+        return self._cargos[codigo] if codigo >= 0 else np.nan
+
+    def columnas(self, dnis):
+        """
+        NOMBRE COMPLETO y CARGO para cada DNI (vacío si no está), en el
+        mismo orden: equivale a un merge how="left" con la base.
+        """
+        pos = self.posiciones(dnis)
+        encontrado = pos >= 0
+        pos = np.where(encontrado, pos, 0)
+
+        nombre = pd.Series(np.asarray(self._nombre[pos], dtype=object))
+        nombre[~encontrado | (nombre == "")] = np.nan
+
+        codigos = np.where(encontrado, self._cargo[pos], -1)
+        cargo = pd.Series(pd.Categorical.from_codes(codigos, self._cargos)).astype(object)
+
+        return nombre, cargo
+
+
+# =========================
+# VERSIÓN PUBLICADA Y FOTO
+# =========================
+def version_publicada(ruta=RUTA_BASE_PUBLICADA):
+    """
+    Identificador de la base publicada (mtime + tamaño), o None si no hay.
+    """
+    if not ruta:
+        return None
+    try:
+        info = os.stat(ruta)
+    except OSError:
+        return None
+    return f"{info.st_mtime_ns}-{info.st_size}"
+
+
+def guardar_foto(df_base, directorio):
+    """
+    Escribe la foto columnar de df_base (DNI ya normalizado y único).
+    Se escribe en una carpeta temporal y se renombra al final, así otro
+    proceso nunca ve una foto a medias.
+    """
+    base = df_base.sort_values("DNI", kind="stable")
+    cargo = pd.Categorical(base["CARGO"])
+
+    temporal = f"{directorio}.tmp{os.getpid()}"
+    os.makedirs(temporal, exist_ok=True)
+    np.save(os.path.join(temporal, "dni.npy"), base["DNI"].to_numpy(dtype=str))
+    np.save(
+        os.path.join(temporal, "nombre.npy"),
+        base["NOMBRE COMPLETO"].fillna("").to_numpy(dtype=str)
+    )
+    np.save(os.path.join(temporal, "cargo.npy"), cargo.codes.astype(np.int16))
+    with open(os.path.join(temporal, "cargos.json"), "w", encoding="utf-8") as f:
+        json.dump([str(c) for c in cargo.categories], f, ensure_ascii=False)
+
+    try:
+        os.rename(temporal, directorio)
+    except OSError:
+        # Otro proceso la escribió primero: vale la suya
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+def _limpiar_versiones(directorio, vigente):
+    for nombre in os.listdir(directorio):
+        # Las carpetas .tmp son fotos que otro proceso está escribiendo
+        if nombre != vigente and ".tmp" not in nombre:
+            # En Windows falla si otro proceso aún la tiene abierta
+            shutil.rmtree(os.path.join(directorio, nombre), ignore_errors=True)
+
+
+def cargar_maestro(ruta=RUTA_BASE_PUBLICADA, directorio=DIR_MAESTRO):
+    """
+    MaestroTrabajadores de la versión publicada en ruta, o None si no hay
+    base publicada. Solo la primera llamada por versión lee el Excel.
+    """
+    version = version_publicada(ruta)
+    if version is None:
+        return None
+
+    carpeta = os.path.join(directorio, version)
+    if not os.path.isdir(carpeta):
+        with etapa("maestro_foto", version=version) as e:
+            with open(ruta, "rb") as f:
+                df_base = leer_excel_str(f.read())
+            df_base["DNI"] = limpiar_dni(df_base["DNI"])
+            df_base = df_base.drop_duplicates("DNI")
+            e["filas"] = len(df_base)
+
+            os.makedirs(directorio, exist_ok=True)
+            guardar_foto(df_base, carpeta)
+            _limpiar_versiones(directorio, version)
+
+    return MaestroTrabajadores(carpeta, version)
+
+
+def publicar_base(contenido, ruta=RUTA_BASE_PUBLICADA):
+    """
+    Reemplaza la base publicada por contenido (bytes xlsx).
+    """
+    temporal = f"{ruta}.tmp{os.getpid()}"
+    with open(temporal, "wb") as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+
+# =========================
+# CRUCE DNIs × MAESTRO
+# =========================
+def cruzar_con_maestro(contenido_dni, maestro):
+    """
+    Igual que carga.cruzar_trabajadores, pero contra la foto compartida
+    (no se lee ni se guarda la base en la sesión).
+    """
+    with etapa("read_excel", bytes=len(contenido_dni)) as e:
+        df = leer_excel_str(contenido_dni)
+        e["filas"] = len(df)
+
+    with etapa("limpiar_dni_y_cruce", maestro=maestro.version) as e:
+        df["DNI"] = limpiar_dni(df["DNI"])
+        nombre, cargo = maestro.columnas(df["DNI"])
+        df["NOMBRE COMPLETO"] = nombre.to_numpy()
+        df["CARGO"] = cargo.to_numpy()
+        e["filas"] = len(df)
+
+    return df
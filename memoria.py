@@ -0,0 +1,128 @@
+"""
+Representación compacta de la tabla de trabajadores en session_state.
+
+La participación por lote se guarda en formato largo (participacion.py);
+estos tipos son los de la tabla de trabajadores y de la vista ancha que
+ven el editor y la exportación:
+    DNI       texto Arrow: un solo búfer de 8 bytes por DNI normalizado
+              (más su desplazamiento), sin un objeto de Python por fila
+    CARGO     categórica (CARGOS_VALIDOS + los que traiga el archivo)
+    P_{lote}  float32
+    F_{lote}  Int8 (entero con vacío); float32 si trae decimales
+NOMBRE COMPLETO queda como texto: es único por trabajador, así que una
+categoría no ahorra nada.
+
+Con copy-on-write (siempre activo desde pandas 3; app.py lo activa en
+pandas 2) el editor y el cálculo pueden recibir la misma tabla sin
+.copy(): una modificación crea su propia copia solo de la columna que
+cambia.
+"""
+import numpy as np
+import pandas as pd
+
+from calculo import CARGOS_VALIDOS
+from participacion import faltas_numericas
+
+_INT8 = (-128, 127)
+# Mismo dtype que "str" de pandas 3 con pyarrow
+_TEXTO_ARROW = pd.StringDtype("pyarrow", na_value=np.nan)
+
+
+def _dnis(serie):
+    if serie.dtype == _TEXTO_ARROW:
+        return serie
+    return serie.astype(_TEXTO_ARROW)
+
+
+def _cargos(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+
+    presentes = pd.unique(serie.dropna().astype(str))
+    categorias = list(CARGOS_VALIDOS) + sorted(set(presentes) - set(CARGOS_VALIDOS))
+    return pd.Categorical(serie, categories=categorias)
+
+
+def _porcentajes(serie):
+    if serie.dtype == "float32":
+        return serie
+    return pd.to_numeric(serie, errors="coerce").astype("float32")
+
+
+def _faltas(serie):
+    if serie.dtype == "Int8":
+        return serie
+
+    # Texto con la regla de factor_faltas ("1.0" → vacío, no 1)
+    valores = pd.to_numeric(faltas_numericas(serie), errors="coerce")
+    presentes = valores.dropna()
+    if ((presentes % 1 == 0) & presentes.between(*_INT8)).all():
+        return valores.astype("Int8")
+    return valores.astype("float32")
+
+
+def compactar_tabla(tabla, lotes):
+    """
+    Devuelve tabla con los tipos compactos. Las columnas que ya lo son
+    no se tocan (con copy-on-write no se copian).
+    """
+    cambios = {}
+    if "DNI" in tabla.columns:
+        cambios["DNI"] = _dnis(tabla["DNI"])
+    if "CARGO" in tabla.columns:
+        cambios["CARGO"] = _cargos(tabla["CARGO"])
+    for lote in lotes:
+        if f"P_{lote}" in tabla.columns:
+            cambios[f"P_{lote}"] = _porcentajes(tabla[f"P_{lote}"])
+        if f"F_{lote}" in tabla.columns:
+            cambios[f"F_{lote}"] = _faltas(tabla[f"F_{lote}"])
+
+    return tabla.assign(**cambios)
+
+
+# =========================
+# 🧠 REPORTE DE MEMORIA
+# =========================
+def _mb(n_bytes):
+    return round(n_bytes / 1024 ** 2, 2)
+
+
+def reporte_memoria(objetos):
+    """
+    objetos: {nombre: DataFrame}. Por cada uno, memoria actual y la que
+    ocuparía con todas las columnas como object (como antes de compactar).
+    Un mismo DataFrame con dos nombres se cuenta una vez.
+    """
+    filas = []
+    vistos = {}
+
+    for nombre, df in objetos.items():
+        if df is None:
+            continue
+
+        if id(df) in vistos:
+            # Antes era una copia aparte; ahora no ocupa nada extra
+            original, sin_compactar = vistos[id(df)]
+            filas.append({
+                "Objeto": nombre,
+                "Filas": len(df),
+                "MB": 0.0,
+                "MB sin compactar": _mb(sin_compactar),
+                "Nota": f"misma tabla que {original}",
+            })
+            continue
+
+        actual = df.memory_usage(deep=True).sum()
+        sin_compactar = df.astype(object).memory_usage(deep=True).sum()
+        vistos[id(df)] = (nombre, sin_compactar)
+        filas.append({
+            "Objeto": nombre,
+            "Filas": len(df),
+            "MB": _mb(actual),
+            "MB sin compactar": _mb(sin_compactar),
+            "Nota": "",
+        })
+
+    reporte = pd.DataFrame(filas, columns=["Objeto", "Filas", "MB", "MB sin compactar", "Nota"])
+    reporte["Ahorro MB"] = (reporte["MB sin compactar"] - reporte["MB"]).round(2)
+    return reporte
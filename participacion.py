@@ -0,0 +1,134 @@
+"""
+Participación y faltas por trabajador y lote en formato largo.
+
+La sesión guarda dos tablas en lugar de una ancha:
+    trabajadores   DNI, NOMBRE COMPLETO, CARGO: una fila por trabajador.
+                   Su etiqueta de fila es la que usa el diario de cambios.
+    participacion  fila (etiqueta en trabajadores), LOTE, P, F: solo las
+                   celdas que no son 0 (o están vacías)
+
+Un galponero trabaja uno o dos lotes: con 40+ lotes la tabla ancha
+(P_{lote}, F_{lote}) es casi toda ceros. El cálculo y los totales usan la
+larga; a_ancho arma las columnas P_/F_ solo para el editor y la
+exportación.
+"""
+import numpy as np
+import pandas as pd
+
+COLUMNAS_BASE = ["DNI", "NOMBRE COMPLETO", "CARGO"]
+
+
+def largo_vacio(lotes=()):
+    return pd.DataFrame({
+        "fila": np.array([], dtype=np.int32),
+        "LOTE": pd.Categorical([], categories=list(lotes)),
+        "P": np.array([], dtype=np.float32),
+        "F": np.array([], dtype=np.float32),
+    })
+
+
+def _numeros(serie):
+    # float32 con vacío como NaN (Int8 con <NA> incluido)
+    return pd.to_numeric(serie, errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+
+
+def _falta(v):
+    # Misma regla que calculo.factor_faltas: un texto vale lo que lee int()
+    if isinstance(v, str):
+        try:
+            return float(int(v))
+        except ValueError:
+            return np.nan
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def faltas_numericas(serie):
+    """
+    F como número sin cambiar el factor que pagaba el cálculo fila a fila
+    (int(f)): "2" o " 2 " valen 2; un texto que int() no lee ("1.0",
+    "1,5", "x") queda vacío y paga el factor por defecto. Los números no
+    se tocan (1.5 sigue siendo 1.5 y int() lo lleva a 1).
+    """
+    if serie.dtype.kind in "iufb":
+        return serie
+
+    codigos, unicos = pd.factorize(serie.to_numpy(dtype=object))
+    tabla = np.array([_falta(u) for u in unicos] + [np.nan], dtype=float)
+    # código -1 (vacío) → última posición
+    return pd.Series(tabla[codigos], index=serie.index)
+
+
+# =========================
+# ANCHO ↔ LARGO
+# =========================
+def a_largo(tabla, lotes):
+    """
+    Tabla ancha (P_{lote}, F_{lote}) → (trabajadores, participacion).
+    LOTE es categórica sobre lotes. Columnas de lote que falten cuentan
+    como 0.
+    """
+    lotes = list(lotes)
+    trabajadores = tabla[COLUMNAS_BASE]
+    ceros = np.zeros(len(tabla), dtype=np.float32)
+
+    partes = []
+    for k, lote in enumerate(lotes):
+        p = _numeros(tabla[f"P_{lote}"]) if f"P_{lote}" in tabla.columns else ceros
+        f = _numeros(faltas_numericas(tabla[f"F_{lote}"])) if f"F_{lote}" in tabla.columns else ceros
+        # NaN != 0: las celdas vacías también se guardan
+        usadas = (p != 0) | (f != 0)
+        if usadas.any():
+            partes.append(pd.DataFrame({
+                "fila": tabla.index.to_numpy(dtype=np.int32)[usadas],
+                "LOTE": pd.Categorical.from_codes(np.full(usadas.sum(), k), categories=lotes),
+                "P": p[usadas],
+                "F": f[usadas],
+            }))
+
+    if not partes:
+        return trabajadores, largo_vacio(lotes)
+    return trabajadores, pd.concat(partes, ignore_index=True)
+
+
+def a_ancho(trabajadores, participacion, lotes):
+    """
+    Vista ancha: trabajadores + P_{lote} y F_{lote} (float32, 0 donde
+    participacion no tiene fila), en el orden de lotes. memoria.compactar_tabla
+    deja F_ como Int8.
+    """
+    lotes = list(lotes)
+    posiciones = trabajadores.index.get_indexer(participacion["fila"])
+    j = pd.Index(lotes, dtype=object).get_indexer(participacion["LOTE"])
+    validas = (posiciones >= 0) & (j >= 0)
+
+    p = np.zeros((len(lotes), len(trabajadores)), dtype=np.float32)
+    f = np.zeros((len(lotes), len(trabajadores)), dtype=np.float32)
+    p[j[validas], posiciones[validas]] = participacion["P"].to_numpy(dtype=np.float32)[validas]
+    f[j[validas], posiciones[validas]] = participacion["F"].to_numpy(dtype=np.float32)[validas]
+
+    columnas = {f"P_{lote}": p[k] for k, lote in enumerate(lotes)}
+    columnas.update({f"F_{lote}": f[k] for k, lote in enumerate(lotes)})
+    return trabajadores[COLUMNAS_BASE].assign(**columnas)
+
+
+# =========================
+# ALTAS, BAJAS Y LOTES
+# =========================
+def reubicar_filas(participacion, indice_previo):
+    """
+    Después de un concat con ignore_index sobre trabajadores, la fila que
+    estaba en la posición i pasa a tener la etiqueta i.
+    """
+    return participacion.assign(fila=indice_previo.get_indexer(participacion["fila"]).astype(np.int32))
+
+
+def filtrar(participacion, trabajadores, lotes):
+    """
+    Solo filas de trabajadores que siguen en la tabla y lotes de la página.
+    Devuelve la misma tabla si no hay nada que quitar.
+    """
+    quedan = participacion["fila"].isin(trabajadores.index) & participacion["LOTE"].isin(list(lotes))
+    return participacion if quedan.all() else participacion[quedan]
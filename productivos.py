@@ -0,0 +1,87 @@
+import pandas as pd
+
+# =========================
+# CAMPOS PRODUCTIVOS (ETIQUETA → CLAVE)
+# =========================
+CAMPOS_PROD = {
+    "Edad (sem)": "EDAD_AVE",
+    "Huevos sem 41": "HUEVOS_SEM_41",
+    "Población inicial": "POBLACION_INICIAL",
+    "Huevos / AA": "HUEVOS_POR_AA",
+    "Huevos STD 41": "HUEVOS_STD_41",
+    "% Cumplimiento": "PCT_CUMPLIMIENTO",
+    "% Huevos bomba": "PCT_HUEVOS_BOMBA",
+}
+
+CAMPOS_H = {
+    "Edad": "EDAD",
+    "Uniformidad (%)": "UNIFORMIDAD",
+    "Aves entregadas": "AVES_ENTREGADAS",
+    "Población inicial": "POBLACION_INICIAL",
+    "% Cumpl. aves": "PCT_CUMP_AVES",
+    "Peso": "PESO",
+    "Peso STD": "PESO_STD",
+    "% Cumpl. peso": "PCT_CUMP_PESO",
+}
+
+CAMPOS_M = {
+    "Edad": "EDAD",
+    "Uniformidad (%)": "UNIFORMIDAD",
+    "Aves entregadas": "AVES_ENTREGADAS",
+    "Población inicial": "POBLACION_INICIAL",
+    "Peso": "PESO",
+    "Peso STD": "PESO_STD",
+    "% Cumpl. peso": "PCT_CUMP_PESO",
+}
+
+PESO_STD_HEMBRAS = 2.53
+PESO_STD_MACHOS = 2.955
+
+
+# =========================
+# TABLAS INVERTIDAS (FILAS = CAMPOS, COLUMNAS = LOTES)
+# =========================
+def tabla_produccion(datos_productivos, lotes):
+    data_prod = {
+        campo: [
+            datos_productivos
+            .get(lote, {})
+            .get(key, 0)
+            for lote in lotes
+        ]
+        for campo, key in CAMPOS_PROD.items()
+    }
+    return pd.DataFrame(data_prod, index=lotes).T
+
+
+def tabla_hembras(datos_productivos, lotes):
+    data_h = {
+        campo: [
+            datos_productivos
+            .get(lote, {})
+            .get("HEMBRAS", {})
+            .get(key, PESO_STD_HEMBRAS if key == "PESO_STD" else 0)
+            for lote in lotes
+        ]
+        for campo, key in CAMPOS_H.items()
+    }
+    df_h = pd.DataFrame(data_h, index=lotes).T
+    df_h.loc["Peso STD"] = df_h.loc["Peso STD"].astype(float).round(2)
+    return df_h
+
+
+def tabla_machos(datos_productivos, lotes):
+    data_m = {
+        campo: [
+            datos_productivos
+            .get(lote, {})
+            .get("MACHOS", {})
+            .get(key, PESO_STD_MACHOS if key == "PESO_STD" else 0)
+            for lote in lotes
+        ]
+        for campo, key in CAMPOS_M.items()
+    }
+    df_m = pd.DataFrame(data_m, index=lotes).T
+    # 🔒 PESO STD MACHOS → SIEMPRE 3 DECIMALES
+    df_m.loc["Peso STD"] = df_m.loc["Peso STD"].astype(float).round(3)
+    return df_m
@@ -0,0 +1,83 @@
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+import asistencia
+from asistencia import derivar_participacion
+
+ASISTENCIA = """DNI;FECHA;ESTADO
+1;01/03/2026;F
+1;01/03/2026;A
+1;02/03/2026;FI
+1;03/03/2026;Descanso médico
+2;01/03/2026;asistió
+2;02/03/2026;falta
+2;03/03/2026;zz
+3;01/03/2026;A
+;01/03/2026;A
+"""
+
+ASIGNACION = """DNI,FECHA,LOTE
+1,01/03/2026,211
+1,02/03/2026,211
+1,03/03/2026,211
+1,04/03/2026,211
+2,01/03/2026,211
+2,01/03/2026,212.0
+2,02/03/2026,212
+"""
+
+
+def _por_lote(largo):
+    return largo.set_index(["DNI", "LOTE"]).sort_index()
+
+
+def test_p_y_f_por_trabajador_y_lote():
+    largo, resumen = derivar_participacion(ASISTENCIA.encode("latin-1"), ASIGNACION.encode())
+    tabla = _por_lote(largo)
+
+    # 4 días en el periodo; asistir gana a la falta del mismo día
+    assert tabla.loc[("00000001", "211")].tolist() == [25.0, 2.0]
+    # Día en dos lotes: medio día en cada uno
+    assert tabla.loc[("00000002", "211")].tolist() == [12.5, 0.0]
+    assert tabla.loc[("00000002", "212")].tolist() == [12.5, 1.0]
+    assert len(tabla) == 3
+
+    assert resumen["filas"] == 16
+    assert resumen["filas_descartadas"] == 1
+    assert resumen["trabajadores"] == 2
+    assert resumen["dias_periodo"] == 4
+    assert resumen["dias_sin_marcacion"] == 1
+    assert resumen["dias_sin_lote"] == 1
+    assert resumen["estados_desconocidos"] == ["ZZ"]
+
+
+def test_todos_los_lotes_y_dias_del_periodo():
+    largo, _ = derivar_participacion(ASISTENCIA.encode(), ASIGNACION.encode(), lotes=["211", "212", "213"], dias_periodo=10)
+    tabla = _por_lote(largo)
+
+    assert len(tabla) == 6
+    assert tabla.loc[("00000001", "211"), "P"] == 10.0
+    assert tabla.loc[("00000001", "213")].tolist() == [0.0, 0.0]
+
+
+def test_xlsx_y_reducciones_intermedias_dan_lo_mismo(monkeypatch):
+    esperado, _ = derivar_participacion(ASISTENCIA.encode(), ASIGNACION.encode())
+
+    def xlsx(texto, sep):
+        salida = BytesIO()
+        pd.read_csv(BytesIO(texto.encode()), sep=sep, dtype=str).to_excel(salida, index=False)
+        return salida.getvalue()
+
+    monkeypatch.setattr(asistencia, "LIMITE_PENDIENTES", 1)
+    largo, _ = derivar_participacion(xlsx(ASISTENCIA, ";"), xlsx(ASIGNACION, ","))
+
+    pd.testing.assert_frame_equal(_por_lote(largo), _por_lote(esperado))
+
+
+def test_sin_columnas_o_sin_lote():
+    with pytest.raises(ValueError):
+        derivar_participacion(b"DNI,ESTADO\n1,A\n")
+    with pytest.raises(ValueError):
+        derivar_participacion(ASISTENCIA.encode())
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from borrador import guardar_borrador, leer_borrador
+from memoria import compactar_tabla
+
+LOTES = ["211", "212"]
+
+
+def _tabla():
+    tabla = pd.DataFrame({
+        "DNI": ["00000001", "00000002", "00000003", "00000004"],
+        "NOMBRE COMPLETO": ["ÁLVAREZ", "BRAVO", None, "DÍAZ"],
+        "CARGO": ["GALPONERO", "CAPORAL", "CARGO NUEVO", None],
+        "P_211": [100.0, 33.3, np.nan, 0.0],
+        "F_211": [0, 1, None, 4],
+        "P_212": [0.0, 12.5, 50.0, 100.0],
+        "F_212": [2, 0, 0, None],
+    })
+    # Filas eliminadas: el índice tiene huecos
+    return compactar_tabla(tabla, LOTES).drop(index=1)
+
+
+def test_ida_y_vuelta_conserva_tipos_e_indice():
+    tabla = _tabla()
+    config_lotes = {"211": {"GENETICA": "ROSS", "MONTO": np.float64(750.5)}, "212": {"GENETICA": "COBB", "MONTO": 0.0}}
+    datos = {"211": {"ETAPA": "Postura", "EDAD_AVE": np.int64(41)}}
+
+    contenido = guardar_borrador("Chilco II", "PRODUCCIÓN", LOTES, config_lotes, datos, tabla)
+    leido = leer_borrador(contenido)
+
+    pd.testing.assert_frame_equal(leido["tabla"], tabla)
+    assert leido["granja"] == "Chilco II"
+    assert leido["tipo"] == "PRODUCCIÓN"
+    assert leido["lotes"] == LOTES
+    assert leido["config_lotes"]["211"]["MONTO"] == 750.5
+    assert leido["datos_productivos"] == {"211": {"ETAPA": "Postura", "EDAD_AVE": 41}}
+
+
+def test_archivo_que_no_es_borrador():
+    with pytest.raises(ValueError):
+        leer_borrador(b"no es parquet")
+    with pytest.raises(ValueError):
+        # Parquet sin manifiesto
+        salida = pd.DataFrame({"a": [1]}).to_parquet()
+        leer_borrador(salida)
@@ -0,0 +1,116 @@
+"""
+Regresión del motor vectorizado contra el cálculo fila a fila original
+(df.apply con round() por celda), con columnas F_ de tipos mezclados.
+"""
+import numpy as np
+import pandas as pd
+
+from calculo import DESCUENTO_FALTAS, REGLAS_PRODUCCION, calcular_bono, recalcular_bono
+from memoria import compactar_tabla
+from participacion import a_ancho, a_largo
+
+LOTES = ["211", "212"]
+CONFIG_LOTES = {"211": {"GENETICA": "ROSS", "MONTO": 750.0}, "212": {"GENETICA": "COBB", "MONTO": 432.1}}
+
+# Texto que int() lee y que no, números, vacíos y booleanos
+FALTAS_MIXTAS = [0, 1, "1.0", "1.5", "2", " 3 ", "x", None, np.nan, 1.5, 2.0, True, 4, 7, "0"]
+
+
+def _factor_faltas_original(f):
+    try:
+        f = int(f)
+    except:
+        return 0.50
+    return DESCUENTO_FALTAS.get(f, 0.50)
+
+
+def _pagos_originales(tabla, reglas, config_lotes, lotes):
+    df_final = tabla.copy()
+    pagos = []
+    for lote in lotes:
+        col = f"PAGO_{lote}"
+        df_final[col] = df_final.apply(lambda r: round(
+            reglas.get(str(r["CARGO"]).upper(), 0) * config_lotes[lote]["MONTO"] * (float(r[f"P_{lote}"]) / 100) * _factor_faltas_original(r[f"F_{lote}"]),
+            2
+        ), axis=1)
+        pagos.append(col)
+
+    df_final["TOTAL S/"] = df_final[pagos].sum(axis=1)
+    return df_final[pagos + ["TOTAL S/"]]
+
+
+def _tabla_mixta():
+    n = len(FALTAS_MIXTAS)
+    return pd.DataFrame({
+        "DNI": [f"{i:08d}" for i in range(n)],
+        "NOMBRE COMPLETO": [f"T{i}" for i in range(n)],
+        "CARGO": (["GALPONERO", "AYUDANTE GALPONERO", "supervisor", "GRADING", "OTRO"] * n)[:n],
+        "P_211": [100.0, 50.0, 33.3, 12.5, 100.0] * (n // 5),
+        "F_211": pd.Series(FALTAS_MIXTAS, dtype=object),
+        "P_212": [25.0, 100.0, 0.0, 66.7, 80.0] * (n // 5),
+        "F_212": pd.Series(FALTAS_MIXTAS[::-1], dtype=object),
+    })
+
+
+def test_calcular_bono_igual_al_original_con_faltas_mixtas():
+    tabla = _tabla_mixta()
+    esperado = _pagos_originales(tabla, REGLAS_PRODUCCION, CONFIG_LOTES, LOTES)
+
+    df_final = calcular_bono(tabla, CONFIG_LOTES, REGLAS_PRODUCCION, lotes=LOTES)
+
+    pd.testing.assert_frame_equal(df_final[esperado.columns], esperado, check_dtype=False)
+
+
+def test_tabla_compacta_y_larga_igual_al_original_con_faltas_mixtas():
+    # Camino de la página: compactar_tabla → formato largo → recalcular_bono
+    tabla = _tabla_mixta()
+    esperado = _pagos_originales(tabla, REGLAS_PRODUCCION, CONFIG_LOTES, LOTES)
+
+    trabajadores, participacion = a_largo(compactar_tabla(tabla, LOTES), LOTES)
+    vista = compactar_tabla(a_ancho(trabajadores, participacion, LOTES), LOTES)
+    df_final = recalcular_bono({}, vista, participacion, CONFIG_LOTES, REGLAS_PRODUCCION, lotes=LOTES)
+
+    pd.testing.assert_frame_equal(df_final[esperado.columns], esperado, check_dtype=False)
+
+
+def test_recalcular_bono_incremental_igual_al_calculo_completo():
+    # Misma secuencia de cambios que hace la página, con un solo memo
+    reglas = REGLAS_PRODUCCION
+    config = {lote: dict(c) for lote, c in CONFIG_LOTES.items()}
+    trabajadores, participacion = a_largo(compactar_tabla(_tabla_mixta(), LOTES), LOTES)
+    memo = {}
+
+    def paso(trabajadores, participacion, config):
+        vista = compactar_tabla(a_ancho(trabajadores, participacion, LOTES), LOTES)
+        df_final = recalcular_bono(memo, vista, participacion, config, reglas, lotes=LOTES)
+        esperado = calcular_bono(vista, config, reglas, lotes=LOTES)
+
+        pd.testing.assert_frame_equal(df_final, esperado)
+        pagos = [f"PAGO_{lote}" for lote in LOTES]
+        np.testing.assert_allclose(memo["totales"][pagos].to_numpy(), esperado[pagos].sum().to_numpy())
+
+    paso(trabajadores, participacion, config)
+    # Sin cambios
+    paso(trabajadores, participacion, config)
+
+    # Celda editada
+    participacion = participacion.copy()
+    participacion.loc[participacion.index[0], "P"] = 12.5
+    paso(trabajadores, participacion, config)
+
+    # Otro cargo
+    trabajadores = trabajadores.copy()
+    trabajadores.loc[3, "CARGO"] = "GALPONERO"
+    paso(trabajadores, participacion, config)
+
+    # Otro monto en un lote
+    config = {**config, "212": {**config["212"], "MONTO": 500.0}}
+    paso(trabajadores, participacion, config)
+
+    # Baja y alta de trabajadores
+    trabajadores = trabajadores.drop(index=[1, 2])
+    participacion = participacion[participacion["fila"].isin(trabajadores.index)]
+    nuevo = pd.DataFrame({"DNI": ["99999999"], "NOMBRE COMPLETO": ["N"], "CARGO": ["CAPORAL"]}, index=[100])
+    trabajadores = pd.concat([trabajadores, nuevo])
+    participacion = pd.concat([participacion, participacion.iloc[:1].assign(fila=100, P=np.float32(50))], ignore_index=True)
+    paso(trabajadores, participacion, config)
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from carga import (
+    alta_masiva, aplicar_participacion, baja_masiva, dnis_de_texto, indice_dni, leer_participacion,
+    plantilla_participacion
+)
+
+LOTES = ["211", "212"]
+
+
+def _tabla():
+    return pd.DataFrame({
+        "DNI": ["00000001", "00000002"],
+        "NOMBRE COMPLETO": ["A", "B"],
+        "CARGO": ["GALPONERO", "CAPORAL"],
+        "P_211": [100.0, 50.0],
+        "P_212": [0.0, 50.0],
+        "F_211": [0, 1],
+        "F_212": [0, 0],
+    })
+
+
+def _indice():
+    return indice_dni(pd.DataFrame({
+        "DNI": ["00000001", "00000003", "00000004", "00000005"],
+        "NOMBRE COMPLETO": ["A", "C", "D", np.nan],
+        "CARGO": ["GALPONERO", "GALPONERO", np.nan, "CAPORAL"],
+    }))
+
+
+def test_dnis_de_texto():
+    assert dnis_de_texto("1, 00000002;3\n\n 4 \t'5") == ["00000001", "00000002", "00000003", "00000004", "00000005"]
+    assert dnis_de_texto("") == []
+
+
+def test_alta_masiva():
+    dnis = ["00000003", "00000001", "00000009", "00000004", "00000003", "00000005"]
+    tabla, reporte = alta_masiva(_tabla(), dnis, _indice(), LOTES)
+
+    assert reporte == {
+        "agregados": ["00000003", "00000004", "00000005"],
+        "ya_en_tabla": ["00000001"],
+        "no_encontrados": ["00000009"],
+        "repetidos": ["00000003"],
+    }
+    assert tabla["DNI"].tolist() == ["00000001", "00000002", "00000003", "00000004", "00000005"]
+    assert tabla.index.tolist() == [0, 1, 2, 3, 4]
+    assert list(tabla.columns) == list(_tabla().columns)
+    nuevos = tabla.iloc[2:]
+    assert nuevos["NOMBRE COMPLETO"].iloc[0] == "C"
+    assert (nuevos[["P_211", "P_212", "F_211", "F_212"]] == 0).all().all()
+
+
+def test_alta_masiva_sin_nada_que_agregar():
+    tabla, reporte = alta_masiva(_tabla(), ["00000001", "00000009"], _indice(), LOTES)
+
+    pd.testing.assert_frame_equal(tabla, _tabla())
+    assert reporte["agregados"] == []
+
+
+def test_baja_masiva():
+    tabla, reporte = baja_masiva(_tabla(), ["00000002", "00000009", "00000002"])
+
+    assert tabla["DNI"].tolist() == ["00000001"]
+    assert reporte == {"eliminados": ["00000002"], "no_en_tabla": ["00000009"], "repetidos": ["00000002"]}
+
+
+def test_aplicar_participacion():
+    largo = pd.DataFrame({
+        "DNI": ["00000001", "00000002", "00000002", "00000009", "00000001"],
+        "LOTE": ["211", "212", "212", "211", "999"],
+        "P": [80.0, 10.0, 20.0, 5.0, 1.0],
+        "F": [np.nan, 2.0, 3.0, 0.0, 0.0],
+    })
+    tabla, reporte = aplicar_participacion(_tabla(), largo, LOTES)
+
+    assert tabla["P_211"].tolist() == [80.0, 50.0]
+    # F vacío: no se cambia
+    assert tabla["F_211"].tolist() == [0, 1]
+    # DNI y lote repetidos: vale la última fila
+    assert tabla["P_212"].tolist() == [0.0, 20.0]
+    assert tabla["F_212"].tolist() == [0, 3]
+    assert reporte == {
+        "actualizados": ["00000001", "00000002"],
+        "no_en_tabla": ["00000009"],
+        "lotes_desconocidos": ["999"],
+        "filas_repetidas": 1,
+    }
+
+
+def test_plantilla_se_vuelve_a_leer_igual():
+    tabla = _tabla()
+    largo = leer_participacion(plantilla_participacion(tabla, LOTES))
+
+    assert len(largo) == 4
+    otra, reporte = aplicar_participacion(tabla.assign(P_211=0.0, F_212=9), largo, LOTES)
+
+    pd.testing.assert_frame_equal(otra, tabla, check_dtype=False)
+    assert reporte["filas_repetidas"] == 0
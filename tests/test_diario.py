@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+from diario import Diario, cambios_tabla
+
+LOTES = ["211"]
+
+
+def _estado(tabla=None):
+    if tabla is None:
+        tabla = pd.DataFrame({
+            "DNI": ["00000001", "00000002"],
+            "NOMBRE COMPLETO": ["A", "B"],
+            "CARGO": ["GALPONERO", "CAPORAL"],
+            "P_211": [100.0, 50.0],
+            "F_211": [0, 1],
+        })
+    return {
+        "granja": "Chilco II",
+        "tipo": "PRODUCCIÓN",
+        "lotes": list(LOTES),
+        "config_lotes": {"211": {"GENETICA": "ROSS", "MONTO": 750.0}},
+        "datos_productivos": {},
+        "tabla": tabla,
+    }
+
+
+def test_cambios_tabla_solo_celdas_distintas():
+    antes = _estado()["tabla"]
+    despues = antes.assign(P_211=[100.0, 75.0], P_212=[0.0, 20.0])
+
+    assert cambios_tabla(antes, despues) == [[1, "P_211", 75.0], [1, "P_212", 20.0]]
+
+
+def test_recuperar_aplica_el_diario_sobre_la_foto(tmp_path):
+    diario = Diario("u", "s1", directorio=str(tmp_path))
+    diario.foto(_estado())
+
+    diario.anotar("agregar", fila={"DNI": "00000003", "NOMBRE COMPLETO": "C", "CARGO": "GALPONERO"})
+    diario.anotar("editar", cambios=[[2, "P_211", 25.0], [0, "F_211", 2]])
+    diario.anotar("eliminar", dni="00000002")
+    diario.anotar("contexto", lotes=["211", "212"], config_lotes={"211": {"MONTO": 800.0}, "212": {"MONTO": 1.0}})
+    # Línea cortada por una caída: se ignora
+    with open(diario.ruta_diario, "a", encoding="utf-8") as f:
+        f.write('{"op": "eliminar", "dni": "0000')
+
+    estado = Diario("u", "s1", directorio=str(tmp_path)).recuperar()
+    tabla = estado["tabla"]
+
+    assert tabla["DNI"].tolist() == ["00000001", "00000003"]
+    assert tabla.index.tolist() == [0, 2]
+    assert tabla.loc[2, "P_211"] == 25.0
+    assert tabla.loc[0, "F_211"] == 2
+    assert estado["lotes"] == ["211", "212"]
+    # Lote agregado sin celdas editadas: columnas por defecto
+    assert tabla["P_212"].tolist() == [0.0, 0.0]
+
+
+def test_adoptar_mueve_la_sesion_y_la_original_deja_de_anotar(tmp_path):
+    original = Diario("u", "s1", directorio=str(tmp_path))
+    original.foto(_estado())
+    original.anotar("eliminar", dni="00000002")
+
+    nueva = Diario("u", "s2", directorio=str(tmp_path))
+    assert [s for s, _ in nueva.sin_terminar()] == ["s1"]
+
+    nueva.adoptar("s1")
+    assert nueva.recuperar()["tabla"]["DNI"].tolist() == ["00000001"]
+    assert nueva.sin_terminar() == []
+
+    with pytest.raises(FileNotFoundError):
+        original.anotar("eliminar", dni="00000001")
+    with pytest.raises(FileNotFoundError):
+        Diario("u", "s3", directorio=str(tmp_path)).adoptar("s1")
+
+
+def test_sesion_terminada_no_se_ofrece_hasta_otro_cambio(tmp_path):
+    sesion = Diario("u", "s1", directorio=str(tmp_path))
+    sesion.foto(_estado())
+    otra = Diario("u", "s2", directorio=str(tmp_path))
+
+    sesion.terminar()
+    assert otra.sin_terminar() == []
+
+    sesion.anotar("eliminar", dni="00000002")
+    assert [s for s, _ in otra.sin_terminar()] == ["s1"]
+
+
+def test_cuentas_separadas(tmp_path):
+    Diario("u", "s1", directorio=str(tmp_path)).foto(_estado())
+    assert Diario("otra", "s2", directorio=str(tmp_path)).sin_terminar() == []
@@ -0,0 +1,149 @@
+"""
+ColaCorreo contra un servidor SMTP local (aiosmtpd).
+"""
+import socket
+import time
+from email.message import EmailMessage
+
+import pytest
+
+from envio import ENVIADO, ERROR, ESTADOS_FINALES, ColaCorreo, como_bool
+
+controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class Servidor:
+    """
+    Guarda los mensajes. fallos_data: cuántos DATA responder con 451
+    (transitorio); rechazar: destinos con 550 (permanente).
+    """
+    def __init__(self, fallos_data=0, rechazar=()):
+        self.fallos_data = fallos_data
+        self.rechazar = set(rechazar)
+        self.mensajes = []
+        self.saludos = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.saludos += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.rechazar:
+            return "550 buzón inexistente"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fallos_data:
+            self.fallos_data -= 1
+            return "451 intente más tarde"
+        self.mensajes.append(envelope)
+        return "250 OK"
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_local():
+    servidores = []
+
+    def iniciar(**kwargs):
+        manejador = Servidor(**kwargs)
+        c = controller.Controller(manejador, hostname="127.0.0.1", port=_puerto_libre())
+        c.start()
+        servidores.append(c)
+        cola = ColaCorreo("127.0.0.1", c.port, starttls=False, espera=0.01, inactividad=5)
+        return manejador, cola
+
+    yield iniciar
+    for c in servidores:
+        c.stop()
+
+
+def _mensaje(destino="a@granja.pe"):
+    msg = EmailMessage()
+    msg["From"] = "bono@granja.pe"
+    msg["To"] = destino
+    msg["Subject"] = "Bono"
+    msg.set_content("hola")
+    return msg
+
+
+def _esperar(cola, id_envio, limite=5.0):
+    fin = time.time() + limite
+    while time.time() < fin:
+        estado = cola.estado(id_envio)
+        if estado["estado"] in ESTADOS_FINALES:
+            return estado
+        time.sleep(0.01)
+    raise AssertionError(f"sin terminar: {cola.estado(id_envio)}")
+
+
+def test_envia_y_reutiliza_la_conexion(smtp_local):
+    servidor, cola = smtp_local()
+    avisos = []
+
+    ids = [cola.encolar(_mensaje(f"{i}@granja.pe"), al_enviar=lambda i=i: avisos.append(i)) for i in range(3)]
+    estados = [_esperar(cola, i) for i in ids]
+
+    assert [e["estado"] for e in estados] == [ENVIADO] * 3
+    assert [e["intentos"] for e in estados] == [1, 1, 1]
+    assert estados[0]["destino"] == "0@granja.pe"
+    assert len(servidor.mensajes) == 3
+    # Una sola sesión SMTP para los tres
+    assert servidor.saludos == 1
+    assert avisos == [0, 1, 2]
+
+
+def test_fallo_transitorio_se_reintenta(smtp_local):
+    servidor, cola = smtp_local(fallos_data=2)
+    avisos = []
+
+    estado = _esperar(cola, cola.encolar(_mensaje(), al_enviar=lambda: avisos.append(1)))
+
+    assert estado["estado"] == ENVIADO
+    assert estado["intentos"] == 3
+    assert estado["error"] is None
+    assert len(servidor.mensajes) == 1
+    assert avisos == [1]
+
+
+def test_reintentos_agotados(smtp_local):
+    _, cola = smtp_local(fallos_data=10)
+    avisos = []
+
+    estado = _esperar(cola, cola.encolar(_mensaje(), al_enviar=lambda: avisos.append(1)))
+
+    assert estado["estado"] == ERROR
+    assert estado["intentos"] == cola.reintentos
+    assert "451" in estado["error"]
+    assert avisos == []
+
+
+def test_error_permanente_no_se_reintenta(smtp_local):
+    servidor, cola = smtp_local(rechazar=["malo@granja.pe"])
+
+    malo = _esperar(cola, cola.encolar(_mensaje("malo@granja.pe")))
+    bueno = _esperar(cola, cola.encolar(_mensaje("bueno@granja.pe")))
+
+    assert (malo["estado"], malo["intentos"]) == (ERROR, 1)
+    assert bueno["estado"] == ENVIADO
+    assert len(servidor.mensajes) == 1
+
+
+def test_estado_de_id_desconocido(smtp_local):
+    _, cola = smtp_local()
+    assert cola.estado(999) is None
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    (True, True), (False, False), ("true", True), ("false", False),
+    ("False", False), ("0", False), ("no", False), ("1", True), ("", False),
+])
+def test_como_bool(valor, esperado):
+    assert como_bool(valor) is esperado
@@ -0,0 +1,86 @@
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import exportar
+from calculo import REGLAS_LEVANTE, calcular_bono
+from carga import leer_excel_generado
+from exportar import HOJA_META, SHEET_NAME, generar_excel
+
+LOTES = ["211", "212"]
+CONFIG_LOTES = {"211": {"GENETICA": "ROSS", "MONTO": 750.0}, "212": {"GENETICA": "COBB", "MONTO": 432.5}}
+DATOS = {
+    "211": {
+        "HEMBRAS": {"EDAD": 20, "UNIFORMIDAD": 85.5, "AVES_ENTREGADAS": 9000, "POBLACION_INICIAL": 10000,
+                    "PCT_CUMP_AVES": 90.0, "PESO": 2.4, "PESO_STD": 2.53, "PCT_CUMP_PESO": 94.9},
+        "MACHOS": {"EDAD": 20, "UNIFORMIDAD": 80.0, "AVES_ENTREGADAS": 900, "POBLACION_INICIAL": 1000,
+                   "PESO": 2.9, "PESO_STD": 2.955, "PCT_CUMP_PESO": 98.1},
+    },
+}
+
+
+def _tabla():
+    return pd.DataFrame({
+        "DNI": ["00000001", "00000002", "00000003", "00000004", "00000005"],
+        "NOMBRE COMPLETO": ["ÁLVAREZ", "BRAVO", "CASTRO", None, "ESPINOZA"],
+        "CARGO": ["GALPONERO", "CAPORAL", "GALPONERO", "SUPERVISOR", "OTRO"],
+        "P_211": [100.0, 33.3, np.nan, 0.0, 50.0],
+        "F_211": [0, 1, 2, 4, 0],
+        "P_212": [0.0, 12.5, 50.0, 100.0, 25.0],
+        "F_212": [2, 0, 0, 1, 3],
+    })
+
+
+def _excel(motor):
+    df_final = calcular_bono(_tabla(), CONFIG_LOTES, REGLAS_LEVANTE, lotes=LOTES)
+    return df_final, generar_excel("Chilco II", "LEVANTE", LOTES, CONFIG_LOTES, DATOS, df_final, motor=motor)
+
+
+def _sin_meta(contenido):
+    wb = load_workbook(BytesIO(contenido))
+    del wb[HOJA_META]
+    salida = BytesIO()
+    wb.save(salida)
+    return salida.getvalue()
+
+
+def _celdas(contenido):
+    ws = load_workbook(BytesIO(contenido))[SHEET_NAME]
+    # La fecha de generación puede cambiar de minuto entre dos libros
+    return [fila for i, fila in enumerate(ws.iter_rows(values_only=True)) if i != 4]
+
+
+def test_streaming_por_trozos_igual_a_openpyxl(monkeypatch):
+    # Trozos más chicos que la tabla: el corte no debe notarse
+    monkeypatch.setattr(exportar, "FILAS_POR_TROZO", 2)
+
+    _, en_memoria = _excel("openpyxl")
+    _, streaming = _excel("streaming")
+
+    assert _celdas(streaming) == _celdas(en_memoria)
+
+
+@pytest.mark.parametrize("motor", ["openpyxl", "streaming"])
+@pytest.mark.parametrize("con_meta", [True, False])
+def test_ida_y_vuelta(motor, con_meta):
+    df_final, contenido = _excel(motor)
+    if not con_meta:
+        contenido = _sin_meta(contenido)
+
+    estado = leer_excel_generado(contenido)
+
+    assert estado["granja"] == "Chilco II"
+    assert estado["tipo"] == "LEVANTE"
+    assert estado["lotes"] == LOTES
+    assert estado["config_lotes"] == CONFIG_LOTES
+    assert estado["datos_productivos"]["211"]["HEMBRAS"]["PESO"] == 2.4
+    assert estado["datos_productivos"]["211"]["MACHOS"]["PESO_STD"] == 2.955
+
+    tabla = estado["tabla"]
+    assert tabla["DNI"].tolist() == df_final["DNI"].tolist()
+    assert tabla["NOMBRE COMPLETO"].isna().tolist() == [False, False, False, True, False]
+    np.testing.assert_allclose(pd.to_numeric(tabla["TOTAL S/"]), df_final["TOTAL S/"])
+    np.testing.assert_allclose(pd.to_numeric(tabla["F_212"]), df_final["F_212"])
@@ -0,0 +1,93 @@
+import sqlite3
+
+import pandas as pd
+
+import historial
+from historial import listar_corridas, pagos_por_dni, registrar_corrida, total_por_dni
+
+
+def _df_final(pago_1):
+    return pd.DataFrame({
+        "DNI": ["00000001", "00000002"],
+        "NOMBRE COMPLETO": ["A", "B"],
+        "CARGO": ["GALPONERO", "CAPORAL"],
+        "P_211": [100.0, 50.0],
+        "F_211": [0, 1],
+        "PAGO_211": [pago_1, 5.0],
+        "TOTAL S/": [pago_1, 5.0],
+    })
+
+
+def _registrar(ruta, huella, pago_1=10.0, periodo="2026-03", granja="Chilco II"):
+    return registrar_corrida(
+        huella, granja, "PRODUCCIÓN", ["211"], {"211": {"MONTO": 750.0}}, {}, _df_final(pago_1),
+        periodo=periodo, ruta=ruta
+    )
+
+
+def test_misma_huella_se_registra_una_vez(tmp_path):
+    ruta = str(tmp_path / "h.sqlite")
+    assert _registrar(ruta, "a")
+    assert not _registrar(ruta, "a")
+    assert len(listar_corridas(ruta=ruta)) == 1
+
+
+def test_correccion_del_mismo_periodo_no_suma_dos_veces(tmp_path):
+    ruta = str(tmp_path / "h.sqlite")
+    _registrar(ruta, "a", pago_1=10.0)
+    _registrar(ruta, "b", pago_1=20.0)
+
+    assert total_por_dni("00000001", 2026, ruta=ruta) == 20.0
+    assert pagos_por_dni("00000001", ruta=ruta)["pago"].tolist() == [20.0]
+
+    # Solo se agrega: la anterior queda, marcada
+    corridas = listar_corridas(ruta=ruta).set_index("id")
+    assert len(corridas) == 2
+    nueva = corridas.index[corridas["reemplazada_por"].isna()][0]
+    assert corridas["reemplazada_por"].dropna().tolist() == [nueva]
+
+
+def test_otro_periodo_u_otra_granja_se_suman(tmp_path):
+    ruta = str(tmp_path / "h.sqlite")
+    _registrar(ruta, "a", periodo="2026-03")
+    _registrar(ruta, "b", periodo="2026-04")
+    _registrar(ruta, "c", granja="Otra")
+    _registrar(ruta, "d", periodo=None)
+    _registrar(ruta, "e", periodo=None)
+
+    assert total_por_dni("00000001", ruta=ruta) == 50.0
+    assert listar_corridas(ruta=ruta)["reemplazada_por"].isna().all()
+
+
+def test_total_por_dni_por_anio_del_periodo(tmp_path):
+    ruta = str(tmp_path / "h.sqlite")
+    _registrar(ruta, "a", periodo="2025-12")
+    _registrar(ruta, "b", periodo="2026-01")
+
+    assert total_por_dni("00000001", 2025, ruta=ruta) == 10.0
+    assert total_por_dni("00000001", 2026, ruta=ruta) == 10.0
+
+
+def test_historial_anterior_se_migra_sin_borrar(tmp_path):
+    ruta = str(tmp_path / "h.sqlite")
+    con = sqlite3.connect(ruta)
+    con.executescript("""
+        CREATE TABLE corridas (
+            id INTEGER PRIMARY KEY, huella TEXT NOT NULL UNIQUE, fecha TEXT NOT NULL,
+            granja TEXT, tipo TEXT, lotes TEXT, config_lotes TEXT,
+            datos_productivos TEXT, trabajadores INTEGER, total REAL
+        );
+        CREATE TABLE pagos (
+            corrida_id INTEGER NOT NULL, dni TEXT NOT NULL, nombre TEXT, cargo TEXT,
+            lote TEXT NOT NULL, participacion REAL, faltas REAL, pago REAL
+        );
+        INSERT INTO corridas VALUES (1, 'x', '2026-03-01T10:00:00', 'Chilco II', 'PRODUCCIÓN', '211', '{}', '{}', 1, 10);
+        INSERT INTO corridas VALUES (2, 'y', '2026-03-02T10:00:00', 'Chilco II', 'PRODUCCIÓN', '211', '{}', '{}', 1, 10);
+        INSERT INTO pagos VALUES (1, '00000001', 'A', 'GALPONERO', '211', 100, 0, 10);
+        INSERT INTO pagos VALUES (2, '00000001', 'A', 'GALPONERO', '211', 100, 0, 10);
+    """)
+    con.close()
+    historial._preparadas.discard(ruta)
+
+    assert len(listar_corridas(ruta=ruta)) == 2
+    assert total_por_dni("00000001", ruta=ruta) == 20.0
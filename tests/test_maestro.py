@@ -0,0 +1,84 @@
+import os
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from carga import buscar_en_base, cruzar_trabajadores, indice_dni, limpiar_dni
+from maestro import cargar_maestro, cruzar_con_maestro, publicar_base
+
+
+def _xlsx(df):
+    salida = BytesIO()
+    df.to_excel(salida, index=False)
+    return salida.getvalue()
+
+
+def _base():
+    return pd.DataFrame({
+        "DNI": ["'00000003", "1.0", "00000002", "00000003", "7"],
+        "NOMBRE COMPLETO": ["CASTRO", "ÁLVAREZ", None, "REPETIDO", "GÓMEZ"],
+        "CARGO": ["GALPONERO", "CAPORAL", "GALPONERO", "OTRO", None],
+    })
+
+
+def _publicar(tmp_path, df):
+    ruta = str(tmp_path / "base.xlsx")
+    publicar_base(_xlsx(df), ruta)
+    return ruta
+
+
+def test_get_responde_como_indice_dni(tmp_path):
+    ruta = _publicar(tmp_path, _base())
+    maestro = cargar_maestro(ruta, str(tmp_path / "maestro"))
+
+    base = _base().assign(DNI=lambda d: limpiar_dni(d["DNI"])).drop_duplicates("DNI")
+    indice = indice_dni(base)
+
+    assert len(maestro) == 4
+    for dni in ["00000001", "00000002", "00000003", "00000007", "00000009", "99999999"]:
+        esperado = indice.get(dni)
+        obtenido = maestro.get(dni)
+        if esperado is None:
+            assert obtenido is None
+        else:
+            for campo in ["NOMBRE COMPLETO", "CARGO"]:
+                assert obtenido[campo] == esperado[campo] or (pd.isna(obtenido[campo]) and pd.isna(esperado[campo]))
+
+
+def test_cruce_igual_al_merge_con_la_base(tmp_path):
+    ruta = _publicar(tmp_path, _base())
+    maestro = cargar_maestro(ruta, str(tmp_path / "maestro"))
+    contenido_dni = _xlsx(pd.DataFrame({"DNI": ["3", "00000009", "00000001", "2", "3"]}))
+
+    esperado, df_base = cruzar_trabajadores(contenido_dni, _xlsx(_base()))
+    obtenido = cruzar_con_maestro(contenido_dni, maestro)
+
+    pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
+    pd.testing.assert_frame_equal(
+        buscar_en_base(maestro, esperado["DNI"]),
+        buscar_en_base(indice_dni(df_base), esperado["DNI"]),
+        check_dtype=False
+    )
+
+
+def test_una_foto_por_version(tmp_path):
+    directorio = str(tmp_path / "maestro")
+    ruta = _publicar(tmp_path, _base())
+
+    primera = cargar_maestro(ruta, directorio)
+    assert cargar_maestro(ruta, directorio).version == primera.version
+
+    # Base publicada de nuevo (otro tamaño): otra versión, la anterior se borra
+    publicar_base(_xlsx(_base().iloc[:2]), ruta)
+    os.utime(ruta, ns=(0, 1))
+    segunda = cargar_maestro(ruta, directorio)
+
+    assert segunda.version != primera.version
+    assert os.listdir(directorio) == [segunda.version]
+    assert np.array_equal(segunda.posiciones(["00000001", "00000002"]), [0, -1])
+
+
+def test_sin_base_publicada(tmp_path):
+    assert cargar_maestro("", str(tmp_path)) is None
+    assert cargar_maestro(str(tmp_path / "no_existe.xlsx"), str(tmp_path)) is None
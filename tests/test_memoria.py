@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from memoria import compactar_tabla, reporte_memoria
+
+LOTES = ["211"]
+
+
+def _tabla():
+    return pd.DataFrame({
+        "DNI": pd.Series(["00000001", "00000002", "00000003"], dtype=object),
+        "NOMBRE COMPLETO": ["A", "B", "C"],
+        "CARGO": ["GALPONERO", "CAPORAL", "OTRO"],
+        "P_211": [100, 50.5, None],
+        "F_211": ["1", 2, None],
+    })
+
+
+def test_tipos_compactos():
+    tabla = compactar_tabla(_tabla(), LOTES)
+
+    assert tabla["DNI"].dtype == pd.StringDtype("pyarrow", na_value=np.nan)
+    assert isinstance(tabla["CARGO"].dtype, pd.CategoricalDtype)
+    assert "OTRO" in tabla["CARGO"].cat.categories
+    assert tabla["P_211"].dtype == "float32"
+    assert tabla["F_211"].dtype == "Int8"
+    assert tabla["F_211"].tolist()[:2] == [1, 2]
+
+
+def test_faltas_con_decimales_quedan_en_float32():
+    tabla = _tabla().assign(F_211=[1.5, 0, 2])
+    assert compactar_tabla(tabla, LOTES)["F_211"].dtype == "float32"
+
+
+def test_compactar_dos_veces_no_cambia_nada():
+    tabla = compactar_tabla(_tabla(), LOTES)
+    otra = compactar_tabla(tabla, LOTES)
+
+    pd.testing.assert_frame_equal(otra, tabla)
+    assert np.shares_memory(otra["P_211"].to_numpy(), tabla["P_211"].to_numpy())
+
+
+def test_reporte_cuenta_una_vez_la_misma_tabla():
+    tabla = compactar_tabla(_tabla(), LOTES)
+    reporte = reporte_memoria({"tabla": tabla, "vista": tabla, "vacia": None}).set_index("Objeto")
+
+    assert list(reporte.index) == ["tabla", "vista"]
+    assert reporte.loc["vista", "MB"] == 0.0
+    assert reporte.loc["vista", "Nota"] == "misma tabla que tabla"
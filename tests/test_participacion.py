@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from participacion import a_ancho, a_largo, faltas_numericas, filtrar, reubicar_filas
+
+LOTES = ["211", "212", "213"]
+
+
+def _tabla():
+    return pd.DataFrame({
+        "DNI": ["00000001", "00000002", "00000003"],
+        "NOMBRE COMPLETO": ["A", "B", "C"],
+        "CARGO": ["GALPONERO", "CAPORAL", "GALPONERO"],
+        "P_211": [100.0, 0.0, np.nan],
+        "F_211": [0, 0, 1],
+        "P_212": [0.0, 50.0, 0.0],
+        "F_212": [0, 2, 0],
+    }, index=[0, 5, 7])
+
+
+def test_a_largo_solo_celdas_distintas_de_cero():
+    trabajadores, participacion = a_largo(_tabla(), LOTES)
+
+    assert trabajadores.columns.tolist() == ["DNI", "NOMBRE COMPLETO", "CARGO"]
+    assert participacion["fila"].tolist() == [0, 7, 5]
+    assert participacion["LOTE"].tolist() == ["211", "211", "212"]
+    assert participacion["LOTE"].cat.categories.tolist() == LOTES
+    # Celda vacía se guarda como NaN
+    assert np.isnan(participacion["P"].iloc[1])
+    assert participacion["F"].tolist() == [0.0, 1.0, 2.0]
+
+
+def test_ida_y_vuelta_ancho_largo():
+    tabla = _tabla()
+    trabajadores, participacion = a_largo(tabla, LOTES)
+    ancho = a_ancho(trabajadores, participacion, LOTES)
+
+    assert ancho.columns.tolist() == ["DNI", "NOMBRE COMPLETO", "CARGO", "P_211", "P_212", "P_213", "F_211", "F_212", "F_213"]
+    assert ancho.index.tolist() == [0, 5, 7]
+    for col in ["P_211", "F_211", "P_212", "F_212"]:
+        np.testing.assert_array_equal(ancho[col].to_numpy(), tabla[col].to_numpy(dtype=np.float32))
+    assert (ancho[["P_213", "F_213"]] == 0).all().all()
+
+
+def test_faltas_como_el_calculo_fila_a_fila():
+    faltas = faltas_numericas(pd.Series(["2", " 3 ", "1.0", "x", None, 1.5, True], dtype=object))
+    np.testing.assert_array_equal(faltas.to_numpy(), [2.0, 3.0, np.nan, np.nan, np.nan, 1.5, 1.0])
+
+    numericas = pd.Series([1, 2], dtype="Int8")
+    assert faltas_numericas(numericas) is numericas
+
+
+def test_bajas_altas_y_lotes_quitados():
+    trabajadores, participacion = a_largo(_tabla(), LOTES)
+    assert filtrar(participacion, trabajadores, LOTES) is participacion
+
+    # Baja de la fila 5 y lote 211 fuera de la página
+    quedan = trabajadores.drop(index=5)
+    filtrada = filtrar(participacion, quedan, ["212", "213"])
+    assert len(filtrada) == 0
+
+    # concat con ignore_index: las etiquetas pasan a ser posiciones
+    reubicada = reubicar_filas(participacion, trabajadores.index)
+    assert reubicada["fila"].tolist() == [0, 2, 1]
+    assert reubicada["fila"].dtype == np.int32
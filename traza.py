@@ -0,0 +1,109 @@
+"""
+Tiempos por etapa de cada rerun (y de la descarga / el correo).
+
+Cada hilo tiene a lo sumo una traza activa. etapa() mide un bloque y lo
+agrega a esa traza; si no hay traza activa no hace nada, así los módulos
+de cálculo y exportación pueden instrumentarse sin depender de la app.
+
+Las trazas cerradas se agregan, una por línea (JSON lines), a RUTA_TRAZA.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+RUTA_TRAZA = os.environ.get("BONO_TRAZA_LOG", "traza_bono.jsonl")
+
+_hilo = threading.local()
+
+
+def iniciar_traza(origen, **contexto):
+    """
+    Nueva traza activa para el hilo actual (reemplaza la anterior).
+    """
+    traza = {
+        "origen": origen,
+        "inicio": pd.Timestamp.now().isoformat(timespec="milliseconds"),
+        **contexto,
+        "etapas": [],
+        "_t0": time.perf_counter(),
+    }
+    _hilo.traza = traza
+    return traza
+
+
+def traza_actual():
+    return getattr(_hilo, "traza", None)
+
+
+@contextmanager
+def etapa(nombre, **datos):
+    """
+    with etapa("calculo", filas=n) as e:
+        ...
+        e["bytes"] = len(contenido)   # datos conocidos al final
+    """
+    traza = traza_actual()
+    registro = {"etapa": nombre, **datos}
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro["segundos"] = round(time.perf_counter() - inicio, 4)
+        if traza is not None:
+            traza["etapas"].append(registro)
+
+
+def cerrar_traza(traza, ruta=RUTA_TRAZA):
+    """
+    Total del rerun + una línea en el archivo de trazas. Idempotente.
+    """
+    if traza.get("guardada"):
+        return traza
+
+    traza["total_segundos"] = round(time.perf_counter() - traza.pop("_t0"), 4)
+    traza["guardada"] = True
+    if traza_actual() is traza:
+        _hilo.traza = None
+
+    try:
+        with open(ruta, "a", encoding="utf-8") as f:
+            f.write(json.dumps(
+                {k: v for k, v in traza.items() if k != "guardada"},
+                ensure_ascii=False,
+                default=str
+            ) + "\n")
+    except OSError:
+        # La traza nunca debe romper la página
+        pass
+
+    return traza
+
+
+@contextmanager
+def trazado(origen, recientes=None, **contexto):
+    """
+    Traza completa para un bloque (fragmento, descarga): se abre, se
+    cierra y, si se da, se agrega a la lista recientes.
+    """
+    traza = iniciar_traza(origen, **contexto)
+    try:
+        yield traza
+    finally:
+        cerrar_traza(traza)
+        if recientes is not None:
+            recientes.append(traza)
+
+
+def tabla_etapas(traza):
+    """
+    Etapas de una traza como DataFrame (etapa, segundos, filas, bytes…).
+    """
+    df = pd.DataFrame(traza["etapas"])
+    if df.empty:
+        return df
+    columnas = ["etapa", "segundos"] + [c for c in df.columns if c not in ("etapa", "segundos")]
+    return df[columnas]